@@ -17,26 +17,81 @@
 
 # Based on https://github.com/gunnarmorling/1brc/blob/main/src/main/java/dev/morling/onebrc/CreateMeasurements.java
 
+import argparse
+import multiprocessing
 import os
 import sys
 import random
 import time
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_OUTPUT_PATH = "data/weather_stations.csv"
+DEFAULT_SEED = 0
+BATCH_ROWS = 1_000_000  # rows per NumPy batch; batch i always comes from rng(seed, i)
+STATION_SAMPLE_SIZE = 10_000
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+DEFAULT_ROW_GROUP_SIZE = 1_000_000
+TEMPERATURE_COLUMN = "temperature_tenths"  # int16, temperature * 10
+
 
 def check_args(file_args):
     """
-    Sanity checks out input and prints out usage if input is not a positive integer
+    Parses the command line and prints out usage if the number of records is not a positive integer
     """
+    parser = argparse.ArgumentParser(prog="create_measurements.py")
+    parser.add_argument("rows")
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT_PATH)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="generate in NumPy batches across N processes (default: pure Python, one process)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help=f"seed for the NumPy generator (default: {DEFAULT_SEED})",
+    )
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="write one file per worker (<output>_000.csv, ...) instead of a single file",
+    )
+    parser.add_argument(
+        "--format",
+        nargs="+",
+        choices=sorted(FORMATS),
+        default=["csv"],
+        dest="formats",
+        help="output formats, written next to each other (default: csv)",
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help=f"rows per Parquet row group / Arrow record batch (default: {DEFAULT_ROW_GROUP_SIZE:_})",
+    )
+    args = parser.parse_args(file_args[1:])
     try:
-        if len(file_args) != 2 or int(file_args[1]) <= 0:
+        args.rows = int(args.rows)
+        if (
+            args.rows <= 0
+            or args.row_group_size <= 0
+            or (args.workers is not None and args.workers <= 0)
+        ):
             raise Exception()
     except Exception:
         print(
-            "Usage:  create_measurements.sh <positive integer number of records to create>"
+            "Usage:  create_measurements.sh <positive integer number of records to create> [output file]"
+            " [--workers N] [--seed S] [--shards] [--format csv parquet arrow] [--row-group-size N]"
         )
         print("        You can use underscore notation for large number of records.")
         print("        For example:  1_000_000_000 for one billion")
+        print(f"        The output file defaults to {DEFAULT_OUTPUT_PATH}")
         exit()
+    return args
 
 
 def build_weather_station_name_list():
@@ -51,7 +106,7 @@ def build_weather_station_name_list():
             next
         else:
             station_names.append(station.split(";")[0])
-    return list(set(station_names))
+    return sorted(set(station_names))  # sorted so seeded runs pick the same stations
 
 
 def convert_bytes(num):
@@ -100,7 +155,9 @@ def estimate_file_size(weather_station_names, num_rows_to_create):
     return f"Estimated max file size is:  {human_file_size}."
 
 
-def build_test_data(weather_station_names, num_rows_to_create):
+def build_test_data(
+    weather_station_names, num_rows_to_create, output_path=DEFAULT_OUTPUT_PATH
+):
     """
     Generates and writes to file the requested length of test data
     """
@@ -113,7 +170,10 @@ def build_test_data(weather_station_names, num_rows_to_create):
     print("Building test data...")
 
     try:
-        with open("data/weather_stations.csv", "w") as file:
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_path, "w") as file:
             progress = 0
             for chunk in range(chunks):
 
@@ -140,27 +200,331 @@ def build_test_data(weather_station_names, num_rows_to_create):
 
     end_time = time.time()
     elapsed_time = end_time - start_time
-    file_size = os.path.getsize("data/weather_stations.csv")
+    file_size = os.path.getsize(output_path)
     human_file_size = convert_bytes(file_size)
 
-    print("Test data successfully written to 1brc/data/weather_stations.csv")
+    print(f"Test data successfully written to {output_path}")
     print(f"Actual file size:  {human_file_size}")
     print(f"Elapsed time: {format_elapsed_time(elapsed_time)}")
 
 
+def print_progress(done, total, progress):
+    """
+    Redraws the progress bar when another 1% is done, returns the new percentage
+    """
+    if done * 100 // total != progress:
+        progress = done * 100 // total
+        bars = "=" * (progress // 2)
+        sys.stdout.write(f"\r[{bars:<50}] {progress}%")
+        sys.stdout.flush()
+    return progress
+
+
+def build_lookup_tables(weather_station_names, seed):
+    """
+    Precomputes the b"station;" prefixes of the sampled stations, the 1999 b"temperature\n" suffixes
+    and the sorted station dictionary (plus each sampled station's code in it) for the columnar formats
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(weather_station_names, STATION_SAMPLE_SIZE)
+    dictionary, codes = np.unique(sample, return_inverse=True)
+    return {
+        "stations": np.array(
+            [f"{station};".encode("utf-8") for station in sample], dtype=object
+        ),
+        "temperatures": np.array(
+            [f"{tenths / 10:.1f}\n".encode("utf-8") for tenths in range(-999, 1000)],
+            dtype=object,
+        ),
+        "dictionary": dictionary.tolist(),
+        "codes": codes.astype(np.int16),
+    }
+
+
+_lookup_tables = None
+
+
+def init_worker(lookup_tables):
+    """
+    Receives the lookup tables once per worker process
+    """
+    global _lookup_tables
+    _lookup_tables = lookup_tables
+
+
+def build_batch(seed, batch_index, rows, formats, start=0, stop=None):
+    """
+    Builds one batch in every requested format; the same (seed, batch_index) always yields the same rows.
+    start/stop keep only that slice of the batch, for shards that begin or end inside it
+    """
+    tables = _lookup_tables
+    rng = np.random.default_rng([seed, batch_index])
+    station_idx = rng.integers(0, len(tables["stations"]), rows)[start:stop]
+    temperature_idx = rng.integers(0, len(tables["temperatures"]), rows)[start:stop]
+
+    batch = {}
+    if "csv" in formats:
+        batch["csv"] = b"".join(
+            map(
+                bytes.__add__,
+                tables["stations"][station_idx].tolist(),
+                tables["temperatures"][temperature_idx].tolist(),
+            )
+        )
+    if any(file_format != "csv" for file_format in formats):
+        batch["columnar"] = (
+            tables["codes"][station_idx],
+            (temperature_idx - 999).astype(np.int16),
+        )
+    return batch
+
+
+class ColumnarWriter:
+    """
+    Writes station codes and int16 tenths to Parquet or Arrow IPC, with a dictionary-encoded
+    station column and row groups (record batches, for Arrow) of exactly row_group_size rows
+    """
+
+    def __init__(self, path, file_format, dictionary, row_group_size):
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.dictionary = pa.array(dictionary, pa.string())
+        self.schema = pa.schema(
+            [
+                ("station", pa.dictionary(pa.int16(), pa.string())),
+                (TEMPERATURE_COLUMN, pa.int16()),
+            ]
+        )
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, station_codes, tenths):
+        stations = pa.DictionaryArray.from_arrays(
+            pa.array(station_codes, pa.int16()), self.dictionary
+        )
+        self.pending.append(
+            pa.table([stations, pa.array(tenths, pa.int16())], schema=self.schema)
+        )
+        self.pending_rows += len(tenths)
+        if self.pending_rows >= self.row_group_size:
+            self.flush(full_groups_only=True)
+
+    def flush(self, full_groups_only=False):
+        if not self.pending_rows:
+            return
+        table = pa.concat_tables(self.pending)
+        rows = self.pending_rows
+        if full_groups_only:
+            rows -= rows % self.row_group_size
+        if self.file_format == "parquet":
+            self.writer.write_table(
+                table.slice(0, rows), row_group_size=self.row_group_size
+            )
+        else:
+            # one contiguous chunk, so record batches are exactly row_group_size rows
+            self.writer.write_table(
+                table.slice(0, rows).combine_chunks(),
+                max_chunksize=self.row_group_size,
+            )
+        self.pending = [table.slice(rows)]
+        self.pending_rows -= rows
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def format_path(output_path, file_format):
+    if file_format == "csv":
+        return output_path
+    return os.path.splitext(output_path)[0] + FORMATS[file_format]
+
+
+class DatasetWriter:
+    """
+    Writes the same batches to every requested format, next to each other (<output>.csv, .parquet, .arrow)
+    """
+
+    def __init__(self, output_path, formats, row_group_size):
+        self.paths = [format_path(output_path, file_format) for file_format in formats]
+        self.csv_file = None
+        self.columnar = []
+        for file_format, path in zip(formats, self.paths):
+            if file_format == "csv":
+                self.csv_file = open(path, "wb")
+            else:
+                self.columnar.append(
+                    ColumnarWriter(
+                        path, file_format, _lookup_tables["dictionary"], row_group_size
+                    )
+                )
+
+    def write(self, batch):
+        if self.csv_file is not None:
+            self.csv_file.write(batch["csv"])
+        for writer in self.columnar:
+            writer.write(*batch["columnar"])
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+        for writer in self.columnar:
+            writer.close()
+
+
+def build_batch_task(task):
+    return build_batch(*task)
+
+
+def write_shard_task(task):
+    """
+    Writes a contiguous range of rows to one shard (one file per format), returns the number of rows
+    """
+    seed, path, pieces, formats, row_group_size = task
+    writer = DatasetWriter(path, formats, row_group_size)
+    for batch_index, rows, start, stop in pieces:
+        writer.write(build_batch(seed, batch_index, rows, formats, start, stop))
+    writer.close()
+    return sum(stop - start for _, _, start, stop in pieces)
+
+
+def shard_pieces(num_rows, shards):
+    """
+    Splits rows (not batches) evenly across shards: shard i gets rows [i*N/shards, (i+1)*N/shards),
+    as (batch_index, batch_rows, start, stop) slices of the batches those rows fall in
+    """
+    for shard in range(shards):
+        low, high = num_rows * shard // shards, num_rows * (shard + 1) // shards
+        pieces = []
+        for batch_index in range(low // BATCH_ROWS, -(-high // BATCH_ROWS)):
+            first = batch_index * BATCH_ROWS
+            rows = min(BATCH_ROWS, num_rows - first)
+            pieces.append(
+                (
+                    batch_index,
+                    rows,
+                    max(low, first) - first,
+                    min(high, first + rows) - first,
+                )
+            )
+        yield pieces
+
+
+def shard_paths(output_path, shards):
+    root, ext = os.path.splitext(output_path)
+    return [f"{root}_{shard:03d}{ext}" for shard in range(shards)]
+
+
+def build_test_data_parallel(
+    weather_station_names,
+    num_rows_to_create,
+    output_path,
+    workers,
+    seed,
+    shards,
+    formats=("csv",),
+    row_group_size=DEFAULT_ROW_GROUP_SIZE,
+):
+    """
+    Generates the test data in NumPy batches across worker processes, in CSV and/or the columnar
+    formats, into one file per format or one shard per worker
+    """
+    start_time = time.time()
+    lookup_tables = build_lookup_tables(weather_station_names, seed)
+    init_worker(lookup_tables)
+    batches = [
+        (batch_index, min(BATCH_ROWS, num_rows_to_create - batch_index * BATCH_ROWS))
+        for batch_index in range(-(-num_rows_to_create // BATCH_ROWS))
+    ]
+    print(f"Building test data with {workers} processes (seed {seed})...")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    done = progress = 0
+    with multiprocessing.Pool(
+        workers, initializer=init_worker, initargs=(lookup_tables,)
+    ) as pool:
+        if shards:
+            count = min(workers, num_rows_to_create)
+            if count < workers:
+                print(f"Only {count} rows: writing {count} shards instead of {workers}")
+            tasks = [
+                (seed, path, pieces, formats, row_group_size)
+                for path, pieces in zip(
+                    shard_paths(output_path, count),
+                    shard_pieces(num_rows_to_create, count),
+                )
+            ]
+            for rows in pool.imap_unordered(write_shard_task, tasks):
+                done += rows
+                progress = print_progress(done, num_rows_to_create, progress)
+            written = [
+                format_path(task[1], file_format)
+                for task in tasks
+                for file_format in formats
+            ]
+        else:
+            writer = DatasetWriter(output_path, formats, row_group_size)
+            tasks = [
+                (seed, batch_index, rows, formats) for batch_index, rows in batches
+            ]
+            results = pool.imap(build_batch_task, tasks)
+            for (_, rows), batch in zip(batches, results):
+                writer.write(batch)
+                done += rows
+                progress = print_progress(done, num_rows_to_create, progress)
+            writer.close()
+            written = writer.paths
+    sys.stdout.write("\n")
+
+    elapsed_time = time.time() - start_time
+
+    print(f"Test data successfully written to {', '.join(written)}")
+    for file_format in formats:
+        file_size = sum(
+            os.path.getsize(path)
+            for path in written[formats.index(file_format) :: len(formats)]
+        )
+        print(f"Actual file size ({file_format}):  {convert_bytes(file_size)}")
+    print(f"Elapsed time: {format_elapsed_time(elapsed_time)}")
+
+
 def main():
     """
     main program function
     """
-    check_args(sys.argv)
-    num_rows_to_create = int(sys.argv[1])
+    args = check_args(sys.argv)
+    num_rows_to_create = args.rows
     weather_station_names = []
     weather_station_names = build_weather_station_name_list()
     print(estimate_file_size(weather_station_names, num_rows_to_create))
-    build_test_data(weather_station_names, num_rows_to_create)
+    if (
+        args.workers is None
+        and args.seed is None
+        and not args.shards
+        and args.formats == ["csv"]
+    ):
+        build_test_data(weather_station_names, num_rows_to_create, args.output)
+    else:
+        build_test_data_parallel(
+            weather_station_names,
+            num_rows_to_create,
+            args.output,
+            args.workers or os.cpu_count() or 1,
+            DEFAULT_SEED if args.seed is None else args.seed,
+            args.shards,
+            args.formats,
+            args.row_group_size,
+        )
     print("Test data build complete.")
 
 
 if __name__ == "__main__":
     main()
-exit()
+    exit()
@@ -64,106 +64,264 @@
 
 # dashboard/app_duckdb_csv_table.py
 
+import duckdb
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from pathlib import Path
 
-# Caminho do arquivo CSV
-csv_path = Path(__file__).resolve().parent.parent / "data" / "station_metrics_mart.csv"
+# Caminho do mart: Parquet (create_station_metrics_mart.py), com o CSV de fallback
+data_dir = Path(__file__).resolve().parent.parent / "data"
+parquet_path = data_dir / "station_metrics_mart.parquet"
+csv_path = data_dir / "station_metrics_mart.csv"
+
+# Colunas ordenáveis (rótulo → coluna do mart) e tamanhos de página da tabela
+SORT_COLUMNS = {
+    "Estação": "Station",
+    "Temperatura Média": "Average Temperature (°C)",
+    "Temperatura Mínima": "Min Temperature (°C)",
+    "Temperatura Máxima": "Max Temperature (°C)",
+}
+PAGE_SIZES = [50, 100, 500, 1000]
+AXIS_LABELS = {
+    "Average Temperature (°C)": "Temperatura Média (°C)",
+    "Min Temperature (°C)": "Temp. Mínima (°C)",
+    "Max Temperature (°C)": "Temp. Máxima (°C)",
+}
+HISTOGRAM_BINS = 40  # Faixas de temperatura por histograma
+MAX_SCATTER_POINTS = 20_000  # Acima disso a dispersão usa uma amostra das estações
 
 # Título principal
 st.set_page_config(page_title="Dashboard de Estações", layout="wide")
 st.title("📊 Tabela de Medidas - DuckDB")
 
 
-# Lê o CSV com cache para otimizar desempenho
-@st.cache_data
-def load_data(path):
-    return pd.read_csv(path, sep=";")
+# Uma conexão DuckDB por processo, com o mart como view sobre o arquivo: filtros,
+# ordenação e paginação viram SQL e só as linhas pedidas saem do DuckDB. O mtime
+# entra na chave, então um mart regravado recria a view
+@st.cache_resource(max_entries=1)
+def get_connection(path, mtime_ns):
+    quoted = str(path).replace("'", "''")
+    if path.suffix == ".parquet":
+        source = f"read_parquet('{quoted}')"
+    else:
+        source = f"read_csv('{quoted}', delim = ';', header = true)"
+    con = duckdb.connect()
+    con.execute(f"CREATE VIEW mart AS SELECT * FROM {source}")
+    return con
+
+
+# Resultado de cada consulta em cache por SQL, parâmetros e mtime: reruns com os
+# mesmos filtros não voltam ao DuckDB
+@st.cache_data(max_entries=256)
+def run_query(path, mtime_ns, sql, params=()):
+    # Cursor próprio: o Streamlit atende cada sessão em uma thread
+    with get_connection(path, mtime_ns).cursor() as cursor:
+        return cursor.execute(sql, list(params)).df()
+
+
+# Barras de uma métrica: as N estações de maior (ou menor) valor, ou a contagem
+# de estações por faixa de temperatura; nunca mais que algumas dezenas de barras
+def metric_figure(path, mtime_ns, where, params, view, top_n, column, title, scale):
+    label = AXIS_LABELS[column]
+    if view == "Histograma":
+        bins = run_query(
+            path,
+            mtime_ns,
+            f"""
+            WITH bounds AS (
+                SELECT
+                    min("{column}") AS low,
+                    greatest(max("{column}") - min("{column}"), 0.01) / ? AS width
+                FROM mart {where}
+            )
+            SELECT
+                any_value(low) + any_value(width) * (bin + 0.5) AS center,
+                any_value(width) AS width,
+                count(*) AS stations
+            FROM (
+                SELECT
+                    low,
+                    width,
+                    least(floor(("{column}" - low) / width), ? - 1) AS bin
+                FROM mart, bounds {where}
+            )
+            GROUP BY bin
+            ORDER BY bin
+            """,
+            (HISTOGRAM_BINS,) + params + (HISTOGRAM_BINS,) + params,
+        )
+        fig = px.bar(
+            bins,
+            x="center",
+            y="stations",
+            title=f"{title} — distribuição",
+            labels={"center": label, "stations": "Estações"},
+            color="center" if scale else None,
+            color_continuous_scale=scale,
+        )
+        fig.update_traces(width=bins["width"])
+        return fig
+
+    direction = "DESC" if view == "Top N" else "ASC"
+    df_top = run_query(
+        path,
+        mtime_ns,
+        f"""
+        SELECT "Station", "{column}" FROM mart {where}
+        ORDER BY "{column}" {direction}, "Station"
+        LIMIT ?
+        """,
+        params + (top_n,),
+    )
+    return px.bar(
+        df_top,
+        x="Station",
+        y=column,
+        title=f"{title} — {view.replace('N', str(top_n))}",
+        labels={column: label},
+        color=column if scale else None,
+        color_continuous_scale=scale,
+    )
 
 
-# Verifica se arquivo existe e carrega dados
-if not csv_path.exists():
-    st.error(f"❌ Arquivo não encontrado: {csv_path}")
+# Figuras prontas em cache por filtro e visualização: um rerun sem mudança de
+# filtro (troca de página, ordenação) reaproveita os gráficos sem consultar nada
+@st.cache_data(max_entries=64)
+def build_figures(path, mtime_ns, where, params, view, top_n):
+    figures = [
+        metric_figure(path, mtime_ns, where, params, view, top_n, column, title, scale)
+        for column, title, scale in [
+            ("Average Temperature (°C)", "Temperatura Média por Estação", None),
+            ("Min Temperature (°C)", "Temperatura Mínima por Estação", "blues"),
+            ("Max Temperature (°C)", "Temperatura Máxima por Estação", "reds"),
+        ]
+    ]
+
+    # Amostra reprodutível direto no DuckDB quando o filtro passa do limite
+    points = run_query(
+        path,
+        mtime_ns,
+        f"""
+        SELECT * FROM (
+            SELECT
+                "Station",
+                "Min Temperature (°C)",
+                "Max Temperature (°C)",
+                "Average Temperature (°C)"
+            FROM mart {where}
+        ) USING SAMPLE reservoir({MAX_SCATTER_POINTS} ROWS) REPEATABLE (42)
+        """,
+        params,
+    )
+    fig_scatter = px.scatter(
+        points,
+        x="Min Temperature (°C)",
+        y="Max Temperature (°C)",
+        size=points["Average Temperature (°C)"].abs(),
+        hover_name="Station",
+        title="Relação entre Temp. Mínima e Máxima",
+        labels=AXIS_LABELS,
+        render_mode="webgl",
+    )
+    return (*figures, fig_scatter)
+
+
+# Verifica se o mart existe, preferindo o Parquet
+mart_path = parquet_path if parquet_path.exists() else csv_path
+if not mart_path.exists():
+    st.error(f"❌ Arquivo não encontrado: {parquet_path}")
     st.stop()
+mtime_ns = mart_path.stat().st_mtime_ns
 
+# Filtro por estação (trecho do nome), aplicado no WHERE
+search = st.text_input("🔎 Filtrar estações pelo nome:").strip()
+where, params = "", ()
+if search:
+    where, params = 'WHERE contains(lower("Station"), lower(?))', (search,)
+
+# Métricas resumo (linha com 3 colunas), agregadas pelo DuckDB
 try:
-    df = load_data(csv_path)
+    summary = run_query(
+        mart_path,
+        mtime_ns,
+        f"""
+        SELECT
+            count(*) AS stations,
+            avg("Average Temperature (°C)") AS mean,
+            max("Max Temperature (°C)") AS max,
+            min("Min Temperature (°C)") AS min
+        FROM mart {where}
+        """,
+        params,
+    ).iloc[0]
 except Exception as e:
-    st.error(f"❌ Erro ao ler o CSV: {e}")
+    st.error(f"❌ Erro ao consultar o mart: {e}")
     st.stop()
 
-# Filtro por estação
-station_options = ["Todas"] + sorted(df["Station"].unique().tolist())
-selected_station = st.selectbox("🔎 Selecione uma estação:", station_options)
-
-if selected_station != "Todas":
-    df_filtered = df[df["Station"] == selected_station]
-else:
-    df_filtered = df
+total = int(summary["stations"])
+if total == 0:
+    st.warning("Nenhuma estação encontrada para o filtro.")
+    st.stop()
 
-# Métricas resumo (linha com 3 colunas)
 col1, col2, col3 = st.columns(3)
-col1.metric("🌡️ Média Geral", f"{df_filtered['Average Temperature (°C)'].mean():.2f} °C")
-col2.metric("🔥 Máxima Geral", f"{df_filtered['Max Temperature (°C)'].max():.2f} °C")
-col3.metric("❄️ Mínima Geral", f"{df_filtered['Min Temperature (°C)'].min():.2f} °C")
+col1.metric("🌡️ Média Geral", f"{summary['mean']:.2f} °C")
+col2.metric("🔥 Máxima Geral", f"{summary['max']:.2f} °C")
+col3.metric("❄️ Mínima Geral", f"{summary['min']:.2f} °C")
 
-# Exibe tabela interativa
+# Ordenação e paginação no servidor: ORDER BY + LIMIT/OFFSET
 st.subheader("📋 Tabela com Estatísticas por Estação")
-st.dataframe(df_filtered, use_container_width=True)
+col_sort, col_order, col_size, col_page = st.columns(4)
+sort_label = col_sort.selectbox("Ordenar por:", list(SORT_COLUMNS))
+descending = col_order.radio("Ordem:", ["Crescente", "Decrescente"], horizontal=True)
+page_size = col_size.selectbox("Linhas por página:", PAGE_SIZES, index=1)
+pages = -(-total // page_size)
+page = col_page.number_input(f"Página (de {pages}):", 1, pages, 1)
+
+direction = "DESC" if descending == "Decrescente" else "ASC"
+df_page = run_query(
+    mart_path,
+    mtime_ns,
+    f"""
+    SELECT * FROM mart {where}
+    ORDER BY "{SORT_COLUMNS[sort_label]}" {direction}, "Station"
+    LIMIT ? OFFSET ?
+    """,
+    params + (page_size, (page - 1) * page_size),
+)
+first = (page - 1) * page_size + 1
+st.caption(f"Estações {first:,}–{first + len(df_page) - 1:,} de {total:,}")
+st.dataframe(df_page, use_container_width=True, hide_index=True)
+
+# Gráficos sobre todas as estações do filtro, com tamanho fixo qualquer que seja o
+# mart: barras só do top/bottom N ou histograma em faixas (binning no DuckDB), e
+# dispersão em WebGL com no máximo MAX_SCATTER_POINTS pontos sorteados
+st.subheader("📊 Gráficos por Estação")
+col_view, col_n = st.columns(2)
+view = col_view.radio(
+    "Visualização:", ["Top N", "Bottom N", "Histograma"], horizontal=True
+)
+top_n = col_n.slider("N estações:", 5, 100, 20, disabled=view == "Histograma")
+
+fig_mean, fig_min, fig_max, fig_scatter = build_figures(
+    mart_path, mtime_ns, where, params, view, top_n
+)
 
 # Gráfico 1 — Temperatura média
 st.subheader("📈 Temperatura Média por Estação")
-fig_mean = px.bar(
-    df_filtered,
-    x="Station",
-    y="Average Temperature (°C)",
-    title="Temperatura Média por Estação",
-    labels={"Average Temperature (°C)": "Temperatura Média (°C)"},
-)
 st.plotly_chart(fig_mean, use_container_width=True)
 
 # Gráfico 2 — Temperatura mínima
 st.subheader("🌡️ Temperatura Mínima por Estação")
-fig_min = px.bar(
-    df_filtered,
-    x="Station",
-    y="Min Temperature (°C)",
-    title="Temperatura Mínima por Estação",
-    labels={"Min Temperature (°C)": "Temp. Mínima (°C)"},
-    color="Min Temperature (°C)",
-    color_continuous_scale="blues",
-)
 st.plotly_chart(fig_min, use_container_width=True)
 
 # Gráfico 3 — Temperatura máxima
 st.subheader("🔥 Temperatura Máxima por Estação")
-fig_max = px.bar(
-    df_filtered,
-    x="Station",
-    y="Max Temperature (°C)",
-    title="Temperatura Máxima por Estação",
-    labels={"Max Temperature (°C)": "Temp. Máxima (°C)"},
-    color="Max Temperature (°C)",
-    color_continuous_scale="reds",
-)
 st.plotly_chart(fig_max, use_container_width=True)
 
 # Gráfico 4 — Dispersão temperatura mínima vs máxima
 st.subheader("📍 Dispersão: Temperaturas Mínima vs Máxima")
-fig_scatter = px.scatter(
-    df_filtered,
-    x="Min Temperature (°C)",
-    y="Max Temperature (°C)",
-    size=df_filtered["Average Temperature (°C)"].abs(),  # <- aqui está a correção
-    hover_name="Station",
-    title="Relação entre Temp. Mínima e Máxima",
-    labels={
-        "Min Temperature (°C)": "Temp. Mínima (°C)",
-        "Max Temperature (°C)": "Temp. Máxima (°C)",
-    },
-)
+if total > MAX_SCATTER_POINTS:
+    st.caption(f"Amostra de {MAX_SCATTER_POINTS:,} das {total:,} estações do filtro.")
 st.plotly_chart(fig_scatter, use_container_width=True)
 # Rodapé com informações adicionais
 st.markdown("---")
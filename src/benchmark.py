@@ -0,0 +1,308 @@
+# src/benchmark.py
+
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import pandas as pd
+
+from budget import parse_memory
+from engines import ENGINES
+
+# 📁 Caminhos principais
+BASE_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = Path(__file__).resolve().parent
+GENERATOR_PATH = BASE_DIR / "create_measurements.py"
+INPUTS_DIR = BASE_DIR / "data" / "benchmark" / "inputs"
+RESULTS_DIR = BASE_DIR / "data" / "benchmark" / "results"
+DEFAULT_SIZES = ["1M", "10M"]  # 100M e 1B ficam a critério de quem roda
+DEFAULT_REPEAT = 3
+INPUT_SEED = 0  # Mesma semente = mesmas entradas em qualquer máquina
+MULTIPLIERS = {"K": 1_000, "M": 1_000_000, "B": 1_000_000_000}
+SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+# 🔢 Converte "10M", "1B" ou "1_000_000" em número de linhas
+def parse_rows(value: str) -> int:
+    value = value.strip().upper()
+    multiplier = MULTIPLIERS.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    rows = int(float(value) * multiplier)
+    if rows <= 0:
+        raise ValueError(f"Invalid number of rows: {value}")
+    return rows
+
+
+# 📥 Gera (ou reaproveita) a entrada com `rows` linhas no formato pedido
+def ensure_input(
+    rows: int, file_format: str = "csv", inputs_dir: Path = INPUTS_DIR
+) -> Path:
+    name = f"weather_stations_{rows}_seed{INPUT_SEED}{SUFFIXES[file_format]}"
+    path = inputs_dir / name
+    if path.exists():
+        print(f"♻️  Reusing {path}")
+        return path
+
+    print(f"🏗️  Generating {rows:,} rows into {path}...")
+    tmp_dir = inputs_dir / "tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    subprocess.run(
+        [
+            sys.executable,
+            str(GENERATOR_PATH),
+            str(rows),
+            str(tmp_dir / name),
+            "--workers",
+            str(os.cpu_count() or 1),
+            "--seed",
+            str(INPUT_SEED),
+            "--format",
+            file_format,
+        ],
+        cwd=BASE_DIR,  # o gerador lê data/model.csv relativo à raiz
+        check=True,
+    )
+    (tmp_dir / name).replace(path)
+    tmp_dir.rmdir()
+    return path
+
+
+# ⏱️ Executa uma engine num subprocesso novo e coleta wall/CPU/RSS via wait4
+def run_engine(
+    engine: str,
+    input_path: Path,
+    run_dir: Path,
+    threads: int,
+    memory_limit: Optional[str] = None,
+) -> Dict[str, float]:
+    output_dir = run_dir / "output"
+    shutil.rmtree(run_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    command = [
+        sys.executable,
+        str(SRC_DIR / "cli.py"),
+        "run",
+        "--engine",
+        engine,
+        "--input",
+        str(input_path),
+        "--output-dir",
+        str(output_dir),
+        "--log-dir",
+        str(run_dir / "logs"),
+        "--threads",
+        str(threads),
+        "--no-cache",  # Mede a engine, não a cópia do resultado em cache
+    ]
+    if memory_limit:
+        command += ["--memory-limit", memory_limit]
+    with (run_dir / "stdout.txt").open("w") as stdout:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=SRC_DIR, stdout=stdout, stderr=subprocess.STDOUT
+        )
+        # wait4 devolve o rusage do filho, incluindo os processos que ele aguardou
+        # (workers de multiprocessing); ru_maxrss é o pico do maior processo, em KiB
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)  # já coletado pelo wait4
+
+    output_files = {f.name: f.stat().st_size for f in output_dir.iterdir()}
+    input_bytes = input_path.stat().st_size
+    return {
+        "exit_code": process.returncode,
+        "wall_s": wall,
+        "cpu_user_s": usage.ru_utime,
+        "cpu_sys_s": usage.ru_stime,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mib": usage.ru_maxrss / 1024,
+        "input_bytes": input_bytes,
+        "bytes_per_s": input_bytes / wall if wall else 0.0,
+        "output_bytes": sum(output_files.values()),
+        "output_files": json.dumps(output_files, sort_keys=True),
+    }
+
+
+# 📊 Tabela resumo: mediana e melhor tempo por engine e tamanho
+def summarize(runs: pd.DataFrame) -> pd.DataFrame:
+    ok = runs[runs["exit_code"] == 0]
+    summary = (
+        ok.groupby(["rows", "format", "engine"])
+        .agg(
+            runs=("wall_s", "size"),
+            wall_median_s=("wall_s", "median"),
+            wall_min_s=("wall_s", "min"),
+            cpu_median_s=("cpu_s", "median"),
+            peak_rss_max_mib=("peak_rss_mib", "max"),
+            mib_per_s=("bytes_per_s", "median"),
+            output_bytes=("output_bytes", "max"),
+        )
+        .reset_index()
+    )
+    summary["mib_per_s"] = summary["mib_per_s"] / (1024 * 1024)
+    return summary.sort_values(["rows", "format", "wall_median_s"]).round(3)
+
+
+# 📏 Memória limitada: o pico no maior tamanho não pode passar de `factor` vezes o
+# pico no menor, para cada (formato, engine) medido em mais de um tamanho
+def memory_bound_violations(summary: pd.DataFrame, factor: float) -> pd.DataFrame:
+    rows = []
+    for (file_format, engine), group in summary.groupby(["format", "engine"]):
+        if group["rows"].nunique() < 2:
+            continue
+        group = group.sort_values("rows")
+        smallest, largest = group.iloc[0], group.iloc[-1]
+        ratio = largest["peak_rss_max_mib"] / smallest["peak_rss_max_mib"]
+        if ratio > factor:
+            rows.append(
+                {
+                    "format": file_format,
+                    "engine": engine,
+                    "rows_min": smallest["rows"],
+                    "rows_max": largest["rows"],
+                    "peak_rss_min_mib": smallest["peak_rss_max_mib"],
+                    "peak_rss_max_mib": largest["peak_rss_max_mib"],
+                    "ratio": round(ratio, 2),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+# 💾 Grava execuções (JSON + Parquet) e o resumo (CSV)
+def save_results(runs: List[Dict], results_dir: Path) -> pd.DataFrame:
+    results_dir.mkdir(parents=True, exist_ok=True)
+    df_runs = pd.DataFrame(runs)
+    (results_dir / "runs.json").write_text(json.dumps(runs, indent=2))
+    df_runs.to_parquet(results_dir / "runs.parquet", index=False)
+    summary = summarize(df_runs)
+    summary.to_csv(results_dir / "summary.csv", sep=";", index=False)
+    print(f"✅ Results saved to {results_dir}")
+    return summary
+
+
+# 🔁 Pipeline principal
+def run_benchmark(
+    sizes: List[int],
+    engines: List[str],
+    repeat: int,
+    threads: int,
+    results_dir: Path,
+    formats: Sequence[str] = ("csv",),
+    memory_limit: Optional[str] = None,
+) -> pd.DataFrame:
+    environment = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "threads": threads,
+        "memory_limit": memory_limit,
+    }
+    runs = []
+    for rows in sizes:
+        for file_format in formats:
+            input_path = ensure_input(rows, file_format)
+            for engine in engines:
+                if file_format not in ENGINES[engine].formats:
+                    continue  # CSV-only engines ficam fora das entradas colunares
+                for attempt in range(1, repeat + 1):
+                    run_name = f"{engine}_{rows}_{file_format}_{attempt}"
+                    run_dir = results_dir / "runs" / run_name
+                    result = run_engine(
+                        engine, input_path, run_dir, threads, memory_limit
+                    )
+                    status = "✅" if result["exit_code"] == 0 else "❌"
+                    print(
+                        f"{status} {engine:<20} {rows:>14,} rows  {file_format:<8}"
+                        f"run {attempt}/{repeat}  {result['wall_s']:8.2f}s  "
+                        f"{result['peak_rss_mib']:8.1f} MiB"
+                    )
+                    runs.append(
+                        {
+                            "timestamp": datetime.now().isoformat(),
+                            "engine": engine,
+                            "rows": rows,
+                            "format": file_format,
+                            "run": attempt,
+                            **environment,
+                            **result,
+                        }
+                    )
+
+    summary = save_results(runs, results_dir)
+    print(summary.to_string(index=False))
+    return summary
+
+
+# ▶️ Execução
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark reprodutível das engines")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Tamanhos de entrada em linhas (ex.: 1M 10M 100M 1B)",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=sorted(ENGINES),
+        default=list(ENGINES),
+        help="Engines a medir (padrão: todas)",
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=sorted(SUFFIXES),
+        default=["csv"],
+        help="Formatos de entrada; engines só de CSV pulam os colunares",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--threads", "--workers", dest="threads", type=int, default=os.cpu_count() or 1
+    )
+    parser.add_argument(
+        "--memory-limit", help="Teto de memória repassado às engines (ex.: 2GB)"
+    )
+    parser.add_argument(
+        "--assert-bounded-memory",
+        type=float,
+        metavar="FACTOR",
+        help="Falha se o pico de RSS no maior tamanho passar de FACTOR vezes o "
+        "do menor (use com --memory-limit e ao menos dois --sizes)",
+    )
+    parser.add_argument(
+        "--results-dir",
+        type=Path,
+        default=RESULTS_DIR / datetime.now().strftime("%Y%m%d_%H%M%S"),
+    )
+    args = parser.parse_args()
+    if args.memory_limit:
+        parse_memory(args.memory_limit)  # Falha cedo, antes de gerar entradas
+
+    summary = run_benchmark(
+        [parse_rows(size) for size in args.sizes],
+        args.engines,
+        max(1, args.repeat),
+        max(1, args.threads),
+        args.results_dir,
+        args.formats,
+        args.memory_limit,
+    )
+    if args.assert_bounded_memory is not None:
+        violations = memory_bound_violations(summary, args.assert_bounded_memory)
+        if not violations.empty:
+            print("❌ Peak memory grew with input size:")
+            print(violations.to_string(index=False))
+            sys.exit(1)
+        print(
+            f"✅ Peak memory stayed within {args.assert_bounded_memory}x across sizes"
+        )
@@ -0,0 +1,106 @@
+# src/budget.py
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+import os
+import re
+
+MEMORY_UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 1000,
+    "MB": 1000**2,
+    "GB": 1000**3,
+    "TB": 1000**4,
+    "KIB": 1024,
+    "MIB": 1024**2,
+    "GIB": 1024**3,
+    "TIB": 1024**4,
+}
+BUDGET_FRACTION = 0.5  # Parte do limite usada pelos buffers; o resto fica de folga
+MIN_CHUNK_ROWS = 100_000  # Abaixo disso o overhead por chunk domina
+MIN_BLOCK_BYTES = 1024 * 1024
+
+
+def parse_memory(value: str) -> int:
+    """Converte "4GB", "512MiB", "1.5GiB" ou "1000000" em bytes."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([A-Za-z]*)\s*", value)
+    unit = match.group(2).upper() if match else None
+    if unit not in MEMORY_UNITS:
+        raise ValueError(f"Invalid memory limit '{value}' (use e.g. 512MiB, 4GB, 8GiB)")
+    limit = int(float(match.group(1)) * MEMORY_UNITS[unit])
+    if limit <= 0:
+        raise ValueError(f"Invalid memory limit '{value}'")
+    return limit
+
+
+def available_memory() -> Optional[int]:
+    """Memória física livre em bytes (sysconf); None se a plataforma não informa."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+@dataclass(frozen=True)
+class ResourceBudget:
+    """
+    Teto de paralelismo e de memória respeitado por todas as engines.
+    `threads` vira o número de processos das engines em Python e o pool de
+    threads de Polars, DuckDB e Arrow; `memory_limit` (bytes, None = sem
+    limite) dimensiona chunks e blocos e vira o memory_limit do DuckDB.
+    """
+
+    threads: int = os.cpu_count() or 1
+    memory_limit: Optional[int] = None
+
+    def per_worker(self, workers: int) -> Optional[int]:
+        """Memória disponível para os buffers de cada processo worker."""
+        if self.memory_limit is None:
+            return None
+        return int(self.memory_limit * BUDGET_FRACTION / max(1, workers))
+
+    def fits(self, estimated_bytes: int) -> bool:
+        """Se `estimated_bytes` cabe no limite (sem ele, na memória física livre)."""
+        ceiling = self.memory_limit
+        if ceiling is None:
+            ceiling = available_memory()
+            if ceiling is None:
+                return True
+        return estimated_bytes <= ceiling * BUDGET_FRACTION
+
+    def chunk_rows(self, default: int, bytes_per_row: int, workers: int = 1) -> int:
+        """Linhas por chunk: o padrão da engine, reduzido para caber no orçamento."""
+        per_worker = self.per_worker(workers)
+        if per_worker is None:
+            return default
+        return max(MIN_CHUNK_ROWS, min(default, per_worker // bytes_per_row))
+
+    def block_bytes(self, default: int, overhead: int, workers: int = 1) -> int:
+        """Bytes por bloco lido, sabendo que o processamento ocupa `overhead` × o bloco."""
+        per_worker = self.per_worker(workers)
+        if per_worker is None:
+            return default
+        return max(MIN_BLOCK_BYTES, min(default, per_worker // overhead))
+
+    def duckdb_settings(self, temp_directory: Path) -> Dict[str, str]:
+        """SETs do DuckDB: threads, memory_limit e diretório de spill em disco."""
+        settings = {"threads": str(self.threads)}
+        if self.memory_limit is not None:
+            settings["memory_limit"] = f"{self.memory_limit // 1024**2}MiB"
+            settings["temp_directory"] = temp_directory.as_posix()
+            # Sem ordem de inserção o DuckDB pode fazer streaming de mais operadores
+            settings["preserve_insertion_order"] = "false"
+        return settings
+
+    def apply_environment(self) -> None:
+        """
+        Ajusta pools de threads globais. Precisa rodar antes de importar Polars,
+        que lê POLARS_MAX_THREADS uma única vez.
+        """
+        import pyarrow as pa  # Tardio: só quem ajusta os pools paga o import do Arrow
+
+        os.environ["POLARS_MAX_THREADS"] = str(self.threads)
+        pa.set_cpu_count(self.threads)
+        pa.set_io_thread_count(self.threads)
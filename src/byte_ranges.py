@@ -0,0 +1,97 @@
+# src/byte_ranges.py
+
+import io
+import mmap
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024 * 1024  # Tamanho padrão dos blocos lidos por worker
+
+
+def split_byte_ranges(
+    path: Path, parts: int, start: int = 0, end: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Divide [início, fim) do arquivo (padrão: o arquivo todo) em até `parts`
+    intervalos alinhados em quebras de linha. `start` deve ser início de linha.
+    """
+    end = path.stat().st_size if end is None else end
+    size = end - start
+    if size <= 0:
+        return []
+    parts = max(1, min(parts, size))
+
+    bounds = [start]
+    with (
+        path.open("rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        for i in range(1, parts):
+            target = max(start + size * i // parts, bounds[-1])
+            newline = mm.find(b"\n", target, end)
+            if newline == -1:
+                break
+            bounds.append(newline + 1)
+    bounds.append(end)
+
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def complete_lines_end(path: Path) -> int:
+    """Offset logo após a última quebra de linha (ignora uma linha ainda sendo gravada)."""
+    size = path.stat().st_size
+    if size == 0:
+        return 0
+    with (
+        path.open("rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        return mm.rfind(b"\n") + 1
+
+
+def iter_blocks(
+    mm: mmap.mmap, start: int, end: int, block_size: int = BLOCK_SIZE
+) -> Iterator[bytes]:
+    """Percorre o intervalo [início, fim) em blocos que terminam sempre em fim de linha."""
+    pos = start
+    while pos < end:
+        stop = min(pos + block_size, end)
+        if stop < end:
+            newline = mm.rfind(b"\n", pos, stop)
+            if newline == -1:
+                # Linha maior que o bloco: estende até a próxima quebra
+                newline = mm.find(b"\n", stop, end)
+                stop = end if newline == -1 else newline + 1
+            else:
+                stop = newline + 1
+        yield mm[pos:stop]
+        pos = stop
+
+
+class RangeReader(io.RawIOBase):
+    """Arquivo binário somente leitura restrito ao intervalo [início, fim)."""
+
+    def __init__(self, path: Path, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        n_read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= n_read
+        return n_read
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def open_byte_range(path: Path, start: int, end: int) -> io.BufferedReader:
+    """Abre o intervalo [início, fim) como um arquivo comum (ex.: para pd.read_csv)."""
+    return io.BufferedReader(RangeReader(path, start, end))
@@ -0,0 +1,255 @@
+# src/cli.py
+
+from argparse import ArgumentParser
+from pathlib import Path
+import sys
+import time
+
+from budget import ResourceBudget, parse_memory
+from columnar import input_format
+from engines import ENGINES, EngineOptions, get_engine
+from resource_sampler import ResourceSampler
+from result_cache import (
+    CACHE_DIR,
+    CACHE_MAX_BYTES,
+    RESULT_SCHEMA,
+    VARIANCE_RESULT_SCHEMA,
+    ResultCache,
+    cache_key,
+    source_digest,
+)
+from shards import expand_inputs
+
+
+def build_parser() -> ArgumentParser:
+    defaults = EngineOptions()
+    parser = ArgumentParser(
+        prog="billion-challenge",
+        description="Runner único das ETLs do One Billion Rows Challenge",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="Lista as engines disponíveis")
+
+    run = subparsers.add_parser("run", help="Executa uma engine")
+    run.add_argument("--engine", required=True, choices=sorted(ENGINES))
+    run.add_argument(
+        "--input",
+        type=Path,
+        default=defaults.input_path,
+        help="Arquivo, diretório de shards ou glob (ex.: '../data/shards/*.csv')",
+    )
+    run.add_argument("--output-dir", type=Path, default=defaults.output_dir)
+    run.add_argument("--log-dir", type=Path, default=defaults.log_dir)
+    run.add_argument(
+        "--threads",
+        "--workers",
+        dest="threads",
+        type=int,
+        default=defaults.budget.threads,
+        help="Threads de Polars/DuckDB/Arrow e processos das engines em Python/Pandas",
+    )
+    run.add_argument(
+        "--memory-limit",
+        type=parse_memory,
+        help="Teto de memória (ex.: 4GB, 512MiB): dimensiona chunks e blocos, "
+        "vira o memory_limit do DuckDB (com spill em disco) e liga o streaming do Polars",
+    )
+    run.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Agrega só os bytes anexados desde a última execução (estado no output-dir)",
+    )
+    run.add_argument(
+        "--database",
+        type=Path,
+        help="Banco persistente: ingere a entrada uma vez e consulta dele nas próximas execuções",
+    )
+    run.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Executa o plano no engine de streaming (Polars lazy)",
+    )
+    run.add_argument(
+        "--sink",
+        action="store_true",
+        help="Grava CSV e Parquet direto do streaming, sem materializar "
+        "(implica --streaming)",
+    )
+    run.add_argument(
+        "--chunk-size", type=int, help="Linhas por lote do engine de streaming"
+    )
+    run.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação, na mesma passada",
+    )
+    run.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Sempre recalcula, sem consultar nem gravar o cache de resultados",
+    )
+    run.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    run.add_argument(
+        "--cache-max-size",
+        type=parse_memory,
+        default=CACHE_MAX_BYTES,
+        help="Tamanho máximo do cache; as entradas menos usadas saem primeiro",
+    )
+
+    preview = subparsers.add_parser(
+        "preview",
+        help="Estimativa rápida por blocos amostrados, com intervalos de confiança",
+    )
+    preview.add_argument("--input", type=Path, default=defaults.input_path)
+    preview.add_argument("--output-dir", type=Path, default=defaults.output_dir)
+    preview.add_argument(
+        "--error",
+        type=float,
+        default=0.5,
+        help="Meia-largura máxima do IC da média, em °C (padrão: %(default)s)",
+    )
+    preview.add_argument(
+        "--time-budget",
+        type=float,
+        default=30.0,
+        help="Segundos de leitura antes de parar (padrão: %(default)s)",
+    )
+    preview.add_argument("--confidence", type=float, default=0.95)
+    preview.add_argument("--seed", type=int, help="Semente do sorteio dos blocos")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "list":
+        for engine in ENGINES.values():
+            print(
+                f"{engine.name:<22}{engine.description:<52}{', '.join(engine.formats)}"
+            )
+        return 0
+    if args.command == "preview":
+        return run_preview_command(args)
+
+    engine = get_engine(args.engine)
+    try:
+        paths = expand_inputs(args.input)
+        file_format = input_format(paths[0])
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    if file_format not in engine.formats:
+        print(
+            f"❌ Engine '{engine.name}' does not read {file_format} input "
+            f"(accepts: {', '.join(engine.formats)})."
+        )
+        return 1
+    if args.incremental and len(paths) > 1:
+        print("❌ Incremental mode reads a single growing file, not a set of shards.")
+        return 1
+    if args.incremental and not engine.incremental:
+        incremental = [e.name for e in ENGINES.values() if e.incremental]
+        print(
+            f"❌ Engine '{engine.name}' has no incremental mode "
+            f"(available: {', '.join(incremental)})."
+        )
+        return 1
+    if args.database and not engine.database:
+        print(f"❌ Engine '{engine.name}' has no persistent database mode.")
+        return 1
+    if (args.streaming or args.sink or args.chunk_size) and not engine.streaming:
+        streaming = [e.name for e in ENGINES.values() if e.streaming]
+        print(
+            f"❌ Engine '{engine.name}' has no streaming mode "
+            f"(available: {', '.join(streaming)})."
+        )
+        return 1
+
+    options = EngineOptions(
+        input_path=args.input.resolve(),
+        output_dir=args.output_dir.resolve(),
+        log_dir=args.log_dir.resolve(),
+        budget=ResourceBudget(max(1, args.threads), args.memory_limit),
+        incremental=args.incremental,
+        database=args.database.resolve() if args.database else None,
+        streaming=args.streaming,
+        sink=args.sink,
+        chunk_size=args.chunk_size,
+        variance=args.variance,
+    )
+    options.output_dir.mkdir(parents=True, exist_ok=True)
+    # Antes de carregar a engine: Polars lê o tamanho do pool ao ser importado
+    options.budget.apply_environment()
+
+    shards = f" ({len(paths)} shards)" if len(paths) > 1 else ""
+    start = time.time()
+    # Incremental e banco persistente já guardam o próprio estado entre execuções
+    cache = None
+    if not (args.no_cache or args.incremental or args.database):
+        cache = ResultCache(args.cache_dir.resolve(), args.cache_max_size)
+        key = cache_key(
+            paths,
+            f"{engine.name}:{source_digest(engine.source())}",
+            VARIANCE_RESULT_SCHEMA if args.variance else RESULT_SCHEMA,
+        )
+        restored = cache.restore(key, options.output_dir)
+        if restored:
+            print(
+                f"♻️  Input unchanged: restored {len(restored)} cached files "
+                f"for '{engine.name}' in {time.time() - start:.2f} seconds."
+            )
+            return 0
+
+    print(f"🚀 Running engine '{engine.name}' on {options.input_path}{shards}")
+    sampler = ResourceSampler()
+    try:
+        with sampler.stage(engine.name):
+            engine.load()(options)
+    except Exception as e:
+        print(f"❌ Engine '{engine.name}' failed: {e}")
+        return 1
+    print(f"📈 {sampler.reports[0].summary()}")
+    if cache is not None:
+        cache.store(
+            key,
+            [options.output_dir / name for name in engine.outputs],
+            {"engine": engine.name, "inputs": [str(path) for path in paths]},
+        )
+    print(f"⏱️  Engine '{engine.name}' finished in {time.time() - start:.2f} seconds.")
+    return 0
+
+
+def run_preview_command(args) -> int:
+    try:
+        paths = expand_inputs(args.input)
+        file_format = input_format(paths[0])
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    if file_format != "csv":
+        print(f"❌ Preview samples byte ranges of CSV input, not {file_format}.")
+        return 1
+    if not 0 < args.confidence < 1:
+        print("❌ --confidence must be between 0 and 1 (e.g. 0.95).")
+        return 1
+
+    # Import tardio, como as engines: NumPy/Arrow só carregam quando usados
+    from sample_preview import run_preview
+
+    output_dir = args.output_dir.resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    run_preview(
+        args.input.resolve(),
+        output_dir / "measurements_sample.csv",
+        output_dir / "measurements_sample.parquet",
+        error_bound=args.error,
+        time_budget=args.time_budget,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# src/columnar.py
+
+from pathlib import Path
+
+# Entradas colunares geradas pelo create_measurements.py (--format parquet arrow):
+# estação dictionary-encoded e temperatura em décimos inteiros (int16)
+TEMPERATURE_COLUMN = "temperature_tenths"
+TEMPERATURE_SCALE = 10
+FORMATS_BY_SUFFIX = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def input_format(path: Path) -> str:
+    """Formato da entrada pela extensão: csv, parquet ou arrow (IPC)."""
+    try:
+        return FORMATS_BY_SUFFIX[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown input format '{path.suffix}'. "
+            f"Available: {', '.join(FORMATS_BY_SUFFIX)}"
+        ) from None
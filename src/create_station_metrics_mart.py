@@ -3,39 +3,73 @@
 import pandas as pd
 from pathlib import Path
 
+from result_cache import cached_call, source_digest
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 INPUT = BASE_DIR / "data" / "measurements_duckDB.csv"
 OUTPUT = BASE_DIR / "data" / "station_metrics_mart.csv"
+# Parquet para o dashboard, que consulta o mart pelo DuckDB sem carregá-lo inteiro
+OUTPUT_PARQUET = OUTPUT.with_suffix(".parquet")
+# Colunas do mart (variância e desvio só quando a entrada os traz)
+MART_SCHEMA = "Station,Min/Average/Max[/Variance/Std Dev] Temperature (°C)/v2"
+# Colunas de variância do measurements_duckDB.csv (rodado com --variance)
+SPREAD_COLUMNS = {
+    "variance": "Temperature Variance (°C²)",
+    "stddev": "Temperature Std Dev (°C)",
+}
+
+
+def build_mart() -> None:
+    # Lê CSV
+    df = pd.read_csv(INPUT, sep=";")
+
+    # Converte colunas numéricas com segurança
+    df["min"] = pd.to_numeric(df["min"], errors="coerce")
+    df["mean"] = pd.to_numeric(df["mean"], errors="coerce")
+    df["max"] = pd.to_numeric(df["max"], errors="coerce")
+    spread = [column for column in SPREAD_COLUMNS if column in df.columns]
+    for column in spread:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+
+    # Agrupa por estação e calcula estatísticas
+    df_out = (
+        df.groupby("station")
+        .agg(
+            {
+                "min": "min",
+                "mean": "mean",
+                "max": "max",
+                # Uma linha por estação na entrada: variância e desvio passam direto
+                **{column: "first" for column in spread},
+            }
+        )
+        .reset_index()
+    )
+
+    # Renomeia colunas para visualização
+    df_out.columns = [
+        "Station",
+        "Min Temperature (°C)",
+        "Average Temperature (°C)",
+        "Max Temperature (°C)",
+        *(SPREAD_COLUMNS[column] for column in spread),
+    ]
+
+    # Salva como CSV
+    df_out.to_csv(OUTPUT, sep=";", index=False)
+    print(f"✅ Arquivo salvo em: {OUTPUT}")
+
+    # Salva como Parquet
+    df_out.to_parquet(OUTPUT_PARQUET, index=False)
+    print(f"✅ Arquivo salvo em: {OUTPUT_PARQUET}")
+
 
-# Lê CSV
-df = pd.read_csv(INPUT, sep=";")
-
-# Converte colunas numéricas com segurança
-df["min"] = pd.to_numeric(df["min"], errors="coerce")
-df["mean"] = pd.to_numeric(df["mean"], errors="coerce")
-df["max"] = pd.to_numeric(df["max"], errors="coerce")
-
-# Agrupa por estação e calcula estatísticas
-df_out = (
-    df.groupby("station")
-    .agg(
-        {
-            "min": "min",
-            "mean": "mean",
-            "max": "max",
-        }
+if __name__ == "__main__":
+    # Mesmo measurements_duckDB.csv (e mesmo código) = mart restaurado do cache
+    cached_call(
+        f"station_metrics_mart:{source_digest(Path(__file__))}",
+        [INPUT],
+        [OUTPUT, OUTPUT_PARQUET],
+        build_mart,
+        MART_SCHEMA,
     )
-    .reset_index()
-)
-
-# Renomeia colunas para visualização
-df_out.columns = [
-    "Station",
-    "Min Temperature (°C)",
-    "Average Temperature (°C)",
-    "Max Temperature (°C)",
-]
-
-# Salva como CSV
-df_out.to_csv(OUTPUT, sep=";", index=False)
-print(f"✅ Arquivo salvo em: {OUTPUT}")
@@ -0,0 +1,162 @@
+# src/engines.py
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+import importlib
+import importlib.util
+
+from budget import ResourceBudget
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass(frozen=True)
+class EngineOptions:
+    """Parâmetros comuns que o runner repassa para qualquer engine."""
+
+    input_path: Path = BASE_DIR / "data" / "weather_stations.csv"
+    output_dir: Path = BASE_DIR / "data"
+    log_dir: Path = BASE_DIR / "logs"
+    budget: ResourceBudget = ResourceBudget()  # Threads/processos e memória
+    incremental: bool = False
+    database: Optional[Path] = None
+    variance: bool = False  # Colunas extras de variância e desvio padrão
+    streaming: bool = False  # Plano no engine de streaming (memória limitada)
+    sink: bool = False  # Grava direto nos arquivos, sem materializar o resultado
+    chunk_size: Optional[int] = None  # Linhas por lote do streaming
+
+
+@dataclass(frozen=True)
+class Engine:
+    """
+    Engine registrada no runner. O módulo só é importado quando a engine é
+    usada, então rodar DuckDB não exige Polars instalado (e vice-versa).
+    Todo módulo de engine expõe `run(options: EngineOptions) -> None`;
+    `formats` lista as entradas aceitas (csv, parquet, arrow); `incremental`
+    indica se a engine sabe retomar do watermark salvo (só bytes anexados);
+    `database` indica se aceita um banco persistente (ingestão única);
+    `streaming` indica se aceita --streaming, --sink e --chunk-size;
+    `entry` é a função do módulo chamada pelo runner (padrão: `run`);
+    `outputs` são os arquivos de resultado gravados em output_dir (só eles
+    entram no cache, não intermediários nem o dicionário de estações).
+    """
+
+    name: str
+    module: str
+    description: str
+    outputs: Tuple[str, ...]
+    formats: Tuple[str, ...] = ("csv",)
+    incremental: bool = False
+    database: bool = False
+    streaming: bool = False
+    entry: str = "run"
+
+    def load(self) -> Callable[[EngineOptions], None]:
+        return getattr(importlib.import_module(self.module), self.entry)
+
+    def source(self) -> Path:
+        """Arquivo do módulo, sem importá-lo (entra na chave do cache)."""
+        return Path(importlib.util.find_spec(self.module).origin)
+
+
+COLUMNAR_FORMATS = ("csv", "parquet", "arrow")
+
+
+def results(stem: str) -> Tuple[str, str]:
+    """Nomes do CSV e do Parquet de resultado de uma engine."""
+    return f"{stem}.csv", f"{stem}.parquet"
+
+
+ENGINES: Dict[str, Engine] = {
+    engine.name: engine
+    for engine in (
+        Engine(
+            "python",
+            "etl_python",
+            "Python puro, duas passadas",
+            results("measurements_python"),
+        ),
+        Engine(
+            "python_chunk",
+            "etl_python_chuncking",
+            "Python puro em chunks",
+            results("measurements_python_chunk"),
+        ),
+        Engine(
+            "python_multiprocess",
+            "etl_python_multiprocess",
+            "Python puro em processos por intervalos de bytes",
+            results("measurements_python_multiprocess"),
+            incremental=True,
+        ),
+        Engine(
+            "pyarrow",
+            "etl_python_pyarrow",
+            "PyArrow: lotes em streaming + group_by",
+            results("measurements.pyarrow"),
+            COLUMNAR_FORMATS,
+        ),
+        Engine(
+            "numpy",
+            "etl_python_numpy",
+            "Blocos binários vetorizados com NumPy",
+            results("measurements_numpy"),
+            incremental=True,
+        ),
+        Engine(
+            "pandas",
+            "etl_pandas",
+            "Pandas carregando o arquivo inteiro",
+            results("measurements_pandas"),
+            COLUMNAR_FORMATS,
+        ),
+        Engine(
+            "pandas_lean",
+            "etl_pandas",
+            "Pandas com Arrow + category (lotes se não couber na memória)",
+            results("measurements_pandas_lean"),
+            COLUMNAR_FORMATS,
+            entry="run_lean",
+        ),
+        Engine(
+            "pandas_chunk",
+            "etl_pandas_chuncking",
+            "Pandas em chunks",
+            results("measurements_pandas_chunk"),
+        ),
+        Engine(
+            "polars",
+            "etl_python_polars",
+            "Polars (eager)",
+            results("measurements_polars"),
+            COLUMNAR_FORMATS,
+        ),
+        Engine(
+            "polars_lazy",
+            "etl_python_polars_paralelizada",
+            "Polars (lazy)",
+            results("measurements_polars_lazy"),
+            COLUMNAR_FORMATS,
+            streaming=True,
+        ),
+        Engine(
+            "duckdb",
+            "etl_duckDB",
+            "DuckDB",
+            results("measurements_duckDB"),
+            COLUMNAR_FORMATS,
+            database=True,
+        ),
+    )
+}
+
+
+def get_engine(name: str) -> Engine:
+    """Busca a engine pelo nome, com erro listando as opções válidas."""
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown engine '{name}'. Available: {', '.join(ENGINES)}"
+        ) from None
@@ -1,112 +1,24 @@
-# import duckdb
-# import time
-# import datetime
-# from pathlib import Path
-# from csv import writer
-
-# # === Caminhos do projeto ===
-# BASE_DIR = Path(__file__).resolve().parent.parent
-# INPUT_PATH = BASE_DIR / "data" / "weather_stations.csv"
-# OUTPUT_PATH = BASE_DIR / "data" / "measurements_duckDB.csv"
-# LOG_PATH = BASE_DIR / "logs" / "log_duckDB.csv"
-
-# # === Garantir que diretórios existam ===
-# LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-# OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-
-# def log_step(step: str, status: str) -> None:
-#     """
-#     Registra uma etapa no log, com timestamp e status.
-#     """
-#     with LOG_PATH.open("a", newline="") as log_file:
-#         log_writer = writer(log_file)
-#         timestamp = datetime.datetime.now().isoformat()
-#         if status.lower().startswith("success") or status.lower().startswith(
-#             "completed"
-#         ):
-#             status = "✅ " + status
-#         log_writer.writerow([timestamp, step, status])
-
-
-# def process_with_duckdb():
-#     """
-#     Pipeline com DuckDB:
-#     - Lê CSV sem cabeçalho
-#     - Define colunas manualmente
-#     - Executa agregações SQL
-#     - Salva CSV final ordenado
-#     - Gera log detalhado
-#     """
-#     print("🚀 Iniciando processamento com DuckDB...")
-#     start = time.time()
-
-#     try:
-#         con = duckdb.connect(database=":memory:")
-#         log_step("Conexão DuckDB", "Success")
-
-#         # Cria uma tabela temporária com os dados agregados
-#         con.execute(
-#             f"""
-#             CREATE TABLE results AS
-#             SELECT
-#                 station,
-#                 ROUND(MIN(temperature), 2) AS min,
-#                 ROUND(AVG(temperature), 2) AS mean,
-#                 ROUND(MAX(temperature), 2) AS max
-#             FROM read_csv_auto(
-#                 '{INPUT_PATH.as_posix()}',
-#                 delim=';',
-#                 header=False,
-#                 columns={{'station': 'VARCHAR', 'temperature': 'DOUBLE'}}
-#             )
-#             GROUP BY station
-#             ORDER BY station;
-#         """
-#         )
-#         log_step("Agregação executada", "Success")
-
-#         # Conta quantas estações distintas foram processadas
-#         result = con.execute("SELECT COUNT(*) FROM results").fetchone()[0]
-#         log_step("Contagem de estações", f"Success: {result} stations processed")
-
-#         # Exporta o resultado para CSV
-#         con.execute(
-#             f"""
-#             COPY results TO '{OUTPUT_PATH.as_posix()}'
-#             (FORMAT CSV, HEADER TRUE, DELIMITER ';');
-#         """
-#         )
-#         log_step("Exportação para CSV", "Success")
-
-#         print(f"✅ Resultados salvos em: {OUTPUT_PATH}")
-#         print(f"📊 Estações processadas: {result}")
-
-#     except Exception as e:
-#         log_step("ETL DuckDB", f"Failed: {e}")
-#         print(f"❌ Falha no processamento: {e}")
-#         return
-
-#     elapsed = time.time() - start
-#     print(f"⏱️  Tempo total: {elapsed:.2f} segundos.")
-#     log_step("Processamento finalizado", f"Completed in {elapsed:.2f} seconds")
-
-
-# # === Execução principal ===
-# if __name__ == "__main__":
-#     if not INPUT_PATH.exists():
-#         print(f"❌ Arquivo {INPUT_PATH} não encontrado.")
-#         log_step("Checagem do arquivo", "Failed: File not found")
-#     else:
-#         process_with_duckdb()
-
-
-# gravação arquivo em parquet, acima somente csv
 import duckdb
 import time
-import datetime
+from argparse import ArgumentParser
+from functools import partial
 from pathlib import Path
-from csv import writer
+from typing import List, Optional, Tuple
+import pyarrow as pa
+
+from budget import ResourceBudget
+from columnar import TEMPERATURE_COLUMN, TEMPERATURE_SCALE, input_format
+from engines import EngineOptions
+from fingerprint import fingerprint
+from result_cache import (
+    RESULT_SCHEMA,
+    VARIANCE_RESULT_SCHEMA,
+    cached_call,
+    source_digest,
+)
+from shards import expand_inputs
+from step_log import StepLogger
+from tracing import Tracer
 
 # === Caminhos do projeto ===
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -114,31 +26,197 @@ INPUT_PATH = BASE_DIR / "data" / "weather_stations.csv"
 OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_duckDB.csv"
 OUTPUT_PARQUET_PATH = BASE_DIR / "data" / "measurements_duckDB.parquet"
 LOG_PATH = BASE_DIR / "logs" / "log_duckDB.csv"
+TRACE_PATH = BASE_DIR / "logs" / "trace_duckDB.jsonl"
+CHROME_TRACE_PATH = TRACE_PATH.with_suffix(".json")
+DATABASE_PATH = BASE_DIR / "data" / "measurements.duckdb"  # Modo persistente
+TEMP_DIRECTORY = BASE_DIR / "data" / "duckdb_tmp"  # Spill em disco com --memory-limit
 
 # === Garantir que diretórios existam ===
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
-def log_step(step: str, status: str) -> None:
+log_step = StepLogger(LOG_PATH)
+tracer = Tracer(TRACE_PATH, CHROME_TRACE_PATH)
+
+
+def measurements_source(con, input_path: Path) -> Tuple[str, str, int]:
+    """
+    Origem do FROM, coluna de temperatura e escala conforme o formato da entrada.
+    Diretórios e globs viram uma lista de arquivos lida por um único scan paralelo.
+    """
+    paths = expand_inputs(input_path)
+    file_format = input_format(paths[0])
+    files = "[" + ", ".join(f"'{path.as_posix()}'" for path in paths) + "]"
+    if file_format == "parquet":
+        source = f"read_parquet({files})"
+        return source, TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    if file_format == "arrow":
+        # DuckDB não lê Arrow IPC direto: registra as tabelas mapeadas em memória
+        table = pa.concat_tables(
+            pa.ipc.open_file(pa.memory_map(str(path))).read_all() for path in paths
+        )
+        con.register("measurements_arrow", table)
+        return "measurements_arrow", TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    source = f"""read_csv_auto(
+                        {files},
+                        delim=';',
+                        header=False,
+                        columns={{'station': 'VARCHAR', 'temperature': 'DOUBLE'}}
+                    )"""
+    return source, "temperature", 1
+
+
+def ingested_files(paths: List[Path]) -> List[Tuple[str, int, str, str]]:
+    """Linhas da tabela ingest_files: caminho + fingerprint de cada arquivo."""
+    rows = []
+    for path in paths:
+        fp = fingerprint(path)
+        rows.append((str(path.resolve()), fp.size, fp.head, fp.tail))
+    return rows
+
+
+def ingest(con, input_path: Path) -> int:
+    """
+    Carrega a entrada uma única vez na tabela `measurements`, tipada:
+    estação como ENUM (dictionary, 1-2 bytes por linha) e temperatura em
+    décimos SMALLINT. Guarda o fingerprint dos arquivos em `ingest_files`.
+    """
+    source, temperature, scale = measurements_source(con, input_path)
+    tenths = (
+        f"{temperature}::SMALLINT"
+        if scale == TEMPERATURE_SCALE
+        else f"ROUND({temperature} * {TEMPERATURE_SCALE})::SMALLINT"
+    )
+    # Uma única leitura da entrada para uma tabela TEMP (memória, com spill em
+    # disco); o arquivo .duckdb recebe só a versão final, já com o ENUM
+    con.execute(
+        f"""
+        CREATE OR REPLACE TEMP TABLE measurements_staging AS
+        SELECT station::VARCHAR AS station, {tenths} AS {TEMPERATURE_COLUMN}
+        FROM {source}
+    """
+    )
+    con.execute("DROP TABLE IF EXISTS results")
+    con.execute("DROP TABLE IF EXISTS measurements")
+    con.execute("DROP TYPE IF EXISTS station_name")
+    # Dicionário ordenado: a ordem do ENUM é a ordem alfabética das estações
+    con.execute(
+        """
+        CREATE TYPE station_name AS ENUM (
+            SELECT DISTINCT station FROM measurements_staging
+            WHERE station IS NOT NULL
+            ORDER BY station
+        )
+    """
+    )
+    con.execute(
+        f"""
+        CREATE TABLE measurements AS
+        SELECT station::station_name AS station, {TEMPERATURE_COLUMN}
+        FROM measurements_staging
+    """
+    )
+    con.execute("DROP TABLE measurements_staging")
+
+    con.execute("DROP TABLE IF EXISTS ingest_files")
+    con.execute(
+        "CREATE TABLE ingest_files (path VARCHAR, size BIGINT, head VARCHAR, tail VARCHAR)"
+    )
+    con.executemany(
+        "INSERT INTO ingest_files VALUES (?, ?, ?, ?)",
+        ingested_files(expand_inputs(input_path)),
+    )
+    con.execute("CHECKPOINT")
+    return con.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+
+def connect(
+    database: str = ":memory:",
+    budget: ResourceBudget = ResourceBudget(),
+    temp_directory: Path = TEMP_DIRECTORY,
+) -> duckdb.DuckDBPyConnection:
+    """Abre a conexão aplicando o orçamento (threads, memory_limit, spill em disco)."""
+    con = duckdb.connect(database=database)
+    for name, value in budget.duckdb_settings(temp_directory).items():
+        con.execute(f"SET {name} = '{value}'")
+    return con
+
+
+def open_database(
+    database_path: Path,
+    input_path: Path,
+    reingest: bool = False,
+    budget: ResourceBudget = ResourceBudget(),
+    temp_directory: Path = TEMP_DIRECTORY,
+) -> duckdb.DuckDBPyConnection:
     """
-    Registra uma etapa no log, com timestamp e status.
+    Abre o banco persistente e só reingere se a entrada mudou (fingerprint
+    diferente, arquivos novos ou removidos) ou se `reingest` for pedido.
     """
-    with LOG_PATH.open("a", newline="") as log_file:
-        log_writer = writer(log_file)
-        timestamp = datetime.datetime.now().isoformat()
-        if status.lower().startswith("success") or status.lower().startswith(
-            "completed"
-        ):
-            status = "✅ " + status
-        log_writer.writerow([timestamp, step, status])
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    con = connect(str(database_path), budget, temp_directory)
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    current = sorted(ingested_files(expand_inputs(input_path)))
+    stored = (
+        sorted(con.execute("SELECT * FROM ingest_files").fetchall())
+        if {"measurements", "ingest_files"} <= tables
+        else None
+    )
+    if reingest or stored != current:
+        with tracer.span("Ingestão", database=str(database_path)) as span:
+            print(f"📦 Ingesting {input_path} into {database_path}...")
+            rows = ingest(con, input_path)
+            span["rows"] = rows
+        log_step("Ingestão DuckDB", f"Success: {rows} rows into {database_path}")
+        print(f"✅ Ingested {rows:,} rows.")
+    else:
+        print(f"♻️  Reusing {database_path} (input unchanged)")
+        log_step("Ingestão DuckDB", f"Skipped: {database_path} is up to date")
+    return con
 
 
-def process_with_duckdb():
+def query_station(con, station: str) -> Optional[Tuple]:
+    """
+    Consulta pontual no banco persistente: (min, mean, max, count) da estação.
+    O nome vira o código do ENUM uma vez só e o filtro compara códigos, sem
+    converter a coluna para texto linha a linha.
+    """
+    try:
+        row = con.execute(
+            f"""
+            SELECT
+                ROUND(MIN({TEMPERATURE_COLUMN}) / {TEMPERATURE_SCALE}, 2),
+                ROUND(AVG({TEMPERATURE_COLUMN}) / {TEMPERATURE_SCALE}, 2),
+                ROUND(MAX({TEMPERATURE_COLUMN}) / {TEMPERATURE_SCALE}, 2),
+                COUNT(*)
+            FROM measurements
+            WHERE station = ?::station_name
+        """,
+            [station],
+        ).fetchone()
+    except duckdb.ConversionException:
+        return None  # Nome fora do dicionário do ENUM
+    return row if row[3] else None
+
+
+@tracer.traced("ETL DuckDB")
+def process_with_duckdb(
+    input_path: Path = INPUT_PATH,
+    output_csv_path: Path = OUTPUT_CSV_PATH,
+    output_parquet_path: Path = OUTPUT_PARQUET_PATH,
+    database_path: Optional[Path] = None,
+    reingest: bool = False,
+    budget: ResourceBudget = ResourceBudget(),
+    temp_directory: Path = TEMP_DIRECTORY,
+    variance: bool = False,
+):
     """
     Pipeline com DuckDB:
-    - Lê CSV sem cabeçalho
-    - Executa agregações SQL
+    - Lê CSV sem cabeçalho (ou Parquet / Arrow IPC em décimos inteiros)
+    - Com `database_path`, ingere uma vez num arquivo .duckdb tipado e consulta dele
+    - Respeita o orçamento de threads e memória (spill em `temp_directory`)
+    - Executa agregações SQL (com `variance`, também VAR_POP e STDDEV_POP)
     - Salva em CSV e Parquet
     - Registra logs com separador
     """
@@ -146,72 +224,170 @@ def process_with_duckdb():
     start = time.time()
 
     try:
-        con = duckdb.connect(database=":memory:")
+        with tracer.span("Conexão DuckDB"):
+            if database_path is None:
+                con = connect(":memory:", budget, temp_directory)
+            else:
+                con = open_database(
+                    database_path, input_path, reingest, budget, temp_directory
+                )
         log_step("Conexão DuckDB", "Success")
 
         # Agregação e ordenação
-        con.execute(
-            f"""
-            CREATE TABLE results AS
-            SELECT
-                station,
-                ROUND(MIN(temperature), 2) AS min,
-                ROUND(AVG(temperature), 2) AS mean,
-                ROUND(MAX(temperature), 2) AS max
-            FROM read_csv_auto(
-                '{INPUT_PATH.as_posix()}',
-                delim=';',
-                header=False,
-                columns={{'station': 'VARCHAR', 'temperature': 'DOUBLE'}}
+        with tracer.span("Agregação", input=str(input_path)):
+            if database_path is None:
+                source, temperature, scale = measurements_source(con, input_path)
+            else:
+                source = "measurements"
+                temperature, scale = TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+            # Agregados de variância do DuckDB: Welford por thread, combinados
+            # entre threads (e partições em disco) pela fórmula de Chan
+            spread = (
+                f""",
+                        ROUND(VAR_POP({temperature}) / {scale * scale}, 2) AS variance,
+                        ROUND(STDDEV_POP({temperature}) / {scale}, 2) AS stddev"""
+                if variance
+                else ""
+            )
+            con.execute(
+                f"""
+                CREATE OR REPLACE TABLE results AS
+                SELECT station::VARCHAR AS station, * EXCLUDE (station)
+                FROM (
+                    SELECT
+                        station,
+                        ROUND(MIN({temperature}) / {scale}, 2) AS min,
+                        ROUND(AVG({temperature}) / {scale}, 2) AS mean,
+                        ROUND(MAX({temperature}) / {scale}, 2) AS max{spread}
+                    FROM {source}
+                    GROUP BY station
+                )
+                ORDER BY station;
+            """
             )
-            GROUP BY station
-            ORDER BY station;
-        """
-        )
         log_step("Agregação executada", "Success")
 
         # Contagem de estações processadas
-        result_count = con.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        with tracer.span("Contagem de estações") as span:
+            result_count = con.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            span["stations"] = result_count
         log_step("Contagem de estações", f"Success: {result_count} stations processed")
 
         # Exporta para CSV
-        con.execute(
-            f"""
-            COPY results TO '{OUTPUT_CSV_PATH.as_posix()}'
-            (FORMAT CSV, HEADER TRUE, DELIMITER ';');
-        """
-        )
+        with tracer.span("Exportação para CSV"):
+            con.execute(
+                f"""
+                COPY results TO '{output_csv_path.as_posix()}'
+                (FORMAT CSV, HEADER TRUE, DELIMITER ';');
+            """
+            )
         log_step("Exportação para CSV", "Success")
-        print(f"✅ Resultados salvos em: {OUTPUT_CSV_PATH}")
+        print(f"✅ Resultados salvos em: {output_csv_path}")
 
         # Linha separadora no log
         log_step("-----", "-----")
 
         # Exporta para Parquet
-        con.execute(
-            f"""
-            COPY results TO '{OUTPUT_PARQUET_PATH.as_posix()}'
-            (FORMAT PARQUET);
-        """
-        )
+        with tracer.span("Exportação para Parquet"):
+            con.execute(
+                f"""
+                COPY results TO '{output_parquet_path.as_posix()}'
+                (FORMAT PARQUET);
+            """
+            )
         log_step("Exportação para Parquet", "Success")
-        print(f"✅ Resultados salvos em: {OUTPUT_PARQUET_PATH}")
+        print(f"✅ Resultados salvos em: {output_parquet_path}")
         print(f"📊 Estações processadas: {result_count}")
 
     except Exception as e:
         log_step("ETL DuckDB", f"Failed: {e}")
         print(f"❌ Falha no processamento: {e}")
-        return
+        raise
 
     elapsed = time.time() - start
     print(f"⏱️  Tempo total: {elapsed:.2f} segundos.")
     log_step("Processamento finalizado", f"Completed in {elapsed:.2f} seconds")
 
 
+def run(options: EngineOptions) -> None:
+    """Ponto de entrada usado pelo runner (cli.py)."""
+    log_step.path = options.log_dir / LOG_PATH.name
+    tracer.path = options.log_dir / TRACE_PATH.name
+    tracer.chrome_path = options.log_dir / CHROME_TRACE_PATH.name
+    process_with_duckdb(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.database,
+        budget=options.budget,
+        temp_directory=options.output_dir / TEMP_DIRECTORY.name,
+        variance=options.variance,
+    )
+
+
 # === Execução principal ===
 if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL com DuckDB")
+    parser.add_argument(
+        "--database",
+        type=Path,
+        nargs="?",
+        const=DATABASE_PATH,
+        help=f"Ingere uma vez num arquivo .duckdb e consulta dele (padrão: {DATABASE_PATH.name})",
+    )
+    parser.add_argument(
+        "--reingest", action="store_true", help="Recarrega o banco mesmo sem mudanças"
+    )
+    parser.add_argument(
+        "--station",
+        action="append",
+        help="Consulta pontual de uma estação no banco (pode repetir)",
+    )
+    parser.add_argument(
+        "--sql", help="Consulta SQL livre sobre o banco (tabela measurements)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Sempre recalcula, sem consultar o cache de resultados",
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
     if not INPUT_PATH.exists():
         print(f"❌ Arquivo {INPUT_PATH} não encontrado.")
         log_step("Checagem do arquivo", "Failed: File not found")
+    elif args.station or args.sql:
+        # Consultas ad hoc: reaproveitam o banco, sem reprocessar nem exportar
+        con = open_database(args.database or DATABASE_PATH, INPUT_PATH, args.reingest)
+        for station in args.station or []:
+            row = query_station(con, station)
+            if row is None:
+                print(f"❌ Estação {station} não encontrada.")
+            else:
+                print(
+                    f"{station};{row[0]:.2f};{row[1]:.2f};{row[2]:.2f} ({row[3]:,} medições)"
+                )
+        if args.sql:
+            print(con.sql(args.sql))
+        con.close()
+    elif args.database or args.no_cache:
+        process_with_duckdb(
+            database_path=args.database,
+            reingest=args.reingest,
+            variance=args.variance,
+        )
     else:
-        process_with_duckdb()
+        # Mesma chave do runner (engine duckdb + hash deste arquivo): as entradas
+        # gravadas por `cli.py run --engine duckdb` também servem aqui
+        cached_call(
+            f"duckdb:{source_digest(Path(__file__))}",
+            expand_inputs(INPUT_PATH),
+            [OUTPUT_CSV_PATH, OUTPUT_PARQUET_PATH],
+            partial(process_with_duckdb, variance=args.variance),
+            VARIANCE_RESULT_SCHEMA if args.variance else RESULT_SCHEMA,
+        )
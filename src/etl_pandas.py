@@ -88,10 +88,23 @@
 
 # gravação em parquet, acima, comente em csv
 import pandas as pd
+from argparse import ArgumentParser
 from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 import time
-import datetime
-from csv import writer
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from pandas.api.types import union_categoricals
+
+from budget import ResourceBudget
+from columnar import TEMPERATURE_COLUMN, TEMPERATURE_SCALE, input_format
+from engines import EngineOptions
+from resource_sampler import ResourceSampler
+from shards import expand_inputs
+from step_log import StepLogger
+from variance import combine_partial_m2, spread
 
 # Paths and constants
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -99,91 +112,340 @@ INPUT_PATH = BASE_DIR / "data" / "weather_stations.csv"
 OUTPUT_PATH = BASE_DIR / "data" / "measurements_pandas.csv"
 OUTPUT_PARQUET = BASE_DIR / "data" / "measurements_pandas.parquet"
 LOG_PATH = BASE_DIR / "logs" / "log_pandas.csv"
+# Engine pandas_lean grava ao lado da pandas, sem sobrescrever
+LEAN_OUTPUT_PATH = BASE_DIR / "data" / "measurements_pandas_lean.csv"
+LEAN_OUTPUT_PARQUET = BASE_DIR / "data" / "measurements_pandas_lean.parquet"
+LEAN_LOG_PATH = BASE_DIR / "logs" / "log_pandas_lean.csv"
+BATCH_ROWS = 1_000_000  # Linhas por lote Arrow no modo out-of-core
+BATCH_READAHEAD = 2  # Lotes lidos à frente pelo dataset Arrow (Parquet/Arrow)
+CSV_LINE_BYTES = 16  # Tamanho médio de uma linha "estação;temperatura"
+CSV_READAHEAD_BLOCKS = 40  # Blocos que o open_csv mantém lidos à frente
+BATCH_ROW_BYTES = CSV_LINE_BYTES * CSV_READAHEAD_BLOCKS  # Memória por linha de lote
+LEAN_CSV_SCHEMA = {
+    "station": pa.dictionary(pa.int32(), pa.string()),
+    "temperature": pa.float32(),
+}
+# Pico do modo lean por byte de entrada (tabela Arrow lida + DataFrame compacto)
+LEAN_PEAK_FACTOR = {"csv": 3, "parquet": 8, "arrow": 2}
 
 # Ensure directories exist
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
-def log_step(step: str, status: str) -> None:
-    with LOG_PATH.open("a", newline="") as log_file:
-        log_writer = writer(log_file)
-        timestamp = datetime.datetime.now().isoformat()
-        if status.lower().startswith("success") or status.lower().startswith(
-            "completed"
-        ):
-            status = "✅ " + status
-        log_writer.writerow([timestamp, step, status])
+log_step = StepLogger(LOG_PATH)
 
 
-def process_with_pandas():
-    print("Starting ETL with pandas...")
-    start_time = time.time()
+def read_file(path: Path, file_format: str, lean: bool = False) -> pd.DataFrame:
+    if file_format == "parquet":
+        return pd.read_parquet(path)
+    if file_format == "arrow":
+        # Feather v2 é o formato de arquivo Arrow IPC
+        return pd.read_feather(path)
+    if lean:
+        # Parser multithread do Arrow já devolvendo a estação como dicionário
+        # (category no pandas), sem materializar as strings
+        # (pd.read_csv(engine="pyarrow") as materializa)
+        table = pa_csv.read_csv(
+            path,
+            read_options=pa_csv.ReadOptions(column_names=["station", "temperature"]),
+            parse_options=pa_csv.ParseOptions(delimiter=";"),
+            convert_options=pa_csv.ConvertOptions(column_types=LEAN_CSV_SCHEMA),
+        )
+        # Décimos em int16, como no Parquet/Arrow: ~6 bytes por linha, e o groupby
+        # soma em int64 em vez de acumular mean/var em float32
+        tenths = pc.round(pc.multiply(table.column("temperature"), TEMPERATURE_SCALE))
+        table = table.set_column(1, TEMPERATURE_COLUMN, pc.cast(tenths, pa.int16()))
+        return table.to_pandas(self_destruct=True)
+    # Sem skiprows: o gerador não escreve cabeçalho, e em shards cada arquivo
+    # perderia a primeira medição
+    return pd.read_csv(
+        path,
+        sep=";",
+        names=["station", "temperature"],
+        dtype={"station": str, "temperature": float},
+    )
 
-    try:
-        df = pd.read_csv(
-            INPUT_PATH,
-            sep=";",
-            names=["station", "temperature"],
-            dtype={"station": str, "temperature": float},
-            skiprows=1,
+
+def concat_shards(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena shards; estações category são unidas sem voltar a ser strings."""
+    stations = [frame.pop("station") for frame in frames]
+    df = pd.concat(frames, ignore_index=True)
+    if all(isinstance(s.dtype, pd.CategoricalDtype) for s in stations):
+        df.insert(0, "station", union_categoricals(stations))
+    else:
+        df.insert(0, "station", pd.concat(stations, ignore_index=True))
+    return df
+
+
+def read_measurements(
+    input_path: Path, lean: bool = False
+) -> Tuple[pd.DataFrame, str, int]:
+    """
+    Lê CSV, Parquet ou Arrow IPC (um arquivo, diretório ou glob de shards);
+    devolve o DataFrame, a coluna de temperatura e a escala. Parquet/Arrow já
+    chegam compactos (category + int16); com `lean`, o CSV chega igual.
+    """
+    paths = expand_inputs(input_path)
+    file_format = input_format(paths[0])
+    frames = [read_file(path, file_format, lean) for path in paths]
+    df = frames[0] if len(frames) == 1 else concat_shards(frames)
+    if file_format == "csv" and not lean:
+        return df, "temperature", 1
+    return df, TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+
+
+def iter_batches(
+    paths: List[Path], file_format: str, columns: List[str], batch_rows: int
+) -> Iterator[pa.RecordBatch]:
+    """
+    Lotes Arrow lidos sob demanda. Parquet/Arrow vêm de um dataset Arrow; o CSV
+    usa o leitor em streaming (open_csv), cujo readahead é limitado em blocos,
+    já que o scan de CSV do dataset lê à frente sem esperar o consumidor.
+    """
+    if file_format != "csv":
+        dataset = ds.dataset(
+            [str(path) for path in paths],
+            format="ipc" if file_format == "arrow" else file_format,
+        )
+        yield from dataset.to_batches(
+            columns=columns,
+            batch_size=batch_rows,
+            batch_readahead=BATCH_READAHEAD,
+            fragment_readahead=1,
+            use_threads=False,
         )
-        log_step("Read CSV", f"Success: {len(df)} rows loaded")
-        print(f"✅ CSV read successfully: {len(df)} rows loaded.")
-    except Exception as e:
-        log_step("Read CSV", f"Failed: {e}")
-        print(f"❌ Failed to read CSV: {e}")
         return
+    for path in paths:
+        yield from pa_csv.open_csv(
+            path,
+            read_options=pa_csv.ReadOptions(
+                column_names=columns, block_size=batch_rows * CSV_LINE_BYTES
+            ),
+            parse_options=pa_csv.ParseOptions(delimiter=";"),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={"station": pa.string(), "temperature": pa.float64()}
+            ),
+        )
 
-    try:
-        df_kpi = (
-            df.groupby("station")["temperature"]
-            .agg(["min", "mean", "max"])
-            .reset_index()
+
+def aggregate_in_batches(
+    input_path: Path, batch_rows: int, variance: bool = False
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Modo out-of-core: percorre a entrada em lotes Arrow e guarda só
+    agregados parciais (min, max, sum, count) por estação, combinados a cada lote.
+    Com `variance`, o M2 de cada lote entra pela fórmula de Chan.
+    """
+    paths = expand_inputs(input_path)
+    file_format = input_format(paths[0])
+    column, scale = "temperature", 1
+    if file_format != "csv":
+        column, scale = TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    totals, row_count = None, 0
+    for batch in iter_batches(paths, file_format, ["station", column], batch_rows):
+        row_count += batch.num_rows
+        station = batch.column("station")
+        if not pa.types.is_dictionary(station.type):
+            station = station.dictionary_encode()  # Vira category no pandas
+        chunk = pd.DataFrame(
+            {"station": station.to_pandas(), column: batch.column(column).to_pandas()}
         )
-        log_step("Aggregate stats", f"Success: {len(df_kpi)} stations processed")
-        print(f"✅ Statistics calculated successfully: {len(df_kpi)} stations.")
-    except Exception as e:
-        log_step("Aggregate stats", f"Failed: {e}")
-        print(f"❌ Failed to calculate statistics: {e}")
-        return
+        grouped = chunk.groupby("station", observed=True)[column]
+        partial = grouped.agg(["min", "max", "sum", "count"])
+        if variance:
+            partial["m2"] = grouped.var(ddof=0) * partial["count"]
+        partial.index = partial.index.astype(str)
+        if totals is not None:
+            stacked = pd.concat([totals, partial])
+            partial = stacked.groupby(level=0).agg(
+                {"min": "min", "max": "max", "sum": "sum", "count": "sum"}
+            )
+            if variance:
+                partial["m2"] = combine_partial_m2(stacked, partial)
+        totals = partial
+    df_kpi = pd.DataFrame(
+        {
+            "station": totals.index,
+            "min": totals["min"].values / scale,
+            "mean": (totals["sum"] / totals["count"]).values / scale,
+            "max": totals["max"].values / scale,
+        }
+    )
+    if variance:
+        df_kpi["variance"], df_kpi["stddev"] = spread(
+            totals["m2"].values, totals["count"].values, scale
+        )
+    return df_kpi, row_count
+
+
+def choose_batch_rows(
+    input_path: Path, budget: ResourceBudget, lean: bool = False
+) -> Optional[int]:
+    """
+    Linhas por lote do modo out-of-core, ou None para ler tudo em memória.
+    Com --memory-limit sempre vai em lotes; no modo lean, cai para lotes quando
+    a estimativa de pico não cabe na memória livre.
+    """
+    if budget.memory_limit is not None:
+        return budget.chunk_rows(BATCH_ROWS, BATCH_ROW_BYTES)
+    if lean:
+        paths = expand_inputs(input_path)
+        factor = LEAN_PEAK_FACTOR[input_format(paths[0])]
+        if not budget.fits(factor * sum(path.stat().st_size for path in paths)):
+            return BATCH_ROWS
+    return None
+
+
+def process_with_pandas(
+    input_path: Path = INPUT_PATH,
+    output_path: Path = OUTPUT_PATH,
+    output_parquet: Path = OUTPUT_PARQUET,
+    batch_rows: Optional[int] = None,
+    lean: bool = False,
+    variance: bool = False,
+):
+    print(f"Starting ETL with pandas{' (lean)' if lean else ''}...")
+    start_time = time.time()
+    sampler = ResourceSampler(log_step)
+
+    if batch_rows is not None:
+        try:
+            with sampler.stage("Read + aggregate"):
+                df_kpi, row_count = aggregate_in_batches(
+                    input_path, batch_rows, variance
+                )
+            log_step(
+                "Aggregate stats",
+                f"Success: {len(df_kpi)} stations from {row_count} rows "
+                f"in Arrow batches of {batch_rows}",
+            )
+            print(f"✅ Aggregated {row_count:,} rows in batches of {batch_rows:,}.")
+        except Exception as e:
+            log_step("Aggregate stats", f"Failed: {e}")
+            print(f"❌ Failed to aggregate input: {e}")
+            raise
+    else:
+        try:
+            with sampler.stage("Read input"):
+                df, column, scale = read_measurements(input_path, lean)
+            log_step("Read input", f"Success: {len(df)} rows loaded")
+            print(f"✅ Input read successfully: {len(df)} rows loaded.")
+        except Exception as e:
+            log_step("Read input", f"Failed: {e}")
+            print(f"❌ Failed to read input: {e}")
+            raise
+
+        try:
+            with sampler.stage("Aggregate stats"):
+                # observed=True: estações Categorical (Parquet/Arrow) sem combinações vazias
+                grouped = df.groupby("station", observed=True)[column]
+                df_kpi = grouped.agg(["min", "mean", "max"]) / scale
+                if variance:
+                    # Welford por grupo no próprio groupby do pandas
+                    df_kpi["variance"] = grouped.var(ddof=0) / scale**2
+                    df_kpi["stddev"] = grouped.std(ddof=0) / scale
+                df_kpi = df_kpi.reset_index()
+                df_kpi["station"] = df_kpi["station"].astype(str)
+            log_step("Aggregate stats", f"Success: {len(df_kpi)} stations processed")
+            print(f"✅ Statistics calculated successfully: {len(df_kpi)} stations.")
+        except Exception as e:
+            log_step("Aggregate stats", f"Failed: {e}")
+            print(f"❌ Failed to calculate statistics: {e}")
+            raise
 
     try:
-        df_sorted = df_kpi.sort_values("station")
+        with sampler.stage("Format results"):
+            df_sorted = df_kpi.sort_values("station")
 
-        # Formatando com duas casas decimais como string
-        df_sorted["min"] = df_sorted["min"].map("{:.2f}".format)
-        df_sorted["mean"] = df_sorted["mean"].map("{:.2f}".format)
-        df_sorted["max"] = df_sorted["max"].map("{:.2f}".format)
+            # Formatando com duas casas decimais como string
+            for column in df_sorted.columns.drop("station"):
+                df_sorted[column] = df_sorted[column].map("{:.2f}".format)
 
-        df_sorted.to_csv(OUTPUT_PATH, index=False, sep=";")
+        with sampler.stage("Save CSV"):
+            df_sorted.to_csv(output_path, index=False, sep=";")
         log_step("Save CSV", "Success")
-        print(f"✅ Results saved to: {OUTPUT_PATH}")
+        print(f"✅ Results saved to: {output_path}")
     except Exception as e:
         log_step("Save CSV", f"Failed: {e}")
         print(f"❌ Failed to save CSV: {e}")
-        return
+        raise
 
     # Linha separadora no log
     log_step("-----", "-----")
 
     try:
-        df_sorted.to_parquet(OUTPUT_PARQUET, index=False)
+        with sampler.stage("Save Parquet"):
+            df_sorted.to_parquet(output_parquet, index=False)
         log_step("Save Parquet", "Success")
-        print(f"✅ Results saved to: {OUTPUT_PARQUET}")
+        print(f"✅ Results saved to: {output_parquet}")
     except Exception as e:
         log_step("Save Parquet", f"Failed: {e}")
         print(f"❌ Failed to save Parquet: {e}")
-        return
+        raise
 
+    sampler.print_report()
     elapsed = time.time() - start_time
     print(f"⏱️  Total processing time: {elapsed:.2f} seconds.")
     log_step("Total processing", f"Completed in {elapsed:.2f} seconds")
 
 
+def run(options: EngineOptions) -> None:
+    """Ponto de entrada usado pelo runner (cli.py)."""
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_with_pandas(
+        options.input_path,
+        options.output_dir / OUTPUT_PATH.name,
+        options.output_dir / OUTPUT_PARQUET.name,
+        # Com --memory-limit a entrada é lida em lotes Arrow que cabem no orçamento
+        choose_batch_rows(options.input_path, options.budget),
+        variance=options.variance,
+    )
+
+
+def run_lean(options: EngineOptions) -> None:
+    """Engine pandas_lean: leitura Arrow compacta, com fallback out-of-core."""
+    log_step.path = options.log_dir / LEAN_LOG_PATH.name
+    process_with_pandas(
+        options.input_path,
+        options.output_dir / LEAN_OUTPUT_PATH.name,
+        options.output_dir / LEAN_OUTPUT_PARQUET.name,
+        choose_batch_rows(options.input_path, options.budget, lean=True),
+        lean=True,
+        variance=options.variance,
+    )
+
+
 if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL com pandas")
+    parser.add_argument(
+        "--lean",
+        action="store_true",
+        help="Lê com o parser do Arrow, estação category e décimos em int16",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        help="Força o modo out-of-core em lotes Arrow com N linhas",
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
     if not INPUT_PATH.exists():
         print(f"❌ File {INPUT_PATH} not found.")
         log_step("File check", "Failed: File not found")
     else:
-        process_with_pandas()
+        if args.lean:
+            log_step.path = LEAN_LOG_PATH
+        process_with_pandas(
+            output_path=LEAN_OUTPUT_PATH if args.lean else OUTPUT_PATH,
+            output_parquet=LEAN_OUTPUT_PARQUET if args.lean else OUTPUT_PARQUET,
+            batch_rows=args.batch_rows
+            or choose_batch_rows(INPUT_PATH, ResourceBudget(), args.lean),
+            lean=args.lean,
+            variance=args.variance,
+        )
@@ -1,9 +1,16 @@
 import pandas as pd
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import List, Tuple
 import time
-import datetime
-from csv import writer
-from tqdm import tqdm
+
+from byte_ranges import open_byte_range, split_byte_ranges
+from engines import EngineOptions
+from progress import ByteProgress
+from shards import expand_inputs, shard_parts
+from step_log import StepLogger
+from variance import combine_partial_m2, spread
 
 # === CONFIGURAÇÕES GERAIS ===
 
@@ -12,104 +19,209 @@ INPUT_PATH = BASE_DIR / "data" / "weather_stations.csv"
 OUTPUT_CSV = BASE_DIR / "data" / "measurements_pandas_chunk.csv"
 OUTPUT_PARQUET = BASE_DIR / "data" / "measurements_pandas_chunk.parquet"
 LOG_PATH = BASE_DIR / "logs" / "log_pandas_chunk.csv"
+CHUNK_SIZE = 100_000_000  # Linhas por chunk (repartidas entre os workers)
+CHUNK_ROW_BYTES = (
+    200  # Memória por linha lida (string object + float + buffers do parser)
+)
 
 # Garante que os diretórios de dados e logs existam
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
 
 
-def log_step(step: str, status: str) -> None:
-    """Registra cada etapa do pipeline no arquivo de log com timestamp."""
-    with LOG_PATH.open("a", newline="") as log_file:
-        log_writer = writer(log_file)
-        timestamp = datetime.datetime.now().isoformat()
-        if status.lower().startswith("success") or status.lower().startswith(
-            "completed"
-        ):
-            status = "✅ " + status
-        log_writer.writerow([timestamp, step, status])
+log_step = StepLogger(LOG_PATH)
+
+
+def aggregate_chunk(chunk: pd.DataFrame, variance: bool = False) -> pd.DataFrame:
+    """
+    Agregado parcial (min, max, sum, count) por estação de um chunk; com
+    `variance`, também o M2 (variância populacional × contagem).
+    """
+    grouped = chunk.groupby("station")["temperature"]
+    partial = grouped.agg(["min", "max", "sum", "count"])
+    if variance:
+        partial["m2"] = grouped.var(ddof=0) * partial["count"]
+    return partial
 
 
-def process_with_pandas_chunked(chunksize=100_000_000):
+def combine_partials(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combina agregados parciais com um único concat + groupby vetorizado.
+    O M2, quando presente, é combinado pela fórmula de Chan.
+    """
+    stacked = pd.concat(partials)
+    combined = stacked.groupby(level=0).agg(
+        {"min": "min", "max": "max", "sum": "sum", "count": "sum"}
+    )
+    if "m2" in stacked.columns:
+        combined["m2"] = combine_partial_m2(stacked, combined)
+    return combined
+
+
+def read_csv_chunks(file, chunksize: int):
+    """Leitor em chunks do CSV sem cabeçalho (station;temperature)."""
+    return pd.read_csv(
+        file,
+        sep=";",
+        names=["station", "temperature"],
+        dtype={"station": str, "temperature": float},
+        keep_default_na=False,  # Estações como "Nan" não viram NaN
+        chunksize=chunksize,
+    )
+
+
+def aggregate_range(task: Tuple[Path, int, int, int, bool]) -> pd.DataFrame:
+    """Worker: agrega um intervalo de bytes do arquivo em chunks de linhas."""
+    path, start, end, chunksize, variance = task
+    total = None
+    with open_byte_range(path, start, end) as file:
+        for chunk in read_csv_chunks(file, chunksize):
+            partial = aggregate_chunk(chunk, variance)
+            total = partial if total is None else combine_partials([total, partial])
+    return total
+
+
+def process_with_pandas_chunked(
+    chunksize=CHUNK_SIZE,
+    workers=1,
+    input_path: Path = INPUT_PATH,
+    output_csv: Path = OUTPUT_CSV,
+    output_parquet: Path = OUTPUT_PARQUET,
+    variance: bool = False,
+):
     """
     Pipeline de processamento com Pandas usando leitura em chunks + barra de progresso.
+    Cada chunk vira um agregado parcial (min, max, sum, count) que é combinado de
+    forma vetorizada; com workers > 1 o arquivo é dividido em intervalos de bytes
+    processados em paralelo (o chunksize é repartido entre os workers).
+    `input_path` pode ser um diretório ou glob de shards CSV.
     Inclui saída em CSV e Parquet, com logs e barra de progresso.
     """
-    print("🚀 Starting ETL with pandas (chunked + tqdm)...")
+    print(f"🚀 Starting ETL with pandas (chunked + tqdm, {workers} workers)...")
     start_time = time.time()
 
     try:
-        total_lines = sum(1 for _ in open(INPUT_PATH, encoding="utf-8")) - 1
-        total_chunks = (total_lines // chunksize) + 1
-        stats = {}
-
-        for chunk in tqdm(
-            pd.read_csv(
-                INPUT_PATH,
-                sep=";",
-                names=["station", "temperature"],
-                dtype={"station": str, "temperature": float},
-                skiprows=1,
-                chunksize=chunksize,
-            ),
-            total=total_chunks,
-            desc="🔄 Processando chunks",
-            unit="chunk",
-        ):
-            for station, group in chunk.groupby("station"):
-                t_min = group["temperature"].min()
-                t_max = group["temperature"].max()
-                t_mean = group["temperature"].mean()
-
-                if station not in stats:
-                    stats[station] = {"min": t_min, "mean": [t_mean], "max": t_max}
-                else:
-                    stats[station]["min"] = min(stats[station]["min"], t_min)
-                    stats[station]["max"] = max(stats[station]["max"], t_max)
-                    stats[station]["mean"].append(t_mean)
+        partials = []
+        paths = expand_inputs(input_path)
+        total = sum(path.stat().st_size for path in paths)
+
+        with ByteProgress(
+            paths[0], desc="🔄 Processando chunks", total=total
+        ) as progress:
+            if workers > 1:
+                worker_chunksize = max(1, chunksize // workers)
+                # Cada shard é dividido proporcionalmente ao seu tamanho
+                tasks = [
+                    (path, start, end, worker_chunksize, variance)
+                    for path in paths
+                    for start, end in split_byte_ranges(
+                        path, shard_parts(workers, path.stat().st_size, total)
+                    )
+                ]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        executor.submit(aggregate_range, task): task for task in tasks
+                    }
+                    for future in as_completed(futures):
+                        _, start, end, _, _ = futures[future]
+                        partial = future.result()
+                        if partial is not None:
+                            partials.append(partial)
+                            progress.update(end - start, int(partial["count"].sum()))
+            else:
+                offset = 0
+                for path in paths:
+                    with path.open("rb") as file:
+                        for chunk in read_csv_chunks(file, chunksize):
+                            partial = aggregate_chunk(chunk, variance)
+                            partials = [combine_partials(partials + [partial])]
+                            progress.set_position(
+                                offset + file.tell(), progress.rows + len(chunk)
+                            )
+                    offset += path.stat().st_size
+
+        stats = combine_partials(partials)
+        log_step(
+            "Aggregate chunks", f"Success: {len(stats)} stations, {workers} workers"
+        )
 
         df_kpi = pd.DataFrame(
-            [
-                {
-                    "station": st,
-                    "min": f"{s['min']:.2f}",
-                    "mean": f"{pd.Series(s['mean']).mean():.2f}",
-                    "max": f"{s['max']:.2f}",
-                }
-                for st, s in stats.items()
-            ]
+            {
+                "station": stats.index,
+                "min": stats["min"].map("{:.2f}".format).values,
+                "mean": (stats["sum"] / stats["count"]).map("{:.2f}".format).values,
+                "max": stats["max"].map("{:.2f}".format).values,
+            }
         )
+        if variance:
+            for column, values in zip(
+                ["variance", "stddev"], spread(stats["m2"], stats["count"])
+            ):
+                df_kpi[column] = values.map("{:.2f}".format).values
 
         df_kpi = df_kpi.sort_values("station")
 
         # === GRAVAÇÃO EM CSV ===
-        df_kpi.to_csv(OUTPUT_CSV, index=False, sep=";")
+        df_kpi.to_csv(output_csv, index=False, sep=";")
         log_step("Save CSV", "Success")
-        print(f"✅ Results saved to: {OUTPUT_CSV}")
+        print(f"✅ Results saved to: {output_csv}")
 
         # === LINHA SEPARADORA NO LOG ===
         log_step("-----", "-----")
 
         # === GRAVAÇÃO EM PARQUET ===
-        df_kpi.to_parquet(OUTPUT_PARQUET, index=False)
+        df_kpi.to_parquet(output_parquet, index=False)
         log_step("Save Parquet", "Success")
-        print(f"✅ Results saved to: {OUTPUT_PARQUET}")
+        print(f"✅ Results saved to: {output_parquet}")
 
     except Exception as e:
         log_step("Chunked processing", f"Failed: {e}")
         print(f"❌ Chunked processing failed: {e}")
-        return
+        raise
 
     elapsed = time.time() - start_time
     print(f"⏱️  Total processing time: {elapsed:.2f} seconds.")
     log_step("Total processing", f"Completed in {elapsed:.2f} seconds")
 
 
+def run(options: EngineOptions) -> None:
+    """Ponto de entrada usado pelo runner (cli.py)."""
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_with_pandas_chunked(
+        # O chunksize é repartido entre os workers, então o teto vale para o total
+        chunksize=options.budget.chunk_rows(CHUNK_SIZE, CHUNK_ROW_BYTES),
+        workers=options.budget.threads,
+        input_path=options.input_path,
+        output_csv=options.output_dir / OUTPUT_CSV.name,
+        output_parquet=options.output_dir / OUTPUT_PARQUET.name,
+        variance=options.variance,
+    )
+
+
 # === EXECUÇÃO ===
 
 if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL com Pandas em chunks")
+    parser.add_argument(
+        "--chunksize", type=int, default=CHUNK_SIZE, help="Linhas por chunk"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processos paralelos sobre intervalos de bytes (padrão: 1)",
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
     if not INPUT_PATH.exists():
         print(f"❌ File {INPUT_PATH} not found.")
         log_step("File check", "Failed: File not found")
     else:
-        process_with_pandas_chunked()
+        process_with_pandas_chunked(
+            chunksize=args.chunksize, workers=args.workers, variance=args.variance
+        )
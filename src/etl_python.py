@@ -1,10 +1,18 @@
-from csv import reader, writer
-from collections import defaultdict
+from csv import reader
+from functools import partial
 from pathlib import Path
+import os
 import time
-import datetime
 import pandas as pd
 
+from engines import EngineOptions
+from fixed_point import TENTHS, parse_tenths
+from progress import PROGRESS_EVERY_ROWS, ByteProgress
+from shards import aggregate_shards, expand_inputs
+from station_dictionary import new_accumulator
+from step_log import StepLogger
+from variance import spread
+
 # 📁 Caminhos principais
 BASE_DIR = Path(__file__).resolve().parent.parent
 PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
@@ -12,6 +20,7 @@ INTERMEDIATE_PATH = BASE_DIR / "data" / "intermediate_stats.csv"
 OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_python.csv"
 OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
 LOG_PATH = BASE_DIR / "logs" / "log_python.csv"
+FIXED_POINT = True  # Lê bytes e agrega temperaturas em décimos inteiros
 
 # 🛠️ Garante que os diretórios existem
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -19,53 +28,98 @@ OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
 # 📝 Log incremental
-def log_step(step: str, status: str) -> None:
-    try:
-        with LOG_PATH.open("a", newline="") as log_file:
-            log_writer = writer(log_file)
-            timestamp = datetime.datetime.now().isoformat()
-            if status.lower().startswith("success") or status.lower().startswith(
-                "completed"
-            ):
-                status = "✅ " + status
-            log_writer.writerow([timestamp, step, status])
-    except Exception as e:
-        print(f"[LOG ERROR] Failed to write log: {e}")
+log_step = StepLogger(LOG_PATH)
 
 
-# 🔁 Passo 1: Agregação incremental (sem listas)
-def first_pass_aggregate(path_to_csv: Path, intermediate_path: Path):
-    station_stats = defaultdict(
-        lambda: {"sum": 0.0, "count": 0, "min": float("inf"), "max": float("-inf")}
-    )
+# 🔢 Agregação em ponto fixo: bytes crus e somas inteiras em décimos
+def aggregate_fixed_point(path_to_csv: Path, variance: bool = False):
+    station_stats = new_accumulator(fixed_point=True, variance=variance)
+    index, sums, counts = station_stats.index, station_stats.sums, station_stats.counts
+    mins, maxs = station_stats.mins, station_stats.maxs
+    m2s = station_stats.m2s if variance else None
     row_count = 0
 
-    try:
-        with path_to_csv.open("r", encoding="utf-8") as file:
-            csv_reader = reader(file, delimiter=";")
-            for row in csv_reader:
-                row_count += 1
-                if row_count % 50_000_000 == 0:
-                    print(f"[DEBUG] Processed {row_count:,} lines...")
-
-                if len(row) != 2:
-                    continue
+    with path_to_csv.open("rb") as file, ByteProgress(path_to_csv) as progress:
+        for line in file:
+            row_count += 1
+            if row_count % PROGRESS_EVERY_ROWS == 0:
+                progress.set_position(file.tell(), row_count)
+
+            station, sep, raw_temp = line.rstrip().rpartition(b";")
+            if not sep:
+                continue
+            temp = TENTHS.get(raw_temp)
+            if temp is None:
                 try:
-                    station = str(row[0])
-                    temp = float(row[1])
-                    stats = station_stats[station]
-                    stats["sum"] += temp
-                    stats["count"] += 1
-                    stats["min"] = min(stats["min"], temp)
-                    stats["max"] = max(stats["max"], temp)
+                    temp = parse_tenths(raw_temp)
                 except ValueError:
                     continue
+            i = index.get(station)
+            if i is None:
+                i = station_stats.slot(station)
+            if m2s is not None:
+                # Welford: desvio em relação à média antes desta leitura
+                n = counts[i]
+                if n:
+                    delta = temp - sums[i] / n
+                    m2s[i] += delta * delta * n / (n + 1)
+            sums[i] += temp
+            counts[i] += 1
+            if temp < mins[i]:
+                mins[i] = temp
+            if temp > maxs[i]:
+                maxs[i] = temp
+
+        progress.set_position(file.tell(), row_count)
+
+    return station_stats, row_count
+
+
+# 🔢 Agregação em float via csv.reader (modo original)
+def aggregate_float(path_to_csv: Path, variance: bool = False):
+    station_stats = new_accumulator(fixed_point=False, variance=variance)
+    row_count = 0
 
+    with (
+        path_to_csv.open("r", encoding="utf-8") as file,
+        ByteProgress(path_to_csv) as progress,
+    ):
+        csv_reader = reader(file, delimiter=";")
+        for row in csv_reader:
+            row_count += 1
+            if row_count % PROGRESS_EVERY_ROWS == 0:
+                progress.set_position(file.buffer.tell(), row_count)
+
+            if len(row) != 2:
+                continue
+            try:
+                station_stats.add(row[0], float(row[1]))
+            except ValueError:
+                continue
+        progress.set_position(file.buffer.tell(), row_count)
+
+    return station_stats, row_count
+
+
+# 🔁 Passo 1: Agregação incremental (sem listas), um processo por shard
+def first_pass_aggregate(
+    path_to_csv: Path,
+    intermediate_path: Path,
+    fixed_point: bool = FIXED_POINT,
+    workers: int = os.cpu_count() or 1,
+    variance: bool = False,
+):
+    try:
+        aggregate = aggregate_fixed_point if fixed_point else aggregate_float
+        station_stats, row_count = aggregate_shards(
+            expand_inputs(path_to_csv), partial(aggregate, variance=variance), workers
+        )
+
+        # Com variância, o M2 de cada estação vai junto para o passo 2
         with intermediate_path.open("w", encoding="utf-8") as f:
-            f.write("station;sum;count;min;max\n")
-            for station, stats in station_stats.items():
-                line = f"{station};{stats['sum']};{stats['count']};{stats['min']};{stats['max']}\n"
-                f.write(line)
+            f.write("station;sum;count;min;max" + (";m2\n" if variance else "\n"))
+            for record in station_stats.records():
+                f.write(";".join(str(value) for value in record) + "\n")
 
         log_step(
             "First pass aggregation",
@@ -84,7 +138,11 @@ def second_pass_compute(
     try:
         df = pd.read_csv(intermediate_path, sep=";")
         df["mean"] = df["sum"] / df["count"]
-        df = df[["station", "min", "mean", "max"]]
+        columns = ["station", "min", "mean", "max"]
+        if "m2" in df.columns:
+            df["variance"], df["stddev"] = spread(df["m2"], df["count"])
+            columns += ["variance", "stddev"]
+        df = df[columns]
         df = df.sort_values("station")
         df.to_csv(output_csv, sep=";", index=False)
         df.to_parquet(output_parquet, index=False)
@@ -93,21 +151,44 @@ def second_pass_compute(
     except Exception as e:
         log_step("Second pass compute", f"Failed: {e}")
         print(f"❌ Failed to compute final stats: {e}")
+        raise
 
 
 # 🔁 Execução completa
-def process_temperatures():
+def process_temperatures(
+    path_csv: Path = PATH_CSV,
+    intermediate_path: Path = INTERMEDIATE_PATH,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    workers: int = os.cpu_count() or 1,
+    variance: bool = False,
+):
     print("🚀 Starting 2-pass processing for massive CSV...")
     start_time = time.time()
 
-    first_pass_aggregate(PATH_CSV, INTERMEDIATE_PATH)
-    second_pass_compute(INTERMEDIATE_PATH, OUTPUT_CSV_PATH, OUTPUT_PARQUET_PATH)
+    first_pass_aggregate(
+        path_csv, intermediate_path, workers=workers, variance=variance
+    )
+    second_pass_compute(intermediate_path, output_csv, output_parquet)
 
     elapsed = time.time() - start_time
     print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
     log_step("⏱️  Total processing", f"Completed in {elapsed:.2f} seconds")
 
 
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_temperatures(
+        options.input_path,
+        options.output_dir / INTERMEDIATE_PATH.name,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.budget.threads,
+        options.variance,
+    )
+
+
 # ▶️ Execução principal
 if __name__ == "__main__":
     print(f"[DEBUG] BASE_DIR: {BASE_DIR}")
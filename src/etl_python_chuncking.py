@@ -185,91 +185,173 @@
 #             log_step("Process temperatures", f"Failed: {e}")
 
 # gravação em parquet, acima somente gravação em csv
-from csv import reader, writer
-from collections import defaultdict
+from csv import reader
+from functools import partial
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Tuple
+import os
 import time
-import datetime
 from tqdm import tqdm
 import pandas as pd
 
+from engines import EngineOptions
+from fixed_point import TENTHS, parse_tenths
+from progress import PROGRESS_EVERY_ROWS, ByteProgress
+from shards import aggregate_shards, expand_inputs
+from station_accumulator import StationAccumulator
+from station_dictionary import new_accumulator
+from step_log import StepLogger
+from tracing import Tracer
+
 # ==== CONFIGURAÇÕES E CONSTANTES ====
 
 BASE_DIR = Path(__file__).resolve().parent.parent  # Caminho base do projeto
 PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"  # Caminho do CSV de entrada
 LOG_PATH = BASE_DIR / "logs" / "log_python_chunk.csv"  # Caminho do arquivo de log
+TRACE_PATH = BASE_DIR / "logs" / "trace_python_chunk.jsonl"  # Spans em JSON lines
+CHROME_TRACE_PATH = TRACE_PATH.with_suffix(".json")  # Timeline (Chrome/Perfetto)
 OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_python_chunk.csv"  # Saída CSV
 OUTPUT_PARQUET_PATH = (
     BASE_DIR / "data" / "measurements_python_chunk.parquet"
 )  # Saída Parquet
 CHUNK_SIZE = 50_000_000  # Número de linhas lidas por chunk
+CHUNK_ROW_BYTES = 64  # Memória por linha no chunk (objeto bytes + ponteiro da lista)
+FIXED_POINT = True  # Lê bytes e agrega temperaturas em décimos inteiros
 
 # Garante que os diretórios 'data' e 'logs' existem
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-# ==== FUNÇÃO DE LOG ====
+# ==== FUNÇÃO DE LOG E TRACING ====
 
 
-def log_step(step: str, status: str) -> None:
-    """Registra cada etapa no arquivo de log com timestamp."""
-    with LOG_PATH.open("a", newline="") as log_file:
-        log_writer = writer(log_file)
-        timestamp = datetime.datetime.now().isoformat()
-        if status.lower().startswith("success") or status.lower().startswith(
-            "completed"
-        ):
-            status = "✅ " + status
-        log_writer.writerow([timestamp, step, status])
+log_step = StepLogger(LOG_PATH)
+tracer = Tracer(TRACE_PATH, CHROME_TRACE_PATH)
 
 
 # ==== PROCESSAMENTO DE CADA CHUNK ====
 
 
-def process_chunk(chunk_rows, stats):
+@tracer.traced("Process chunk")
+def process_chunk(chunk_rows, stats: StationAccumulator):
     """Atualiza os dados agregados para cada estação."""
     for row in chunk_rows:
         if len(row) != 2:
             continue
         try:
-            station = row[0]
-            temp = float(row[1])
-            stats[station]["count"] += 1
-            stats[station]["sum"] += temp
-            stats[station]["min"] = min(stats[station]["min"], temp)
-            stats[station]["max"] = max(stats[station]["max"], temp)
+            stats.add(row[0], float(row[1]))
         except ValueError:
             continue
 
 
-# ==== LEITURA EM CHUNKS ====
+@tracer.traced("Process chunk")
+def process_chunk_fixed(chunk_lines, stats: StationAccumulator):
+    """Atualiza os agregados em décimos inteiros a partir de linhas em bytes."""
+    index, sums, counts = stats.index, stats.sums, stats.counts
+    mins, maxs = stats.mins, stats.maxs
+    m2s = stats.m2s if stats.variance else None
+    for line in chunk_lines:
+        station, sep, raw_temp = line.rstrip().rpartition(b";")
+        if not sep:
+            continue
+        temp = TENTHS.get(raw_temp)
+        if temp is None:
+            try:
+                temp = parse_tenths(raw_temp)
+            except ValueError:
+                continue
+        i = index.get(station)
+        if i is None:
+            i = stats.slot(station)
+        if m2s is not None:
+            # Welford: desvio em relação à média antes desta leitura
+            n = counts[i]
+            if n:
+                delta = temp - sums[i] / n
+                m2s[i] += delta * delta * n / (n + 1)
+        counts[i] += 1
+        sums[i] += temp
+        if temp < mins[i]:
+            mins[i] = temp
+        if temp > maxs[i]:
+            maxs[i] = temp
 
 
-def read_temperatures_in_chunks(
-    path_to_csv: Path, chunk_size: int
-) -> Dict[str, Dict[str, float]]:
-    """Lê o CSV em chunks e agrega os dados por estação."""
-    stats = defaultdict(
-        lambda: {"count": 0, "sum": 0.0, "min": float("inf"), "max": float("-inf")}
-    )
-    total_lines = sum(1 for _ in open(path_to_csv, encoding="utf-8"))
+# ==== LEITURA EM CHUNKS ====
 
-    try:
-        with path_to_csv.open("r", encoding="utf-8") as file:
+
+def read_file_in_chunks(
+    path_to_csv: Path,
+    chunk_size: int,
+    fixed_point: bool = FIXED_POINT,
+    variance: bool = False,
+) -> Tuple[StationAccumulator, int]:
+    """Lê um arquivo CSV em chunks; devolve os agregados e o total de linhas."""
+    stats = new_accumulator(fixed_point=fixed_point, variance=variance)
+    row_count = 0
+
+    if fixed_point:
+        with (
+            path_to_csv.open("rb") as file,
+            ByteProgress(path_to_csv, desc="📥 Lendo em chunks") as progress,
+        ):
+            chunk = []
+            for line in file:
+                chunk.append(line)
+                if len(chunk) % PROGRESS_EVERY_ROWS == 0:
+                    progress.set_position(file.tell(), row_count + len(chunk))
+                if len(chunk) >= chunk_size:
+                    process_chunk_fixed(chunk, stats)
+                    row_count += len(chunk)
+                    chunk = []
+            if chunk:
+                process_chunk_fixed(chunk, stats)
+                row_count += len(chunk)
+            progress.set_position(file.tell(), row_count)
+    else:
+        with (
+            path_to_csv.open("r", encoding="utf-8") as file,
+            ByteProgress(path_to_csv, desc="📥 Lendo em chunks") as progress,
+        ):
             csv_reader = reader(file, delimiter=";")
             chunk = []
-            for row in tqdm(
-                csv_reader, total=total_lines, desc="📥 Lendo em chunks", unit="linha"
-            ):
+            for row in csv_reader:
                 chunk.append(row)
+                if len(chunk) % PROGRESS_EVERY_ROWS == 0:
+                    progress.set_position(file.buffer.tell(), row_count + len(chunk))
                 if len(chunk) >= chunk_size:
                     process_chunk(chunk, stats)
+                    row_count += len(chunk)
                     chunk = []
             if chunk:
                 process_chunk(chunk, stats)
+                row_count += len(chunk)
+            progress.set_position(file.buffer.tell(), row_count)
+
+    return stats, row_count
 
-        log_step("Read temperatures (chunked)", "Success")
+
+@tracer.traced("Read temperatures")
+def read_temperatures_in_chunks(
+    path_to_csv: Path,
+    chunk_size: int,
+    fixed_point: bool = FIXED_POINT,
+    workers: int = os.cpu_count() or 1,
+    variance: bool = False,
+) -> StationAccumulator:
+    """Lê o CSV (ou os shards, um por processo) em chunks e agrega por estação."""
+    try:
+        stats, row_count = aggregate_shards(
+            expand_inputs(path_to_csv),
+            partial(
+                read_file_in_chunks,
+                chunk_size=chunk_size,
+                fixed_point=fixed_point,
+                variance=variance,
+            ),
+            workers,
+        )
+        log_step("Read temperatures (chunked)", f"Success: {row_count} lines")
         print("✅ Temperatures read and aggregated successfully.")
     except Exception as e:
         log_step("Read temperatures", f"Failed: {e}")
@@ -281,17 +363,16 @@ def read_temperatures_in_chunks(
 # ==== FORMATAÇÃO ====
 
 
-def format_results(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, str]]:
+@tracer.traced("Format results")
+def format_results(stats: StationAccumulator) -> Dict[str, Dict[str, str]]:
     """Formata os resultados para duas casas decimais."""
-    sorted_stats = dict(sorted(stats.items()))
     formatted = {}
-    for station, data in tqdm(
-        sorted_stats.items(), desc="🧮 Formatando resultados", unit="estação"
+    columns = stats.columns()[1:]
+    for station, *values in tqdm(
+        stats.rows(), desc="🧮 Formatando resultados", unit="estação"
     ):
         formatted[station] = {
-            "min": f"{data['min']:.2f}",
-            "mean": f"{data['sum'] / data['count']:.2f}",
-            "max": f"{data['max']:.2f}",
+            column: f"{value:.2f}" for column, value in zip(columns, values)
         }
     log_step("Format results", f"Success: {len(formatted)} stations processed")
     print(f"✅ Results formatted successfully: {len(formatted)} stations processed.")
@@ -301,56 +382,85 @@ def format_results(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, st
 # ==== GRAVAÇÃO EM DISCO ====
 
 
-def save_results_to_file(results: Dict[str, Dict[str, str]]) -> None:
+def save_results_to_file(
+    results: Dict[str, Dict[str, str]],
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+) -> None:
     """Salva os resultados em CSV e Parquet."""
     try:
-        with OUTPUT_CSV_PATH.open("w", encoding="utf-8") as f:
-            f.write("station;min;mean;max\n")
+        with tracer.span("Save CSV"), output_csv.open("w", encoding="utf-8") as f:
+            # Colunas da primeira estação: min/mean/max (+ variance/stddev)
+            columns = list(next(iter(results.values()), {})) or ["min", "mean", "max"]
+            f.write(";".join(["station", *columns]) + "\n")
             for station, data in results.items():
-                f.write(f"{station};{data['min']};{data['mean']};{data['max']}\n")
+                f.write(";".join([station, *data.values()]) + "\n")
         log_step("Save CSV", "Success")
-        print(f"✅ Results saved to {OUTPUT_CSV_PATH}")
+        print(f"✅ Results saved to {output_csv}")
     except Exception as e:
         log_step("Save CSV", f"Failed: {e}")
         print(f"❌ Failed to save CSV: {e}")
+        raise
 
     # Log separador
     log_step("-----", "-----")
 
     try:
-        df_parquet = pd.DataFrame(
-            [
-                {
-                    "station": st,
-                    "min": data["min"],
-                    "mean": data["mean"],
-                    "max": data["max"],
-                }
-                for st, data in results.items()
-            ]
-        )
-        df_parquet.to_parquet(OUTPUT_PARQUET_PATH, index=False)
+        with tracer.span("Save Parquet"):
+            df_parquet = pd.DataFrame(
+                [{"station": st, **data} for st, data in results.items()]
+            )
+            df_parquet.to_parquet(output_parquet, index=False)
         log_step("Save Parquet", "Success")
-        print(f"✅ Results saved to {OUTPUT_PARQUET_PATH}")
+        print(f"✅ Results saved to {output_parquet}")
     except Exception as e:
         log_step("Save Parquet", f"Failed: {e}")
         print(f"❌ Failed to save Parquet: {e}")
+        raise
 
 
 # ==== PIPELINE ====
 
 
-def process_temperatures(path_to_csv: Path):
+@tracer.traced("ETL Python chunk")
+def process_temperatures(
+    path_to_csv: Path,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    workers: int = os.cpu_count() or 1,
+    chunk_size: int = CHUNK_SIZE,
+    variance: bool = False,
+):
     print("🚀 Iniciando processamento com chunking otimizado...")
     start = time.time()
-    stats = read_temperatures_in_chunks(path_to_csv, CHUNK_SIZE)
+    stats = read_temperatures_in_chunks(
+        path_to_csv, chunk_size, workers=workers, variance=variance
+    )
     formatted = format_results(stats)
-    save_results_to_file(formatted)
+    save_results_to_file(formatted, output_csv, output_parquet)
     elapsed = time.time() - start
     print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
     log_step("Total processing", f"Completed in {elapsed:.2f} seconds")
 
 
+# ==== ENTRADA DO RUNNER (cli.py) ====
+
+
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    tracer.path = options.log_dir / TRACE_PATH.name
+    tracer.chrome_path = options.log_dir / CHROME_TRACE_PATH.name
+    process_temperatures(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.budget.threads,
+        # Com --memory-limit, chunks menores: cada processo guarda um chunk inteiro
+        options.budget.chunk_rows(CHUNK_SIZE, CHUNK_ROW_BYTES, options.budget.threads),
+        options.variance,
+    )
+
+
 # ==== EXECUÇÃO ====
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Optional, Tuple
+import mmap
+import os
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from byte_ranges import BLOCK_SIZE, iter_blocks, split_byte_ranges
+from engines import EngineOptions
+from fixed_point import TENTHS, parse_tenths
+from incremental import aggregate_appended
+from progress import ByteProgress
+from shards import expand_inputs, shard_parts
+from station_accumulator import StationAccumulator
+from station_dictionary import load_station_dictionary, new_accumulator
+from step_log import StepLogger
+
+# 📁 Caminhos principais
+BASE_DIR = Path(__file__).resolve().parent.parent
+PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
+LOG_PATH = BASE_DIR / "logs" / "log_python_multiprocess.csv"
+OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_python_multiprocess.csv"
+OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
+STATE_PATH = BASE_DIR / "data" / "state_python_multiprocess.json"
+TASKS_PER_WORKER = 4  # Intervalos por worker, para balancear workers mais lentos
+BLOCK_OVERHEAD = 5  # Pico de memória por bloco: o bloco + a lista do splitlines()
+
+# 🛠️ Garante que os diretórios existem
+LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+
+# 📝 Log incremental
+log_step = StepLogger(LOG_PATH)
+
+
+# ⚙️ Worker: agrega um intervalo de bytes do arquivo
+def aggregate_range(
+    task: Tuple[Path, int, int, int, bool],
+) -> Tuple[StationAccumulator, int, int]:
+    path_to_csv, start, end, block_size, variance = task
+    stats = new_accumulator(fixed_point=True, variance=variance)
+    index, sums, counts = stats.index, stats.sums, stats.counts
+    mins, maxs = stats.mins, stats.maxs
+    m2s = stats.m2s if variance else None
+    row_count = 0
+
+    with (
+        path_to_csv.open("rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        for block in iter_blocks(mm, start, end, block_size):
+            for line in block.splitlines():
+                row_count += 1
+                station, sep, raw_temp = line.rpartition(b";")
+                if not sep:
+                    continue
+                temp = TENTHS.get(raw_temp)
+                if temp is None:
+                    try:
+                        temp = parse_tenths(raw_temp)
+                    except ValueError:
+                        continue
+                i = index.get(station)
+                if i is None:
+                    i = stats.slot(station)
+                if m2s is not None:
+                    # Welford: desvio em relação à média antes desta leitura
+                    n = counts[i]
+                    if n:
+                        delta = temp - sums[i] / n
+                        m2s[i] += delta * delta * n / (n + 1)
+                sums[i] += temp
+                counts[i] += 1
+                if temp < mins[i]:
+                    mins[i] = temp
+                if temp > maxs[i]:
+                    maxs[i] = temp
+
+    return stats, row_count, end - start
+
+
+# 📥 Lê o arquivo (ou [start, end), ou os shards) em paralelo por intervalos de bytes
+def read_and_aggregate_parallel(
+    path_to_csv: Path,
+    workers: int,
+    start: int = 0,
+    end: Optional[int] = None,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+) -> StationAccumulator:
+    try:
+        if end is None:
+            spans = [(p, 0, p.stat().st_size) for p in expand_inputs(path_to_csv)]
+        else:
+            spans = [(path_to_csv, start, end)]
+        total = sum(stop - begin for _, begin, stop in spans)
+
+        # Intervalos distribuídos entre os shards proporcionalmente ao tamanho
+        parts = workers * TASKS_PER_WORKER
+        tasks = [
+            (path, range_start, range_end, block_size, variance)
+            for path, begin, stop in spans
+            for range_start, range_end in split_byte_ranges(
+                path, shard_parts(parts, stop - begin, total), begin, stop
+            )
+        ]
+        shards = f" in {len(spans)} files" if len(spans) > 1 else ""
+        print(f"🧵 {len(tasks)} byte ranges{shards} across {workers} workers...")
+
+        load_station_dictionary()  # Carrega antes do fork: os workers herdam o cache
+        stats = StationAccumulator(fixed_point=True, variance=variance)
+        row_count = 0
+        with (
+            Pool(processes=workers) as pool,
+            ByteProgress(spans[0][0], total=total) as progress,
+        ):
+            for partial, rows, n_bytes in pool.imap_unordered(aggregate_range, tasks):
+                stats.merge(partial)
+                row_count += rows
+                progress.update(n_bytes, rows)
+
+        log_step(
+            "Read and aggregate (multiprocess)",
+            f"Success: {len(stats)} stations from {row_count} lines, {workers} workers",
+        )
+        print(f"✅ Aggregated {row_count:,} rows from {len(stats)} stations.")
+    except Exception as e:
+        log_step("Read and aggregate (multiprocess)", f"Failed: {e}")
+        raise
+    return stats
+
+
+# 💾 Salva resultados em CSV e Parquet
+def save_results(stats: StationAccumulator, csv_path: Path, parquet_path: Path) -> None:
+    rows = stats.rows()
+    columns = stats.columns()
+
+    try:
+        with csv_path.open("w", encoding="utf-8") as f:
+            f.write(";".join(columns) + "\n")
+            for station, *values in rows:
+                f.write(";".join([station, *(f"{v:.2f}" for v in values)]) + "\n")
+        log_step("Save results (CSV)", "Success")
+        print(f"✅ Results saved to {csv_path}")
+    except Exception as e:
+        log_step("Save results (CSV)", f"Failed: {e}")
+        print(f"❌ Failed to save CSV: {e}")
+        raise
+
+    try:
+        table = pa.table(
+            {
+                "station": [r[0] for r in rows],
+                **{
+                    name: [round(r[k], 2) for r in rows]
+                    for k, name in enumerate(columns[1:], start=1)
+                },
+            }
+        )
+        pq.write_table(table, parquet_path)
+        log_step("Save results (Parquet)", "Success")
+        print(f"✅ Results saved to {parquet_path}")
+    except Exception as e:
+        log_step("Save results (Parquet)", f"Failed: {e}")
+        print(f"❌ Failed to save Parquet: {e}")
+        raise
+
+
+# 🔁 Pipeline principal
+def process_temperatures(
+    workers: int,
+    path_csv: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    state_path: Optional[Path] = None,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+):
+    print(f"🚀 Starting multiprocess processing with {workers} workers...")
+    start = time.time()
+    if state_path is None:
+        stats = read_and_aggregate_parallel(
+            path_csv, workers, block_size=block_size, variance=variance
+        )
+    else:
+        # Modo incremental: só os bytes anexados desde a última execução
+        stats = aggregate_appended(
+            path_csv,
+            state_path,
+            lambda begin, end: read_and_aggregate_parallel(
+                path_csv, workers, begin, end, block_size, variance
+            ),
+            log_step,
+            variance,
+        )
+    save_results(stats, output_csv, output_parquet)
+    elapsed = time.time() - start
+    print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
+    log_step("⏱️  Total processing", f"Completed in {elapsed:.2f} seconds")
+
+
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_temperatures(
+        options.budget.threads,
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.output_dir / STATE_PATH.name if options.incremental else None,
+        options.budget.block_bytes(BLOCK_SIZE, BLOCK_OVERHEAD, options.budget.threads),
+        options.variance,
+    )
+
+
+# ▶️ Execução
+if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL em Python puro com multiprocessing")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Número de processos (padrão: todos os núcleos)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Lê só o que foi anexado desde a última execução (estado em {STATE_PATH.name})",
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
+    if not PATH_CSV.exists():
+        print(f"❌ File {PATH_CSV} not found.")
+        log_step("File check", "Failed: File not found")
+    else:
+        try:
+            process_temperatures(
+                max(1, args.workers),
+                state_path=STATE_PATH if args.incremental else None,
+                variance=args.variance,
+            )
+        except Exception as e:
+            print(f"❌ Processing failed: {e}")
+            log_step("Process temperatures (multiprocess)", f"Failed: {e}")
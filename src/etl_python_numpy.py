@@ -0,0 +1,368 @@
+from argparse import ArgumentParser
+from functools import partial
+from pathlib import Path
+from typing import List, Optional, Tuple
+import mmap
+import os
+import time
+import numpy as np
+import pyarrow.parquet as pq
+
+from byte_ranges import iter_blocks
+from engines import EngineOptions
+from fixed_point import parse_tenths
+from incremental import aggregate_appended
+from progress import ByteProgress
+from shards import aggregate_shards, expand_inputs
+from station_accumulator import StationAccumulator
+from station_dictionary import StationDictionary, load_station_dictionary, name_words
+from step_log import StepLogger
+from variance import group_m2, merge_m2
+
+# 📁 Caminhos principais
+BASE_DIR = Path(__file__).resolve().parent.parent
+PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
+LOG_PATH = BASE_DIR / "logs" / "log_numpy.csv"
+OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_numpy.csv"
+OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
+STATE_PATH = BASE_DIR / "data" / "state_numpy.json"
+BLOCK_SIZE = 16 * 1024 * 1024  # Bytes por bloco vetorizado
+BLOCK_OVERHEAD = 10  # Pico medido por bloco (~9×, com folga): arrays int64 por linha
+
+# 🛠️ Garante que os diretórios existem
+LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+NEWLINE, SEMICOLON, MINUS, DOT, ZERO, CR = (ord(c) for c in "\n;-.0\r")
+
+
+# 📝 Log incremental
+log_step = StepLogger(LOG_PATH)
+
+
+# 🔢 Parsing vetorizado das temperaturas em décimos inteiros
+def parse_tenths_vectorized(
+    buf: np.ndarray, start: np.ndarray, end: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converte os campos buf[start:end] no formato [-]d[d].d em décimos inteiros.
+    Retorna (valores, máscara de linhas no formato esperado).
+    """
+    length = end - start
+    negative = buf[start] == MINUS
+    int_digits = length - 2 - negative
+
+    def digit(pos):
+        return buf[np.clip(pos, 0, len(buf) - 1)].astype(np.int64) - ZERO
+
+    frac, units, tens = digit(end - 1), digit(end - 3), digit(end - 4)
+    valid = (
+        (length >= 3)
+        & ((int_digits == 1) | (int_digits == 2))
+        & (buf[np.clip(end - 2, 0, len(buf) - 1)] == DOT)
+        & (frac >= 0)
+        & (frac <= 9)
+        & (units >= 0)
+        & (units <= 9)
+        & ((int_digits == 1) | ((tens >= 0) & (tens <= 9)))
+    )
+    tenths = units * 10 + frac + np.where(int_digits == 2, tens * 100, 0)
+    return np.where(negative, -tenths, tenths), valid
+
+
+# 🏷️ Ids locais das estações do bloco
+def station_ids(
+    block: bytes, buf: np.ndarray, starts: np.ndarray, semi: np.ndarray
+) -> Tuple[List[bytes], np.ndarray]:
+    """
+    Mapeia cada nome buf[start:semi] para um id denso dentro do bloco.
+    Os nomes são lidos em palavras de 8 bytes e resumidos num hash de 64 bits
+    (name_words); colisões são verificadas comparando as palavras, com
+    fallback exato.
+    """
+    words, hashes, lengths = name_words(buf, starts, semi)
+    _, first, ids = np.unique(hashes, return_index=True, return_inverse=True)
+    if not (words == words[:, first[ids]]).all():
+        # Colisão de hash: agrupa pelos bytes completos
+        width = int(lengths.max())
+        keys = np.zeros((len(starts), width), dtype=np.uint8)
+        for k in range(width):
+            keys[:, k] = np.where(k < lengths, buf[np.minimum(starts + k, semi)], 0)
+        _, first, ids = np.unique(
+            keys.view(f"S{width}").ravel(), return_index=True, return_inverse=True
+        )
+
+    names = [block[starts[f] : semi[f]] for f in first.tolist()]
+    return names, ids
+
+
+# ⚙️ Agrega um bloco de linhas completas
+def aggregate_block(
+    block: bytes,
+    stats: StationAccumulator,
+    dictionary: Optional[StationDictionary] = None,
+) -> int:
+    if not block.endswith(b"\n"):
+        block += b"\n"
+    buf = np.frombuffer(block, dtype=np.uint8)
+
+    ends = np.flatnonzero(buf == NEWLINE)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    row_count = len(ends)
+
+    # Último ";" de cada linha (como rpartition); linhas sem ";" são descartadas
+    semis = np.flatnonzero(buf == SEMICOLON)
+    last = np.searchsorted(semis, ends) - 1
+    semi = semis[np.maximum(last, 0)] if len(semis) else np.full_like(ends, -1)
+    has_sep = (last >= 0) & (semi >= starts)
+    if not has_sep.all():
+        starts, ends, semi = starts[has_sep], ends[has_sep], semi[has_sep]
+
+    temp_end = ends - (buf[np.maximum(ends - 1, 0)] == CR)
+    tenths, valid = parse_tenths_vectorized(buf, semi + 1, temp_end)
+
+    # Linhas fora do formato: parsing genérico, uma a uma
+    if not valid.all():
+        for j in np.flatnonzero(~valid):
+            try:
+                tenths[j] = parse_tenths(block[semi[j] + 1 : temp_end[j]])
+                valid[j] = True
+            except ValueError:
+                pass
+        starts, semi, tenths = starts[valid], semi[valid], tenths[valid]
+
+    if len(starts) == 0:
+        return row_count
+
+    if dictionary is not None:
+        aggregate_by_dictionary(block, buf, starts, semi, tenths, stats, dictionary)
+        return row_count
+
+    names, ids = station_ids(block, buf, starts, semi)
+
+    # Agregação por id local do bloco
+    n = len(names)
+    counts = np.bincount(ids, minlength=n)
+    sums = np.bincount(ids, weights=tenths, minlength=n).astype(np.int64)
+    mins = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    maxs = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(mins, ids, tenths)
+    np.maximum.at(maxs, ids, tenths)
+    m2s = group_m2(ids, tenths, sums, counts).tolist() if stats.variance else None
+
+    stats.merge_arrays(
+        names, sums.tolist(), counts.tolist(), mins.tolist(), maxs.tolist(), m2s
+    )
+    return row_count
+
+
+# 🗂️ Agrega um bloco pelos ids do dicionário de estações
+def aggregate_by_dictionary(
+    block: bytes,
+    buf: np.ndarray,
+    starts: np.ndarray,
+    semi: np.ndarray,
+    tenths: np.ndarray,
+    stats: StationAccumulator,
+    dictionary: StationDictionary,
+) -> None:
+    """
+    Agrega direto nos slots globais: `stats` foi pré-alocado com o dicionário
+    (slot i = id i), então os ids vêm de um searchsorted nos hashes conhecidos
+    e os agregados do bloco somam nos arrays do acumulador, sem criar bytes por
+    estação. Só nomes fora do dicionário passam pelo caminho por bloco.
+    """
+    ids, known = dictionary.lookup(*name_words(buf, starts, semi))
+    if not known.all():
+        unknown = np.flatnonzero(~known)
+        names, local = station_ids(block, buf, starts[unknown], semi[unknown])
+        slots = np.array([stats.slot(name) for name in names])
+        ids[unknown] = slots[local]
+
+    n = len(stats.stations)  # Todos os slots, inclusive os ainda sem leituras
+    counts = np.bincount(ids, minlength=n)
+    block_sums = np.bincount(ids, weights=tenths, minlength=n).astype(np.int64)
+    block_mins = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    block_maxs = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(block_mins, ids, tenths)
+    np.maximum.at(block_maxs, ids, tenths)
+
+    # Visões NumPy dos arrays do acumulador (soltas antes de qualquer novo slot)
+    sums = np.frombuffer(stats.sums, dtype=np.int64)
+    totals = np.frombuffer(stats.counts, dtype=np.int64)
+    if stats.variance:
+        # Chan: M2 do bloco combinado com o acumulado antes de somar os totais
+        m2s = np.frombuffer(stats.m2s, dtype=np.float64)
+        block_m2 = group_m2(ids, tenths, block_sums, counts)
+        m2s[:] = merge_m2(totals, sums, m2s, counts, block_sums, block_m2)
+        del m2s
+    sums += block_sums
+    totals += counts
+    mins = np.frombuffer(stats.mins, dtype=np.int64)
+    np.minimum(mins, block_mins, out=mins)
+    maxs = np.frombuffer(stats.maxs, dtype=np.int64)
+    np.maximum(maxs, block_maxs, out=maxs)
+    del sums, totals, mins, maxs
+
+
+# 📥 Lê um CSV (ou só [start, end)) em blocos binários e agrega com NumPy
+def aggregate_file(
+    path_to_csv: Path,
+    start: int = 0,
+    end: Optional[int] = None,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+) -> Tuple[StationAccumulator, int]:
+    dictionary = load_station_dictionary()
+    stats = (
+        StationAccumulator(fixed_point=True, variance=variance)
+        if dictionary is None
+        else dictionary.accumulator(variance=variance)
+    )
+    row_count = 0
+    end = path_to_csv.stat().st_size if end is None else end
+    if end <= start:
+        return stats, row_count  # Nada a ler (arquivo vazio ou nada anexado)
+    with (
+        path_to_csv.open("rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+        ByteProgress(path_to_csv, total=end - start) as progress,
+    ):
+        for block in iter_blocks(mm, start, end, block_size):
+            rows = aggregate_block(block, stats, dictionary)
+            row_count += rows
+            progress.update(len(block), rows)
+    return stats, row_count
+
+
+# 📥 Agrega o CSV inteiro, só [start, end) ou os shards (um por processo)
+def read_and_aggregate_numpy(
+    path_to_csv: Path,
+    start: int = 0,
+    end: Optional[int] = None,
+    workers: int = os.cpu_count() or 1,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+) -> StationAccumulator:
+    try:
+        if end is None:
+            stats, row_count = aggregate_shards(
+                expand_inputs(path_to_csv),
+                partial(aggregate_file, block_size=block_size, variance=variance),
+                workers,
+            )
+        else:
+            stats, row_count = aggregate_file(
+                path_to_csv, start, end, block_size, variance
+            )
+        log_step(
+            "Read and aggregate (NumPy)",
+            f"Success: {len(stats)} stations from {row_count} lines",
+        )
+        print(f"✅ Aggregated {row_count:,} rows from {len(stats)} stations.")
+    except Exception as e:
+        log_step("Read and aggregate (NumPy)", f"Failed: {e}")
+        raise
+    return stats
+
+
+# 💾 Salva resultados em CSV e Parquet
+def save_results(stats: StationAccumulator, csv_path: Path, parquet_path: Path) -> None:
+    try:
+        with csv_path.open("w", encoding="utf-8") as f:
+            f.write(";".join(stats.columns()) + "\n")
+            for station, *values in stats.rows():
+                f.write(";".join([station, *(f"{v:.2f}" for v in values)]) + "\n")
+        log_step("Save results (CSV)", "Success")
+        print(f"✅ Results saved to {csv_path}")
+    except Exception as e:
+        log_step("Save results (CSV)", f"Failed: {e}")
+        print(f"❌ Failed to save CSV: {e}")
+        raise
+
+    try:
+        pq.write_table(stats.to_arrow(), parquet_path)
+        log_step("Save results (Parquet)", "Success")
+        print(f"✅ Results saved to {parquet_path}")
+    except Exception as e:
+        log_step("Save results (Parquet)", f"Failed: {e}")
+        print(f"❌ Failed to save Parquet: {e}")
+        raise
+
+
+# 🔁 Pipeline principal
+def process_temperatures(
+    path_csv: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    state_path: Optional[Path] = None,
+    workers: int = os.cpu_count() or 1,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+):
+    print("🚀 Starting vectorized processing with NumPy...")
+    start = time.time()
+    if state_path is None:
+        stats = read_and_aggregate_numpy(
+            path_csv, workers=workers, block_size=block_size, variance=variance
+        )
+    else:
+        # Modo incremental: só os bytes anexados desde a última execução
+        stats = aggregate_appended(
+            path_csv,
+            state_path,
+            lambda begin, end: read_and_aggregate_numpy(
+                path_csv, begin, end, block_size=block_size, variance=variance
+            ),
+            log_step,
+            variance,
+        )
+    save_results(stats, output_csv, output_parquet)
+    elapsed = time.time() - start
+    print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
+    log_step("⏱️  Total processing", f"Completed in {elapsed:.2f} seconds")
+
+
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_temperatures(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.output_dir / STATE_PATH.name if options.incremental else None,
+        options.budget.threads,
+        options.budget.block_bytes(BLOCK_SIZE, BLOCK_OVERHEAD, options.budget.threads),
+        options.variance,
+    )
+
+
+# ▶️ Execução
+if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL vetorizada com NumPy")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Lê só o que foi anexado desde a última execução (estado em {STATE_PATH.name})",
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
+    if not PATH_CSV.exists():
+        print(f"❌ File {PATH_CSV} not found.")
+        log_step("File check", "Failed: File not found")
+    else:
+        try:
+            process_temperatures(
+                state_path=STATE_PATH if args.incremental else None,
+                variance=args.variance,
+            )
+        except Exception as e:
+            print(f"❌ Processing failed: {e}")
+            log_step("Process temperatures (NumPy)", f"Failed: {e}")
@@ -1,14 +1,18 @@
-from csv import writer
 from pathlib import Path
 import time
-import datetime
 import polars as pl
+from typing import Tuple, Union
+
+from columnar import TEMPERATURE_COLUMN, TEMPERATURE_SCALE, input_format
+from engines import EngineOptions
+from shards import expand_inputs
+from step_log import StepLogger
 
 # 📁 Caminhos principais
 BASE_DIR = Path(__file__).resolve().parent.parent
 PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
-LOG_PATH = BASE_DIR / "logs" / "log_python.csv"
-OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_python.csv"
+LOG_PATH = BASE_DIR / "logs" / "log_polars.csv"
+OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_polars.csv"
 OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
 
 # 🛠️ Garante que os diretórios existem
@@ -17,51 +21,68 @@ OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
 # 📝 Log incremental
-def log_step(step: str, status: str) -> None:
-    try:
-        with LOG_PATH.open("a", newline="") as log_file:
-            log_writer = writer(log_file)
-            timestamp = datetime.datetime.now().isoformat()
-            if status.lower().startswith("success") or status.lower().startswith(
-                "completed"
-            ):
-                status = "✅ " + status
-            log_writer.writerow([timestamp, step, status])
-    except Exception as e:
-        print(f"[LOG ERROR] Failed to write log: {e}")
+log_step = StepLogger(LOG_PATH)
 
 
 # 📥 Lê CSV e processa com Polars
 
 
-def read_and_aggregate_with_polars(path_to_csv: Path) -> pl.DataFrame:
+def read_measurements(
+    path_to_csv: Path, lazy: bool = False
+) -> Tuple[Union[pl.DataFrame, pl.LazyFrame], str, int]:
+    """
+    Lê CSV, Parquet ou Arrow IPC; devolve o DataFrame, a coluna de temperatura e a escala.
+    Diretórios e globs viram uma lista de shards, lidos em paralelo pelo próprio Polars.
+    Com `lazy=True` só abre um scan (usado no modo com limite de memória).
+    """
+    paths = expand_inputs(path_to_csv)
+    file_format = input_format(paths[0])
+    if file_format == "parquet":
+        reader = pl.scan_parquet if lazy else pl.read_parquet
+        return reader(paths), TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    if file_format == "arrow":
+        reader = pl.scan_ipc if lazy else pl.read_ipc
+        return reader(paths), TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    reader = pl.scan_csv if lazy else pl.read_csv
+    df = reader(
+        paths,
+        separator=";",
+        has_header=False,
+        new_columns=["station", "temperature"],
+    )
+    return df, "temperature", 1
+
+
+def read_and_aggregate_with_polars(
+    path_to_csv: Path, streaming: bool = False, variance: bool = False
+) -> pl.DataFrame:
     try:
-        print("📥 Lendo arquivo CSV com Polars...")
-        df = pl.read_csv(
-            path_to_csv,
-            separator=";",
-            has_header=False,
-            new_columns=["station", "temperature"],
-        )
+        print(f"📥 Lendo {path_to_csv} com Polars...")
+        # Com teto de memória não dá para carregar tudo: agrega em streaming
+        df, column, scale = read_measurements(path_to_csv, lazy=streaming)
+        temperature = pl.col(column)
+        aggregations = [
+            (temperature.min() / scale).alias("min"),
+            (temperature.mean() / scale).alias("mean"),
+            (temperature.max() / scale).alias("max"),
+        ]
+        if variance:
+            # Populacionais (ddof=0), como nas demais engines
+            aggregations += [
+                (temperature.var(ddof=0) / scale**2).alias("variance"),
+                (temperature.std(ddof=0) / scale).alias("stddev"),
+            ]
         print("📊 Agrupando e agregando...")
         result = (
             df.group_by("station")
-            .agg(
-                [
-                    pl.col("temperature").min().alias("min"),
-                    pl.col("temperature").mean().alias("mean"),
-                    pl.col("temperature").max().alias("max"),
-                ]
-            )
+            .agg(aggregations)
+            # Parquet/Arrow chegam como Categorical: ordena pelo texto da estação
+            .with_columns(pl.col("station").cast(pl.String))
             .sort("station")
-            .with_columns(
-                [
-                    pl.col("min").round(2),
-                    pl.col("mean").round(2),
-                    pl.col("max").round(2),
-                ]
-            )
+            .with_columns(pl.exclude("station").round(2))
         )
+        if streaming:
+            result = result.collect(engine="streaming")
         log_step("Read and aggregate (Polars)", f"Success: {result.height} stations")
         print(f"✅ Aggregation complete: {result.height} stations")
         return result
@@ -81,6 +102,7 @@ def save_results(df: pl.DataFrame, csv_path: Path, parquet_path: Path) -> None:
     except Exception as e:
         log_step("Save results (CSV)", f"Failed: {e}")
         print(f"❌ Failed to save CSV: {e}")
+        raise
 
     try:
         df.write_parquet(parquet_path)
@@ -89,19 +111,38 @@ def save_results(df: pl.DataFrame, csv_path: Path, parquet_path: Path) -> None:
     except Exception as e:
         log_step("Save results (Parquet)", f"Failed: {e}")
         print(f"❌ Failed to save Parquet: {e}")
+        raise
 
 
 # 🔁 Pipeline principal
-def process_with_polars():
+def process_with_polars(
+    path_csv: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    streaming: bool = False,
+    variance: bool = False,
+):
     print("🚀 Starting temperature processing with Polars...")
     start = time.time()
-    df = read_and_aggregate_with_polars(PATH_CSV)
-    save_results(df, OUTPUT_CSV_PATH, OUTPUT_PARQUET_PATH)
+    df = read_and_aggregate_with_polars(path_csv, streaming, variance)
+    save_results(df, output_csv, output_parquet)
     elapsed = time.time() - start
     print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
     log_step("⏱️  Total processing (Polars)", f"Completed in {elapsed:.2f} seconds")
 
 
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_with_polars(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        streaming=options.budget.memory_limit is not None,
+        variance=options.variance,
+    )
+
+
 # ▶️ Execução
 if __name__ == "__main__":
     print(f"[DEBUG] BASE_DIR: {BASE_DIR}")
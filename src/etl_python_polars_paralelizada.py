@@ -1,14 +1,19 @@
-from csv import writer
+from argparse import ArgumentParser
 from pathlib import Path
 import time
-import datetime
 import polars as pl
+from typing import Optional, Tuple
+
+from columnar import TEMPERATURE_COLUMN, TEMPERATURE_SCALE, input_format
+from engines import EngineOptions
+from shards import expand_inputs
+from step_log import StepLogger
 
 # 📁 Caminhos principais
 BASE_DIR = Path(__file__).resolve().parent.parent
 PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
-LOG_PATH = BASE_DIR / "logs" / "log_python.csv"
-OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_python.csv"
+LOG_PATH = BASE_DIR / "logs" / "log_polars_lazy.csv"
+OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_polars_lazy.csv"
 OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
 
 # 🛠️ Garante que os diretórios existem
@@ -17,49 +22,67 @@ OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
 # 📝 Log incremental
-def log_step(step: str, status: str) -> None:
-    try:
-        with LOG_PATH.open("a", newline="") as log_file:
-            log_writer = writer(log_file)
-            timestamp = datetime.datetime.now().isoformat()
-            if status.lower().startswith("success") or status.lower().startswith(
-                "completed"
-            ):
-                status = "✅ " + status
-            log_writer.writerow([timestamp, step, status])
-    except Exception as e:
-        print(f"[LOG ERROR] Failed to write log: {e}")
+log_step = StepLogger(LOG_PATH)
 
 
 # 📥 Lê e processa com Polars Lazy (streaming seguro)
-def read_and_aggregate_with_polars_lazy(path_to_csv: Path) -> pl.DataFrame:
+def scan_measurements(path_to_csv: Path) -> Tuple[pl.LazyFrame, str, int]:
+    """
+    Abre CSV, Parquet ou Arrow IPC em modo lazy; devolve a coluna de temperatura e a escala.
+    Diretórios e globs viram um único scan multi-arquivo.
+    """
+    paths = expand_inputs(path_to_csv)
+    file_format = input_format(paths[0])
+    if file_format == "parquet":
+        return pl.scan_parquet(paths), TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    if file_format == "arrow":
+        return pl.scan_ipc(paths), TEMPERATURE_COLUMN, TEMPERATURE_SCALE
+    lazy = pl.scan_csv(
+        paths,
+        separator=";",
+        has_header=False,
+        new_columns=["station", "temperature"],
+    )
+    return lazy, "temperature", 1
+
+
+def build_plan(path_to_csv: Path, variance: bool = False) -> pl.LazyFrame:
+    """
+    Plano lazy completo: scan → group_by → ordenação → arredondamento.
+    Com `variance`, variância e desvio padrão populacionais entram no mesmo
+    group_by (o streaming combina os estados parciais de cada lote).
+    """
+    lazy, column, scale = scan_measurements(path_to_csv)
+    temperature = pl.col(column)
+    aggregations = [
+        (temperature.min() / scale).alias("min"),
+        (temperature.mean() / scale).alias("mean"),
+        (temperature.max() / scale).alias("max"),
+    ]
+    if variance:
+        aggregations += [
+            (temperature.var(ddof=0) / scale**2).alias("variance"),
+            (temperature.std(ddof=0) / scale).alias("stddev"),
+        ]
+    return (
+        lazy.group_by("station")
+        .agg(aggregations)
+        # Parquet/Arrow chegam como Categorical: ordena pelo texto da estação
+        .with_columns(pl.col("station").cast(pl.String))
+        .sort("station")
+        .with_columns(pl.exclude("station").round(2))
+    )
+
+
+def read_and_aggregate_with_polars_lazy(
+    path_to_csv: Path, streaming: bool = False, variance: bool = False
+) -> pl.DataFrame:
     try:
-        print("📥 Lendo arquivo CSV com Polars (modo lazy)...")
-        df_lazy = (
-            pl.scan_csv(
-                path_to_csv,
-                separator=";",
-                has_header=False,
-                new_columns=["station", "temperature"],
-            )
-            .group_by("station")
-            .agg(
-                [
-                    pl.col("temperature").min().alias("min"),
-                    pl.col("temperature").mean().alias("mean"),
-                    pl.col("temperature").max().alias("max"),
-                ]
-            )
-            .sort("station")
-            .with_columns(
-                [
-                    pl.col("min").round(2),
-                    pl.col("mean").round(2),
-                    pl.col("max").round(2),
-                ]
-            )
+        print(f"📥 Lendo {path_to_csv} com Polars (modo lazy)...")
+        # Streaming processa o arquivo em lotes, com memória limitada
+        df = build_plan(path_to_csv, variance).collect(
+            engine="streaming" if streaming else "auto"
         )
-        df = df_lazy.collect()
         log_step("Read and aggregate (Polars lazy)", f"Success: {df.height} stations")
         print(f"✅ Aggregation complete: {df.height} stations")
         return df
@@ -68,6 +91,32 @@ def read_and_aggregate_with_polars_lazy(path_to_csv: Path) -> pl.DataFrame:
         raise
 
 
+# 🌊 Streaming ponta a ponta: o plano grava direto em CSV e Parquet
+def sink_results(
+    path_to_csv: Path, csv_path: Path, parquet_path: Path, variance: bool = False
+) -> None:
+    """
+    Executa o plano no engine de streaming e grava com sink_csv/sink_parquet,
+    sem materializar o resultado num DataFrame. Os dois sinks saem de um único
+    collect_all, então a entrada é lida uma vez só.
+    """
+    try:
+        print(f"📥 Lendo {path_to_csv} com Polars (streaming + sink)...")
+        plan = build_plan(path_to_csv, variance)
+        pl.collect_all(
+            [
+                plan.sink_csv(csv_path, separator=";", lazy=True),
+                plan.sink_parquet(parquet_path, lazy=True),
+            ],
+            engine="streaming",
+        )
+        log_step("Stream and sink (Polars lazy)", "Success")
+        print(f"✅ Results streamed to {csv_path} and {parquet_path}")
+    except Exception as e:
+        log_step("Stream and sink (Polars lazy)", f"Failed: {e}")
+        raise
+
+
 # 💾 Salva resultados
 def save_results(df: pl.DataFrame, csv_path: Path, parquet_path: Path) -> None:
     try:
@@ -77,6 +126,7 @@ def save_results(df: pl.DataFrame, csv_path: Path, parquet_path: Path) -> None:
     except Exception as e:
         log_step("Save results (CSV)", f"Failed: {e}")
         print(f"❌ Failed to save CSV: {e}")
+        raise
 
     try:
         df.write_parquet(parquet_path)
@@ -85,21 +135,74 @@ def save_results(df: pl.DataFrame, csv_path: Path, parquet_path: Path) -> None:
     except Exception as e:
         log_step("Save results (Parquet)", f"Failed: {e}")
         print(f"❌ Failed to save Parquet: {e}")
+        raise
 
 
 # 🔁 Pipeline principal
-def process_with_polars():
+def process_with_polars(
+    path_csv: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    streaming: bool = False,
+    sink: bool = False,
+    chunk_size: Optional[int] = None,
+    variance: bool = False,
+):
     print("🚀 Starting temperature processing with Polars (lazy)...")
     start = time.time()
-    df = read_and_aggregate_with_polars_lazy(PATH_CSV)
-    save_results(df, OUTPUT_CSV_PATH, OUTPUT_PARQUET_PATH)
+    if chunk_size is not None:
+        # Linhas por lote do engine de streaming (padrão: escolhido pelo Polars)
+        pl.Config.set_streaming_chunk_size(chunk_size)
+    if sink:
+        sink_results(path_csv, output_csv, output_parquet, variance)
+    else:
+        df = read_and_aggregate_with_polars_lazy(path_csv, streaming, variance)
+        save_results(df, output_csv, output_parquet)
     elapsed = time.time() - start
     print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
     log_step("⏱️  Total processing (Polars lazy)", f"Completed in {elapsed:.2f} seconds")
 
 
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_with_polars(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        # Com --memory-limit nada é materializado: streaming + sink direto nos arquivos
+        streaming=options.streaming
+        or options.sink
+        or options.budget.memory_limit is not None,
+        sink=options.sink or options.budget.memory_limit is not None,
+        chunk_size=options.chunk_size,
+        variance=options.variance,
+    )
+
+
 # ▶️ Execução
 if __name__ == "__main__":
+    parser = ArgumentParser(description="ETL com Polars lazy")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Executa o plano no engine de streaming (memória limitada)",
+    )
+    parser.add_argument(
+        "--sink",
+        action="store_true",
+        help="Grava CSV e Parquet com sink_csv/sink_parquet (implica --streaming)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, help="Linhas por lote do engine de streaming"
+    )
+    parser.add_argument(
+        "--variance",
+        action="store_true",
+        help="Inclui variância e desvio padrão por estação",
+    )
+    args = parser.parse_args()
+
     print(f"[DEBUG] BASE_DIR: {BASE_DIR}")
     print(f"[DEBUG] PATH_CSV: {PATH_CSV}")
     print(f"[DEBUG] LOG_PATH: {LOG_PATH}")
@@ -111,7 +214,12 @@ if __name__ == "__main__":
         log_step("File check", "Failed: File not found")
     else:
         try:
-            process_with_polars()
+            process_with_polars(
+                streaming=args.streaming or args.sink,
+                sink=args.sink,
+                chunk_size=args.chunk_size,
+                variance=args.variance,
+            )
         except Exception as e:
             print(f"❌ Processing failed: {e}")
             log_step("Process temperatures (Polars lazy)", f"Failed: {e}")
@@ -1,12 +1,21 @@
-from csv import reader, writer
-from collections import defaultdict
+from functools import partial
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, Tuple
+import os
 import time
-import datetime
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
 import pyarrow.parquet as pq
 
+from columnar import TEMPERATURE_COLUMN, input_format
+from engines import EngineOptions
+from progress import ByteProgress
+from shards import aggregate_shards, expand_inputs
+from station_accumulator import StationAccumulator
+from step_log import StepLogger
+
 # 📁 Caminhos principais
 BASE_DIR = Path(__file__).resolve().parent.parent
 PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"  # Caminho do CSV de entrada
@@ -17,6 +26,10 @@ OUTPUT_CSV_PATH = (
 OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(
     ".parquet"
 )  # Caminho do Parquet de saída
+FIXED_POINT = True  # Agrega temperaturas em décimos inteiros
+BLOCK_SIZE = 4 * 1024 * 1024  # Bytes por bloco do leitor CSV do Arrow
+BLOCK_OVERHEAD = 40  # Pico por bloco: o open_csv mantém ~40 blocos lidos à frente
+CSV_SCHEMA = {"station": pa.string(), "temperature": pa.float64()}
 
 # 🛠️ Garante que os diretórios existem
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -25,47 +38,107 @@ OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
 # 📝 Log incremental
 
 
-def log_step(step: str, status: str) -> None:
-    try:
-        with LOG_PATH.open("a", newline="") as log_file:
-            log_writer = writer(log_file)
-            timestamp = datetime.datetime.now().isoformat()
-            if status.lower().startswith("success") or status.lower().startswith(
-                "completed"
-            ):
-                status = "✅ " + status
-            log_writer.writerow([timestamp, step, status])
-    except Exception as e:
-        print(f"[LOG ERROR] Failed to write log: {e}")
+log_step = StepLogger(LOG_PATH)
 
 
-# 📥 Lê CSV e realiza agregação incremental
+# 📦 Lotes Arrow: CSV em streaming com schema explícito, Parquet/Arrow por row group
 
 
-def read_and_aggregate(path_to_csv: Path) -> Dict[str, Dict[str, float]]:
-    stats = defaultdict(
-        lambda: {"min": float("inf"), "max": float("-inf"), "sum": 0.0, "count": 0}
+def record_batches(
+    path: Path, file: pa.NativeFile, block_size: int
+) -> Iterator[pa.RecordBatch]:
+    file_format = input_format(path)
+    if file_format == "parquet":
+        return pq.ParquetFile(file).iter_batches(
+            columns=["station", TEMPERATURE_COLUMN]
+        )
+    if file_format == "arrow":
+        reader = ipc.open_file(file)
+        return (reader.get_batch(i) for i in range(reader.num_record_batches))
+    # O gerador não escreve cabeçalho nem aspas; linhas malformadas são puladas
+    return pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(
+            column_names=["station", "temperature"], block_size=block_size
+        ),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=";", quote_char=False, invalid_row_handler=lambda row: "skip"
+        ),
+        convert_options=pa_csv.ConvertOptions(column_types=CSV_SCHEMA),
     )
+
+
+# 📥 Agrega cada lote com group_by (C++, multithread) e acumula os parciais
+
+
+def aggregate_file(
+    path: Path,
+    fixed_point: bool = FIXED_POINT,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+) -> Tuple[StationAccumulator, int]:
+    stats = StationAccumulator(fixed_point=fixed_point, variance=variance)
+    aggregations = [("t", "sum"), ("t", "count"), ("t", "min"), ("t", "max")]
+    if variance:
+        # Variância populacional do lote; vezes a contagem vira o M2 do lote
+        aggregations.append(("t", "variance", pc.VarianceOptions(ddof=0)))
     row_count = 0
+    with pa.OSFile(str(path)) as file, ByteProgress(path) as progress:
+        for batch in record_batches(path, file, block_size):
+            row_count += batch.num_rows
+            if "temperature" in batch.schema.names:
+                temperature = batch.column("temperature")
+                if fixed_point:
+                    # Décimos inteiros: soma exata, igual às engines em Python
+                    temperature = pc.round(pc.multiply(temperature, 10))
+                    temperature = temperature.cast(pa.int64())
+            else:
+                temperature = batch.column(TEMPERATURE_COLUMN).cast(pa.int64())
+                if not fixed_point:
+                    temperature = pc.divide(temperature.cast(pa.float64()), 10)
+            partial = (
+                pa.table({"station": batch.column("station"), "t": temperature})
+                .group_by("station")
+                .aggregate(aggregations)
+            )
+            m2s = None
+            if variance:
+                m2s = pc.multiply(
+                    partial.column("t_variance"), partial.column("t_count")
+                ).to_pylist()
+            stats.merge_arrays(
+                partial.column("station").to_pylist(),
+                partial.column("t_sum").to_pylist(),
+                partial.column("t_count").to_pylist(),
+                partial.column("t_min").to_pylist(),
+                partial.column("t_max").to_pylist(),
+                m2s,
+            )
+            progress.set_position(file.tell(), row_count)
+    return stats, row_count
+
+
+# 📥 Agrega o CSV (ou os shards, um por processo)
+
+
+def read_and_aggregate(
+    path_to_csv: Path,
+    fixed_point: bool = FIXED_POINT,
+    workers: int = os.cpu_count() or 1,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+) -> StationAccumulator:
     try:
-        with path_to_csv.open("r", encoding="utf-8") as file:
-            csv_reader = reader(file, delimiter=";")
-            for row in csv_reader:
-                row_count += 1
-                if row_count % 50_000_000 == 0:
-                    print(f"[DEBUG] Processed {row_count:,} lines...")
-                if len(row) != 2:
-                    continue
-                try:
-                    station = row[0]
-                    temp = float(row[1])
-                    s = stats[station]
-                    s["min"] = min(s["min"], temp)
-                    s["max"] = max(s["max"], temp)
-                    s["sum"] += temp
-                    s["count"] += 1
-                except ValueError:
-                    continue
+        stats, row_count = aggregate_shards(
+            expand_inputs(path_to_csv),
+            partial(
+                aggregate_file,
+                fixed_point=fixed_point,
+                block_size=block_size,
+                variance=variance,
+            ),
+            workers,
+        )
         log_step(
             "Read and aggregate",
             f"Success: {len(stats)} stations from {row_count} lines",
@@ -80,16 +153,13 @@ def read_and_aggregate(path_to_csv: Path) -> Dict[str, Dict[str, float]]:
 # 🎯 Formata os dados (duas casas decimais e ordenação alfabética)
 
 
-def format_results(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, str]]:
+def format_results(stats: StationAccumulator) -> Dict[str, Dict[str, str]]:
     formatted = {}
-    for station, values in stats.items():
-        mean = values["sum"] / values["count"] if values["count"] else 0
+    columns = stats.columns()[1:]
+    for station, *values in stats.rows():
         formatted[station] = {
-            "min": f"{values['min']:.2f}",
-            "mean": f"{mean:.2f}",
-            "max": f"{values['max']:.2f}",
+            column: f"{value:.2f}" for column, value in zip(columns, values)
         }
-    formatted = dict(sorted(formatted.items()))
     log_step("Format results", f"Success: {len(formatted)} stations")
     print(f"✅ Results formatted: {len(formatted)} stations.")
     return formatted
@@ -101,14 +171,17 @@ def format_results(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, st
 def save_results_to_csv(results: Dict[str, Dict[str, str]], path: Path) -> None:
     try:
         with path.open("w", encoding="utf-8") as f:
-            f.write("station;min;mean;max\n")
+            # Colunas da primeira estação: min/mean/max (+ variance/stddev)
+            columns = list(next(iter(results.values()), {})) or ["min", "mean", "max"]
+            f.write(";".join(["station", *columns]) + "\n")
             for station, data in results.items():
-                f.write(f"{station};{data['min']};{data['mean']};{data['max']}\n")
+                f.write(";".join([station, *data.values()]) + "\n")
         log_step("Save results (CSV)", "Success")
         print(f"✅ Results saved to {path}")
     except Exception as e:
         log_step("Save results (CSV)", f"Failed: {e}")
         print(f"❌ Failed to save CSV: {e}")
+        raise
 
 
 # 📦 Salva em Parquet com pyarrow
@@ -116,12 +189,11 @@ def save_results_to_csv(results: Dict[str, Dict[str, str]], path: Path) -> None:
 
 def save_results_to_parquet(results: Dict[str, Dict[str, str]], path: Path) -> None:
     try:
+        columns = list(next(iter(results.values()), {})) or ["min", "mean", "max"]
         table = pa.table(
             {
                 "station": list(results.keys()),
-                "min": [v["min"] for v in results.values()],
-                "mean": [v["mean"] for v in results.values()],
-                "max": [v["max"] for v in results.values()],
+                **{c: [v[c] for v in results.values()] for c in columns},
             }
         )
         pq.write_table(table, path)
@@ -130,23 +202,46 @@ def save_results_to_parquet(results: Dict[str, Dict[str, str]], path: Path) -> N
     except Exception as e:
         log_step("Save results (Parquet)", f"Failed: {e}")
         print(f"❌ Failed to save Parquet: {e}")
+        raise
 
 
 # 🔁 Pipeline principal
 
 
-def process_temperatures():
-    print("🚀 Starting temperature processing from CSV file...")
+def process_temperatures(
+    path_csv: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    workers: int = os.cpu_count() or 1,
+    block_size: int = BLOCK_SIZE,
+    variance: bool = False,
+):
+    print("🚀 Starting temperature processing with PyArrow record batches...")
     start = time.time()
-    stats = read_and_aggregate(PATH_CSV)
+    stats = read_and_aggregate(
+        path_csv, workers=workers, block_size=block_size, variance=variance
+    )
     formatted = format_results(stats)
-    save_results_to_csv(formatted, OUTPUT_CSV_PATH)
-    save_results_to_parquet(formatted, OUTPUT_PARQUET_PATH)
+    save_results_to_csv(formatted, output_csv)
+    save_results_to_parquet(formatted, output_parquet)
     elapsed = time.time() - start
     print(f"⏱️  Total processing completed in {elapsed:.2f} seconds.")
     log_step("⏱️  Total processing", f"Completed in {elapsed:.2f} seconds")
 
 
+# 🧩 Entrada usada pelo runner (cli.py)
+def run(options: EngineOptions) -> None:
+    log_step.path = options.log_dir / LOG_PATH.name
+    process_temperatures(
+        options.input_path,
+        options.output_dir / OUTPUT_CSV_PATH.name,
+        options.output_dir / OUTPUT_PARQUET_PATH.name,
+        options.budget.threads,
+        options.budget.block_bytes(BLOCK_SIZE, BLOCK_OVERHEAD, options.budget.threads),
+        options.variance,
+    )
+
+
 # ▶️ Execução
 if __name__ == "__main__":
     print(f"[DEBUG] BASE_DIR: {BASE_DIR}")
@@ -0,0 +1,69 @@
+# src/fingerprint.py
+
+from dataclasses import asdict, dataclass
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, Optional
+
+FINGERPRINT_BYTES = 64 * 1024  # Bytes do início e do fim do prefixo que entram no hash
+SAMPLE_BLOCKS = 16  # Blocos espaçados por todo o arquivo em sampled_digest
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """
+    Identifica os primeiros `size` bytes de um arquivo: tamanho + hash do começo
+    e do fim desse prefixo. Barato mesmo para arquivos de dezenas de GiB e
+    suficiente para distinguir "o arquivo só cresceu" de "o arquivo foi trocado".
+    """
+
+    size: int
+    head: str
+    tail: str
+
+    def matches(self, path: Path) -> bool:
+        """True se o arquivo ainda começa com os mesmos `size` bytes."""
+        try:
+            if path.stat().st_size < self.size:
+                return False
+            return fingerprint(path, self.size) == self
+        except OSError:
+            return False
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FileFingerprint":
+        return cls(**data)
+
+
+def _digest(data: bytes) -> str:
+    return blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint(path: Path, size: Optional[int] = None) -> FileFingerprint:
+    """Fingerprint dos primeiros `size` bytes do arquivo (padrão: o arquivo inteiro)."""
+    size = path.stat().st_size if size is None else size
+    with path.open("rb") as file:
+        head = file.read(min(size, FINGERPRINT_BYTES))
+        file.seek(max(0, size - FINGERPRINT_BYTES))
+        tail = file.read(size - max(0, size - FINGERPRINT_BYTES))
+    return FileFingerprint(size=size, head=_digest(head), tail=_digest(tail))
+
+
+def sampled_digest(path: Path) -> str:
+    """
+    Hash rápido do arquivo inteiro para chaves de cache: tamanho, mtime e
+    SAMPLE_BLOCKS blocos de FINGERPRINT_BYTES espaçados do início ao fim.
+    Lê no máximo ~1 MiB, qualquer que seja o tamanho do arquivo.
+    """
+    stat = path.stat()
+    digest = blake2b(digest_size=16)
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    last = max(0, stat.st_size - FINGERPRINT_BYTES)
+    with path.open("rb") as file:
+        for i in range(SAMPLE_BLOCKS):
+            file.seek(last * i // (SAMPLE_BLOCKS - 1))
+            digest.update(file.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
@@ -0,0 +1,35 @@
+# src/fixed_point.py
+
+from typing import Dict
+import math
+import warnings
+
+# Todas as temperaturas que o create_measurements.py gera (-99.9 a 99.9, uma casa
+# decimal), já convertidas para décimos inteiros. O f"{x:.1f}" do gerador também
+# pode produzir "-0.0".
+TENTHS: Dict[bytes, int] = {f"{n / 10:.1f}".encode(): n for n in range(-999, 1000)}
+TENTHS[b"-0.0"] = 0
+
+
+def parse_tenths(raw: bytes) -> int:
+    """
+    Converte a temperatura em bytes para décimos inteiros (b"-12.3" -> -123).
+    Valores fora do formato do gerador caem no parsing genérico com float; se
+    tiverem mais de uma casa decimal, são arredondados para décimos com um
+    aviso (o modo de ponto fixo não os representa). Lança ValueError se não
+    for um número finito (b"abc", b"inf", b"1e400").
+    """
+    value = TENTHS.get(raw)
+    if value is not None:
+        return value
+    scaled = float(raw) * 10
+    if not math.isfinite(scaled):
+        raise ValueError(f"Non-finite temperature {raw!r}")
+    value = round(scaled)
+    if abs(scaled - value) > 1e-9 * max(1.0, abs(scaled)):
+        warnings.warn(
+            f"Temperature {raw!r} has more than one decimal place; "
+            f"rounded to {value / 10:.1f} in fixed-point mode",
+            stacklevel=2,
+        )
+    return value
@@ -0,0 +1,93 @@
+# src/incremental.py
+
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+import json
+
+from byte_ranges import complete_lines_end
+from fingerprint import FileFingerprint, fingerprint
+from station_accumulator import StationAccumulator
+
+STATE_VERSION = 1  # Incrementar quando o formato do estado mudar
+
+
+def load_state(
+    state_path: Path, input_path: Path, variance: bool = False
+) -> Tuple[Optional[StationAccumulator], int]:
+    """
+    Carrega os agregados salvos e o watermark (offset já agregado da entrada).
+    Se não houver estado, ou se a entrada não começar mais com os bytes que
+    geraram o estado (arquivo trocado, truncado ou reescrito), devolve (None, 0)
+    e a execução recalcula tudo desde o byte 0. O mesmo vale para um estado
+    salvo com outro valor de `variance` (sem o M2 não há como retomar).
+    """
+    if not state_path.exists():
+        return None, 0
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        if state.get("version") != STATE_VERSION:
+            print(f"⚠️  State {state_path} has an old format; recomputing from scratch.")
+            return None, 0
+        source = FileFingerprint.from_dict(state["fingerprint"])
+        if not source.matches(input_path):
+            print(f"⚠️  {input_path} is not an append of the saved state; recomputing.")
+            return None, 0
+        stats = StationAccumulator.from_state(state["stats"])
+        if stats.variance != variance:
+            print(f"⚠️  State {state_path} has another --variance setting; recomputing.")
+            return None, 0
+        return stats, source.size
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️  Could not read state {state_path} ({e}); recomputing.")
+        return None, 0
+
+
+def save_state(
+    state_path: Path, input_path: Path, stats: StationAccumulator, watermark: int
+) -> None:
+    """Grava agregados + watermark + fingerprint dos bytes [0, watermark) da entrada."""
+    state = {
+        "version": STATE_VERSION,
+        "input": str(input_path),
+        "watermark": watermark,
+        "fingerprint": fingerprint(input_path, watermark).to_dict(),
+        "stats": stats.to_state(),
+    }
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    # Grava num temporário e troca: uma execução interrompida não corrompe o estado
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    tmp_path.replace(state_path)
+
+
+def aggregate_appended(
+    input_path: Path,
+    state_path: Path,
+    aggregate: Callable[[int, int], StationAccumulator],
+    log_step: Optional[Callable[[str, str], None]] = None,
+    variance: bool = False,
+) -> StationAccumulator:
+    """
+    Agrega só o que foi anexado desde a última execução: chama
+    `aggregate(início, fim)` para os bytes [watermark, fim), soma o resultado ao
+    estado salvo e avança o watermark. `fim` para na última quebra de linha, então
+    uma linha ainda sendo gravada fica para a próxima execução.
+    """
+    stats, watermark = load_state(state_path, input_path, variance)
+    end = complete_lines_end(input_path)
+    print(
+        f"📌 Incremental: {end - watermark:,} new bytes "
+        f"(watermark {watermark:,} → {end:,})"
+    )
+    appended = aggregate(watermark, end)
+    if stats is None:
+        stats = appended
+    else:
+        stats.merge(appended)
+    save_state(state_path, input_path, stats, end)
+    if log_step is not None:
+        log_step(
+            "Incremental state",
+            f"Success: {end - watermark} new bytes, watermark {end}, saved to {state_path}",
+        )
+    return stats
@@ -0,0 +1,54 @@
+# src/progress.py
+
+from pathlib import Path
+import os
+import time
+from tqdm import tqdm
+
+PROGRESS_EVERY_ROWS = 1_000_000  # Frequência de atualização nos loops por linha
+
+
+class ByteProgress:
+    """
+    Barra de progresso baseada em bytes consumidos do arquivo de entrada.
+    Usa os.path.getsize como total, então dispensa a passada extra para contar
+    linhas; o tqdm cuida do ETA e o postfix mostra a estimativa de linhas/s.
+    """
+
+    disabled = False  # Ligado nos processos worker, que não desenham barras
+
+    def __init__(self, path: Path, desc: str = "📥 Lendo", total: int = None):
+        self.total = os.path.getsize(path) if total is None else total
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.bar = tqdm(
+            total=self.total,
+            desc=desc,
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            disable=self.disabled,
+        )
+
+    def update(self, n_bytes: int, n_rows: int = 0) -> None:
+        """Avança a barra em n_bytes, somando n_rows linhas processadas."""
+        self.rows += n_rows
+        elapsed = time.perf_counter() - self.start
+        if elapsed > 0:
+            self.bar.set_postfix_str(
+                f"{self.rows / elapsed:,.0f} rows/s", refresh=False
+            )
+        self.bar.update(n_bytes)
+
+    def set_position(self, position: int, rows: int) -> None:
+        """Move a barra para o byte `position`, com `rows` linhas lidas até ali."""
+        self.update(position - self.bar.n, rows - self.rows)
+
+    def close(self) -> None:
+        self.bar.close()
+
+    def __enter__(self) -> "ByteProgress":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
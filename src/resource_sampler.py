@@ -0,0 +1,160 @@
+# src/resource_sampler.py
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+import os
+import resource
+import threading
+import time
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MIB = 1024 * 1024
+SAMPLE_INTERVAL = 0.05  # Segundos entre amostras da thread de fundo
+
+
+def current_rss() -> Optional[int]:
+    """RSS atual do processo em bytes (Linux, via /proc); None se indisponível."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss() -> int:
+    """Pico histórico de RSS do processo em bytes (ru_maxrss vem em KiB no Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bytes_read() -> Optional[int]:
+    """Bytes lidos pelo processo via read() (rchar de /proc/self/io, inclui page cache)."""
+    try:
+        with open("/proc/self/io", "rb") as io_stats:
+            for line in io_stats:
+                if line.startswith(b"rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+@dataclass
+class StageReport:
+    """Consumo de recursos de uma etapa do pipeline."""
+
+    stage: str
+    wall_s: float
+    cpu_s: float
+    rss_start_mib: float
+    rss_peak_mib: float
+    rss_end_mib: float
+    read_mib: float
+
+    @property
+    def cpu_percent(self) -> float:
+        # Pode passar de 100% quando a biblioteca usa várias threads
+        return 100 * self.cpu_s / self.wall_s if self.wall_s else 0.0
+
+    @property
+    def read_mib_per_s(self) -> float:
+        return self.read_mib / self.wall_s if self.wall_s else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"peak RSS {self.rss_peak_mib:.1f} MiB "
+            f"(start {self.rss_start_mib:.1f}, end {self.rss_end_mib:.1f}) | "
+            f"CPU {self.cpu_percent:.0f}% | "
+            f"read {self.read_mib:.1f} MiB ({self.read_mib_per_s:.1f} MiB/s) | "
+            f"{self.wall_s:.2f} s"
+        )
+
+
+class ResourceSampler:
+    """
+    Mede RSS, CPU e bytes lidos por etapa. Durante cada `stage` uma thread de
+    fundo amostra o RSS para capturar o pico; o ru_maxrss do processo cobre os
+    picos que acontecem entre amostras (ex.: C segurando o GIL). Mede apenas o
+    processo atual, não workers de multiprocessing.
+    """
+
+    def __init__(
+        self,
+        log_step: Optional[Callable[[str, str], None]] = None,
+        interval: float = SAMPLE_INTERVAL,
+    ):
+        self.log_step = log_step
+        self.interval = interval
+        self.reports: List[StageReport] = []
+        self._peak = 0
+        self._lock = threading.Lock()
+
+    def _sample(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None:
+                with self._lock:
+                    self._peak = max(self._peak, rss)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        rss_start = current_rss() or 0
+        max_start = peak_rss()
+        read_start = bytes_read()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        with self._lock:
+            self._peak = rss_start
+
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(stop,), daemon=True)
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_end = current_rss() or 0
+            read_end = bytes_read()
+
+            peak = max(self._peak, rss_end)
+            max_end = peak_rss()
+            if max_end > max_start:
+                # Novo pico histórico do processo aconteceu nesta etapa
+                peak = max(peak, max_end)
+
+            read = (
+                read_end - read_start
+                if read_start is not None and read_end is not None
+                else 0
+            )
+            report = StageReport(
+                stage=name,
+                wall_s=wall,
+                cpu_s=cpu,
+                rss_start_mib=rss_start / MIB,
+                rss_peak_mib=peak / MIB,
+                rss_end_mib=rss_end / MIB,
+                read_mib=read / MIB,
+            )
+            self.reports.append(report)
+            if self.log_step is not None:
+                self.log_step(f"Resources: {name}", report.summary())
+
+    def print_report(self) -> None:
+        """Imprime a tabela de consumo por etapa."""
+        if not self.reports:
+            return
+        print("📈 Resource usage per stage:")
+        print(
+            f"   {'stage':<20}{'wall s':>9}{'CPU %':>8}{'peak MiB':>11}"
+            f"{'end MiB':>10}{'read MiB':>10}{'MiB/s':>9}"
+        )
+        for r in self.reports:
+            print(
+                f"   {r.stage:<20}{r.wall_s:>9.2f}{r.cpu_percent:>8.0f}"
+                f"{r.rss_peak_mib:>11.1f}{r.rss_end_mib:>10.1f}"
+                f"{r.read_mib:>10.1f}{r.read_mib_per_s:>9.1f}"
+            )
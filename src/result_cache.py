@@ -0,0 +1,182 @@
+# src/result_cache.py
+
+from hashlib import blake2b
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import ast
+import json
+import shutil
+import time
+
+from fingerprint import sampled_digest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = BASE_DIR / "data" / "cache"
+CACHE_MAX_BYTES = 1024**3  # Acima disso as entradas menos usadas são removidas
+# Schema da tabela de resultados (estação + min/média/máx em °C); mudar a
+# versão invalida todas as entradas gravadas com o schema anterior
+RESULT_SCHEMA = "station:string,min:float,mean:float,max:float/v1"
+VARIANCE_RESULT_SCHEMA = (
+    "station:string,min:float,mean:float,max:float,variance:float,stddev:float/v1"
+)
+METADATA_NAME = "entry.json"
+
+
+def cache_key(
+    inputs: Sequence[Path], producer: str, schema: str = RESULT_SCHEMA
+) -> str:
+    """
+    Chave de cache: fingerprint amostrado de cada arquivo de entrada + quem
+    produziu o resultado (engine, com o hash do código dela) + schema.
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(f"{producer}|{schema}".encode())
+    for path in inputs:
+        digest.update(f"|{path.resolve()}:{sampled_digest(path)}".encode())
+    return digest.hexdigest()
+
+
+def local_modules(module_file: Path) -> List[Path]:
+    """
+    O módulo e os módulos de src/ que ele importa, direta ou indiretamente
+    (inclusive imports tardios dentro de funções). Lê o código com ast, sem
+    importar nada.
+    """
+    seen = set()
+    pending = [module_file.resolve()]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = path.parent / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    pending.append(candidate)
+    return sorted(seen)
+
+
+def source_digest(module_file: Path) -> str:
+    """
+    Hash do código de uma engine e dos módulos auxiliares que ela usa
+    (acumulador, variância, leitura em blocos...): editar qualquer um deles
+    invalida o cache da engine.
+    """
+    digest = blake2b(digest_size=8)
+    for path in local_modules(module_file):
+        digest.update(path.name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache em disco dos resultados por estação: cada entrada é um diretório com
+    os arquivos de saída (CSV + Parquet) gravados uma vez e restaurados por cópia.
+    O uso mais recente fica no mtime de entry.json; quando o total passa de
+    `max_bytes`, as entradas menos usadas recentemente saem primeiro.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def restore(self, key: str, output_dir: Path) -> Optional[List[Path]]:
+        """Copia os arquivos da entrada `key` para output_dir; None se não houver."""
+        entry = self.directory / key
+        metadata_path = entry / METADATA_NAME
+        try:
+            metadata = json.loads(metadata_path.read_text(encoding="utf-8"))
+            restored = []
+            output_dir.mkdir(parents=True, exist_ok=True)
+            for name in metadata["files"]:
+                restored.append(Path(shutil.copy2(entry / name, output_dir / name)))
+        except (OSError, ValueError, KeyError):
+            return None
+        metadata_path.touch()  # Marca o uso para a remoção por LRU
+        return restored
+
+    def store(self, key: str, files: List[Path], metadata: Dict = None) -> None:
+        """Grava os arquivos numa entrada nova (via temporário) e aplica o teto."""
+        if not files:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_entry = self.directory / f".{key}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir()
+        for path in files:
+            shutil.copy2(path, tmp_entry / path.name)
+        entry_metadata = {
+            **(metadata or {}),
+            "files": [path.name for path in files],
+            "created": time.time(),
+        }
+        (tmp_entry / METADATA_NAME).write_text(
+            json.dumps(entry_metadata, indent=2), encoding="utf-8"
+        )
+        entry = self.directory / key
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+        self.evict()
+
+    def entries(self) -> List[Path]:
+        """Entradas válidas, da menos para a mais recentemente usada."""
+        if not self.directory.exists():
+            return []
+        entries = [
+            entry
+            for entry in self.directory.iterdir()
+            if (entry / METADATA_NAME).exists()
+        ]
+        return sorted(
+            entries, key=lambda entry: (entry / METADATA_NAME).stat().st_mtime
+        )
+
+    def evict(self) -> None:
+        """Remove as entradas menos usadas até o total caber em max_bytes."""
+        entries = self.entries()
+        sizes = {
+            entry: sum(f.stat().st_size for f in entry.iterdir()) for entry in entries
+        }
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+            print(f"🧹 Evicted cached result {entry.name} ({sizes[entry]:,} bytes)")
+
+
+def cached_call(
+    producer: str,
+    inputs: Sequence[Path],
+    outputs: Sequence[Path],
+    compute: Callable[[], None],
+    schema: str = RESULT_SCHEMA,
+    cache: Optional[ResultCache] = None,
+) -> bool:
+    """
+    Roda `compute()` (que grava `outputs`) só se não houver resultado em cache
+    para as mesmas entradas, producer e schema; devolve True num acerto. Só os
+    arquivos de `outputs` entram no cache, não o que mais houver no diretório.
+    """
+    cache = cache or ResultCache()
+    key = cache_key(inputs, producer, schema)
+    restored = cache.restore(key, outputs[0].parent)
+    if restored:
+        names = ", ".join(path.name for path in restored)
+        print(f"♻️  Input unchanged: restored {names} from cache.")
+        return True
+    compute()
+    cache.store(
+        key,
+        list(outputs),
+        {"producer": producer, "inputs": [str(path) for path in inputs]},
+    )
+    return False
@@ -0,0 +1,269 @@
+# src/sample_preview.py
+
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import NormalDist
+from typing import Iterator, List, Optional, Tuple
+import math
+import mmap
+import random
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from byte_ranges import split_byte_ranges
+from etl_python_numpy import aggregate_block
+from shards import expand_inputs
+from station_accumulator import StationAccumulator
+from station_dictionary import load_station_dictionary
+from step_log import StepLogger
+
+# 📁 Caminhos principais
+BASE_DIR = Path(__file__).resolve().parent.parent
+PATH_CSV = BASE_DIR / "data" / "weather_stations.csv"
+LOG_PATH = BASE_DIR / "logs" / "log_sample_preview.csv"
+OUTPUT_CSV_PATH = BASE_DIR / "data" / "measurements_sample.csv"
+OUTPUT_PARQUET_PATH = OUTPUT_CSV_PATH.with_suffix(".parquet")
+BLOCK_SIZE = 1024 * 1024  # Bytes por bloco amostrado (~65 mil linhas)
+STRATA = 32  # Faixas contíguas da entrada; cada rodada lê um bloco de cada faixa
+ERROR_BOUND = 0.5  # Meia-largura máxima do intervalo da média (°C)
+TIME_BUDGET = 30.0  # Segundos de leitura antes de parar com o que houver
+CONFIDENCE = 0.95
+MIN_STATION_ROWS = 30  # Abaixo disso o intervalo normal da média não vale
+
+# 🛠️ Garante que os diretórios existem
+LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+OUTPUT_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+Slot = Tuple[Path, int, int]  # (arquivo, início, fim) alinhados em quebras de linha
+Estimate = Tuple[str, int, float, float, float, float]
+
+
+# 📝 Log incremental
+log_step = StepLogger(LOG_PATH)
+
+
+# 🧱 Divide a entrada em blocos alinhados que cobrem todos os bytes
+def sample_slots(paths: List[Path], block_size: int = BLOCK_SIZE) -> List[Slot]:
+    """
+    Blocos de ~block_size bytes que começam e terminam em fim de linha e, juntos,
+    cobrem a entrada inteira: amostrar sem reposição entre eles nunca lê uma
+    linha duas vezes, e ler todos dá o resultado exato.
+    """
+    slots = []
+    for path in paths:
+        parts = max(1, -(-path.stat().st_size // block_size))
+        slots += [(path, start, end) for start, end in split_byte_ranges(path, parts)]
+    return slots
+
+
+# 🎲 Ordem estratificada: a cada rodada, um bloco sorteado de cada faixa
+def stratified_rounds(
+    n_slots: int, strata: int, rng: random.Random
+) -> Iterator[List[int]]:
+    """
+    Agrupa os blocos em `strata` faixas contíguas e sorteia a ordem dentro de
+    cada uma; cada rodada devolve um bloco ainda não lido de cada faixa. Assim a
+    amostra cobre o arquivo todo desde a primeira rodada (início, meio e fim),
+    mesmo que a entrada tenha sido gravada em ordem.
+    """
+    strata = max(1, min(strata, n_slots))
+    bounds = [n_slots * k // strata for k in range(strata + 1)]
+    pending = []
+    for begin, end in zip(bounds, bounds[1:]):
+        stratum = list(range(begin, end))
+        rng.shuffle(stratum)
+        pending.append(stratum)
+    while any(pending):
+        yield [stratum.pop() for stratum in pending if stratum]
+
+
+# 📏 Estimativas por estação com intervalo de confiança da média
+def estimates(
+    stats: StationAccumulator, confidence: float, fraction: float
+) -> List[Estimate]:
+    """
+    (estação, linhas, mínimo, média, máximo, meia-largura do IC da média) em °C.
+    O IC é normal, com a variância amostral e a correção de população finita
+    (1 − fração lida): zera quando a entrada foi lida inteira. Mínimo e máximo
+    são os observados na amostra, então só podem crescer em módulo.
+    Estações com menos de MIN_STATION_ROWS leituras ficam com meia-largura inf.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    correction = math.sqrt(max(0.0, 1 - fraction))
+    rows = []
+    for station, t_sum, count, t_min, t_max, m2 in stats.records():
+        half_width = math.inf
+        if count >= MIN_STATION_ROWS:
+            half_width = z * math.sqrt(m2 / (count - 1) / count) * correction
+        rows.append((station, count, t_min, t_sum / count, t_max, half_width))
+    return sorted(rows)
+
+
+# 🔎 Lê blocos sorteados até atingir o erro pedido ou estourar o tempo
+def sample_preview(
+    input_path: Path = PATH_CSV,
+    error_bound: float = ERROR_BOUND,
+    time_budget: float = TIME_BUDGET,
+    confidence: float = CONFIDENCE,
+    block_size: int = BLOCK_SIZE,
+    strata: int = STRATA,
+    seed: Optional[int] = None,
+) -> Tuple[List[Estimate], str]:
+    """
+    Agregação aproximada e progressiva: a cada rodada agrega mais um bloco de
+    cada faixa (NumPy, com M2 para a variância) e recalcula os intervalos.
+    Para quando toda estação vista tem IC da média com meia-largura ≤
+    `error_bound`, quando `time_budget` segundos se passaram ou quando a
+    entrada acabou. Devolve as estimativas e o motivo da parada.
+    """
+    paths = expand_inputs(input_path)
+    slots = sample_slots(paths, block_size)
+    total_bytes = sum(end - start for _, start, end in slots)
+    dictionary = load_station_dictionary()
+    stats = (
+        StationAccumulator(fixed_point=True, variance=True)
+        if dictionary is None
+        else dictionary.accumulator(variance=True)
+    )
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    read_bytes = read_rows = read_blocks = 0
+    rows, reason = [], "input is empty"
+
+    files = {path: path.open("rb") for path in paths}
+    maps = {
+        path: mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        for path, file in files.items()
+        if path.stat().st_size
+    }
+    try:
+        for batch in stratified_rounds(len(slots), strata, rng):
+            for index in batch:
+                path, begin, end = slots[index]
+                read_rows += aggregate_block(maps[path][begin:end], stats, dictionary)
+                read_bytes += end - begin
+            read_blocks += len(batch)
+
+            fraction = read_bytes / total_bytes
+            rows = estimates(stats, confidence, fraction)
+            widest = max((row[5] for row in rows), default=math.inf)
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"🔎 {read_blocks:,}/{len(slots):,} blocks ({fraction:.1%}), "
+                f"{read_rows:,} rows, {len(rows):,} stations, "
+                f"widest ±{widest:.2f} °C, {elapsed:.1f}s"
+            )
+            if read_blocks == len(slots):
+                reason = "full input read (exact)"
+                break
+            if widest <= error_bound:
+                reason = f"error bound ±{error_bound} °C met"
+                break
+            if elapsed >= time_budget:
+                reason = f"time budget {time_budget}s reached"
+                break
+    finally:
+        for mm in maps.values():
+            mm.close()
+        for file in files.values():
+            file.close()
+    return rows, reason
+
+
+# 💾 Salva as estimativas em CSV e Parquet
+def save_estimates(rows: List[Estimate], csv_path: Path, parquet_path: Path) -> None:
+    """Colunas: estação, linhas lidas, min/mean/max e o IC [mean_low, mean_high]."""
+    try:
+        with csv_path.open("w", encoding="utf-8") as f:
+            f.write("station;count;min;mean;max;mean_low;mean_high\n")
+            for station, count, t_min, t_mean, t_max, half in rows:
+                f.write(
+                    f"{station};{count};{t_min:.2f};{t_mean:.2f};{t_max:.2f};"
+                    f"{t_mean - half:.2f};{t_mean + half:.2f}\n"
+                )
+        log_step("Save estimates (CSV)", "Success")
+        print(f"✅ Estimates saved to {csv_path}")
+    except Exception as e:
+        log_step("Save estimates (CSV)", f"Failed: {e}")
+        print(f"❌ Failed to save CSV: {e}")
+        raise
+
+    try:
+        table = pa.table(
+            {
+                "station": pa.array([r[0] for r in rows], pa.string()),
+                "count": pa.array([r[1] for r in rows], pa.int64()),
+                "min": [round(r[2], 2) for r in rows],
+                "mean": [round(r[3], 2) for r in rows],
+                "max": [round(r[4], 2) for r in rows],
+                "mean_low": [round(r[3] - r[5], 2) for r in rows],
+                "mean_high": [round(r[3] + r[5], 2) for r in rows],
+            }
+        )
+        pq.write_table(table, parquet_path)
+        log_step("Save estimates (Parquet)", "Success")
+        print(f"✅ Estimates saved to {parquet_path}")
+    except Exception as e:
+        log_step("Save estimates (Parquet)", f"Failed: {e}")
+        print(f"❌ Failed to save Parquet: {e}")
+        raise
+
+
+# 🔁 Pipeline principal
+def run_preview(
+    input_path: Path = PATH_CSV,
+    output_csv: Path = OUTPUT_CSV_PATH,
+    output_parquet: Path = OUTPUT_PARQUET_PATH,
+    error_bound: float = ERROR_BOUND,
+    time_budget: float = TIME_BUDGET,
+    confidence: float = CONFIDENCE,
+    block_size: int = BLOCK_SIZE,
+    seed: Optional[int] = None,
+) -> None:
+    print(f"🚀 Sampling {input_path} (±{error_bound} °C, {confidence:.0%} CI)...")
+    start = time.time()
+    try:
+        rows, reason = sample_preview(
+            input_path, error_bound, time_budget, confidence, block_size, seed=seed
+        )
+        log_step("Sample preview", f"Success: {len(rows)} stations, {reason}")
+        print(f"✅ Stopped: {reason}.")
+    except Exception as e:
+        log_step("Sample preview", f"Failed: {e}")
+        raise
+    save_estimates(rows, output_csv, output_parquet)
+    elapsed = time.time() - start
+    print(f"⏱️  Preview completed in {elapsed:.2f} seconds.")
+    log_step("⏱️  Total preview", f"Completed in {elapsed:.2f} seconds")
+
+
+# ▶️ Execução
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Prévia aproximada por blocos amostrados")
+    parser.add_argument(
+        "--error",
+        type=float,
+        default=ERROR_BOUND,
+        help="Meia-largura máxima do IC da média, em °C (padrão: %(default)s)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=TIME_BUDGET,
+        help="Segundos de leitura antes de parar (padrão: %(default)s)",
+    )
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--seed", type=int, help="Semente do sorteio dos blocos")
+    args = parser.parse_args()
+
+    if not PATH_CSV.exists():
+        print(f"❌ File {PATH_CSV} not found.")
+        log_step("File check", "Failed: File not found")
+    else:
+        run_preview(
+            error_bound=args.error,
+            time_budget=args.time_budget,
+            confidence=args.confidence,
+            seed=args.seed,
+        )
@@ -0,0 +1,104 @@
+# src/shards.py
+
+from functools import partial
+from glob import glob, has_magic
+from multiprocessing import Pool
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, Tuple
+
+from columnar import FORMATS_BY_SUFFIX, input_format
+from progress import ByteProgress
+from tracing import adopt_spans, drain_spans, worker_mode
+
+if TYPE_CHECKING:  # Só para as anotações: o cli.py resolve entradas sem o Arrow
+    from station_accumulator import StationAccumulator
+
+# Agregador de um arquivo: devolve (agregados por estação, linhas lidas)
+FileAggregator = Callable[[Path], Tuple["StationAccumulator", int]]
+
+
+def expand_inputs(spec: Path) -> List[Path]:
+    """
+    Resolve a entrada de uma engine em arquivos: um arquivo, um diretório (todos
+    os arquivos com extensão conhecida) ou um glob (ex.: data/shards/*.csv).
+    Devolve a lista ordenada; todos os shards precisam ter o mesmo formato.
+    """
+    text = str(spec)
+    if has_magic(text):
+        paths = [Path(p) for p in sorted(glob(text, recursive=True))]
+        paths = [p for p in paths if p.is_file()]
+    elif spec.is_dir():
+        paths = sorted(
+            p
+            for p in spec.iterdir()
+            if p.is_file() and p.suffix.lower() in FORMATS_BY_SUFFIX
+        )
+    else:
+        paths = [spec] if spec.exists() else []
+
+    if not paths:
+        raise FileNotFoundError(f"No input files found for {spec}")
+    formats = {input_format(p) for p in paths}
+    if len(formats) > 1:
+        raise ValueError(
+            f"Mixed input formats in {spec} ({', '.join(sorted(formats))}); "
+            "use a glob such as '*.csv'"
+        )
+    return paths
+
+
+def shard_parts(parts: int, size: int, total: int) -> int:
+    """
+    Quantos dos `parts` intervalos cabem a um shard de `size` bytes quando a
+    entrada toda tem `total` bytes: proporcional ao tamanho, arredondado para
+    cima e com pelo menos um intervalo por shard.
+    """
+    return max(1, -(-parts * size // max(total, 1)))
+
+
+def _quiet_worker() -> None:
+    # Só o processo principal desenha a barra de progresso e grava o trace
+    ByteProgress.disabled = True
+    worker_mode()
+
+
+def _aggregate_shard(
+    aggregate: FileAggregator, path: Path
+) -> Tuple["StationAccumulator", int, int, list]:
+    stats, rows = aggregate(path)
+    return stats, rows, path.stat().st_size, drain_spans()
+
+
+def aggregate_shards(
+    paths: List[Path], aggregate: FileAggregator, workers: int
+) -> Tuple["StationAccumulator", int]:
+    """
+    Agrega cada shard em um processo do Pool e soma os parciais numa única
+    tabela de estações. Com um só arquivo roda direto no processo atual.
+    `aggregate` precisa ser serializável (função de módulo ou functools.partial).
+    """
+    if len(paths) == 1:
+        return aggregate(paths[0])
+
+    # Maiores primeiro: o último shard a terminar tende a ser pequeno
+    paths = sorted(paths, key=lambda p: p.stat().st_size, reverse=True)
+    workers = max(1, min(workers, len(paths)))
+    print(f"🗂️  {len(paths)} shards across {workers} workers...")
+
+    stats, row_count = None, 0
+    total = sum(p.stat().st_size for p in paths)
+    with (
+        Pool(workers, initializer=_quiet_worker) as pool,
+        ByteProgress(paths[0], desc="📥 Lendo shards", total=total) as progress,
+    ):
+        for partial_stats, rows, n_bytes, spans in pool.imap_unordered(
+            partial(_aggregate_shard, aggregate), paths
+        ):
+            adopt_spans(spans)
+            if stats is None:
+                stats = partial_stats
+            else:
+                stats.merge(partial_stats)
+            row_count += rows
+            progress.update(n_bytes, rows)
+    return stats, row_count
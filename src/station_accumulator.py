@@ -0,0 +1,219 @@
+# src/station_accumulator.py
+
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import pyarrow as pa
+
+from variance import VARIANCE_COLUMNS, spread
+
+Station = Union[bytes, str]
+
+
+class StationAccumulator:
+    """
+    Agregados por estação (soma, contagem, mínimo, máximo) em arrays paralelos.
+    Cada estação recebe um slot inteiro denso; nenhum dict por estação é criado.
+
+    Com fixed_point=True os valores são décimos inteiros (saída dividida por 10);
+    com fixed_point=False são floats em °C.
+
+    Com variance=True também guarda o M2 (soma dos quadrados dos desvios) de
+    cada estação: atualizado por Welford a cada leitura e combinado pela fórmula
+    de Chan nos merges, então chunks, workers e shards somam sem segunda passada.
+    """
+
+    __slots__ = (
+        "fixed_point",
+        "variance",
+        "index",
+        "stations",
+        "sums",
+        "counts",
+        "mins",
+        "maxs",
+        "m2s",
+    )
+
+    def __init__(self, fixed_point: bool = True, variance: bool = False):
+        self.fixed_point = fixed_point
+        self.variance = variance
+        self.index: Dict[Station, int] = {}
+        self.stations: List[Station] = []
+        self.sums = array("q" if fixed_point else "d")
+        self.counts = array("q")
+        self.mins = array("q" if fixed_point else "d")
+        self.maxs = array("q" if fixed_point else "d")
+        self.m2s = array("d")  # Vazio sem variance
+
+    def __len__(self) -> int:
+        """Estações com leituras; slots pré-alocados e nunca vistos não contam."""
+        return sum(1 for count in self.counts if count)
+
+    def slot(self, station: Station) -> int:
+        """Retorna o slot da estação, criando-o na primeira ocorrência."""
+        i = self.index.get(station)
+        if i is None:
+            i = len(self.stations)
+            self.index[station] = i
+            self.stations.append(station)
+            self.sums.append(0)
+            self.counts.append(0)
+            self.mins.append(2**62 if self.fixed_point else float("inf"))
+            self.maxs.append(-(2**62) if self.fixed_point else float("-inf"))
+            if self.variance:
+                self.m2s.append(0.0)
+        return i
+
+    def preallocate(self, stations: Sequence[Station]) -> None:
+        """Cria os slots das estações conhecidas de antemão, na ordem dada."""
+        for station in stations:
+            self.slot(station)
+
+    def add(self, station: Station, value) -> None:
+        """Soma uma leitura. Loops quentes devem usar slot() e os arrays direto."""
+        i = self.slot(station)
+        if self.variance and self.counts[i]:
+            # Welford: desvio em relação à média antes desta leitura
+            n = self.counts[i]
+            delta = value - self.sums[i] / n
+            self.m2s[i] += delta * delta * n / (n + 1)
+        self.sums[i] += value
+        self.counts[i] += 1
+        if value < self.mins[i]:
+            self.mins[i] = value
+        if value > self.maxs[i]:
+            self.maxs[i] = value
+
+    def merge(self, other: "StationAccumulator") -> None:
+        """Incorpora os agregados parciais de outro acumulador (chunk, worker...)."""
+        if other.fixed_point != self.fixed_point:
+            raise ValueError("Cannot merge fixed-point and float accumulators")
+        self.merge_arrays(
+            other.stations,
+            other.sums,
+            other.counts,
+            other.mins,
+            other.maxs,
+            other.m2s if other.variance else None,
+        )
+
+    def merge_arrays(
+        self,
+        stations: Sequence[Station],
+        sums: Sequence,
+        counts: Sequence[int],
+        mins: Sequence,
+        maxs: Sequence,
+        m2s: Optional[Sequence[float]] = None,
+    ) -> None:
+        """
+        Incorpora agregados já reduzidos por estação (ex.: um bloco NumPy).
+        Slots sem leituras (pré-alocados e nunca vistos) são ignorados.
+        Com variance, `m2s` traz o M2 de cada estação e entra pela fórmula de Chan.
+        """
+        if self.variance and m2s is None:
+            raise ValueError("Cannot merge partial aggregates without M2 into variance")
+        for k, (station, t_sum, count, t_min, t_max) in enumerate(
+            zip(stations, sums, counts, mins, maxs)
+        ):
+            if not count:
+                continue
+            i = self.slot(station)
+            if self.variance:
+                m2, n = m2s[k], self.counts[i]
+                if n:
+                    delta = t_sum / count - self.sums[i] / n
+                    m2 += delta * delta * n * count / (n + count)
+                self.m2s[i] += m2
+            self.sums[i] += t_sum
+            self.counts[i] += count
+            if t_min < self.mins[i]:
+                self.mins[i] = t_min
+            if t_max > self.maxs[i]:
+                self.maxs[i] = t_max
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        Agregados brutos serializáveis em JSON (nomes em bytes viram utf-8).
+        Só entram estações com leituras, não os slots pré-alocados vazios.
+        """
+        seen = [i for i, count in enumerate(self.counts) if count]
+        return {
+            "fixed_point": self.fixed_point,
+            "bytes_keys": any(isinstance(s, bytes) for s in self.stations),
+            "stations": [
+                s.decode("utf-8") if isinstance(s, bytes) else s
+                for s in (self.stations[i] for i in seen)
+            ],
+            "sums": [self.sums[i] for i in seen],
+            "counts": [self.counts[i] for i in seen],
+            "mins": [self.mins[i] for i in seen],
+            "maxs": [self.maxs[i] for i in seen],
+            **({"m2s": [self.m2s[i] for i in seen]} if self.variance else {}),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "StationAccumulator":
+        """Reconstrói um acumulador salvo com to_state()."""
+        stats = cls(fixed_point=state["fixed_point"], variance="m2s" in state)
+        stations = state["stations"]
+        if state["bytes_keys"]:
+            stations = [s.encode("utf-8") for s in stations]
+        stats.merge_arrays(
+            stations,
+            state["sums"],
+            state["counts"],
+            state["mins"],
+            state["maxs"],
+            state.get("m2s"),
+        )
+        return stats
+
+    def columns(self) -> List[str]:
+        """Colunas da saída de rows(), incluindo variância e desvio se houver."""
+        extra = VARIANCE_COLUMNS if self.variance else []
+        return ["station", "min", "mean", "max", *extra]
+
+    def records(self) -> Iterator[Tuple]:
+        """
+        Percorre (estação, soma, contagem, mínimo, máximo) em °C, sem ordenar,
+        mais o M2 em °C² com variance. Slots pré-alocados sem leituras ficam de fora.
+        """
+        scale = 10 if self.fixed_point else 1
+        for i, station in enumerate(self.stations):
+            if not self.counts[i]:
+                continue
+            if isinstance(station, bytes):
+                station = station.decode("utf-8")
+            record = (
+                station,
+                self.sums[i] / scale,
+                self.counts[i],
+                self.mins[i] / scale,
+                self.maxs[i] / scale,
+            )
+            yield record + (self.m2s[i] / scale**2,) if self.variance else record
+
+    def rows(self) -> List[Tuple]:
+        """
+        Retorna (estação, mínimo, média, máximo) em °C, ordenado por estação;
+        com variance, seguidos de variância (°C²) e desvio padrão (°C).
+        """
+        rows = []
+        for station, t_sum, count, t_min, t_max, *m2 in self.records():
+            row = (station, t_min, t_sum / count, t_max)
+            rows.append(row + spread(m2[0], count) if m2 else row)
+        return sorted(rows)
+
+    def to_arrow(self) -> pa.Table:
+        """Tabela Arrow com as colunas de columns(), ordenada por estação."""
+        rows = self.rows()
+        columns = self.columns()
+        return pa.table(
+            {
+                name: pa.array(
+                    [r[k] for r in rows], pa.string() if k == 0 else pa.float64()
+                )
+                for k, name in enumerate(columns)
+            }
+        )
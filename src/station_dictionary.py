@@ -0,0 +1,209 @@
+# src/station_dictionary.py
+
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+
+from fingerprint import fingerprint
+from station_accumulator import StationAccumulator
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / "data" / "model.csv"  # Universo de estações do gerador
+DICTIONARY_PATH = BASE_DIR / "data" / "station_dictionary.npz"
+DICTIONARY_VERSION = 1  # Incrementar quando o formato do artefato mudar
+HASH_PRIME = np.uint64(0x100000001B3)  # Primo do FNV-1a de 64 bits
+BUCKET_BITS = 20  # Tabela direta de 2^20 buckets (4 MiB) pelos bits altos do hash
+EMPTY, SHARED = -1, -2  # Bucket sem estação / com mais de uma estação
+FIBONACCI = np.uint64(0x9E3779B97F4A7C15)  # Espalha os bits baixos do FNV pelos altos
+
+
+def name_words(
+    buf: np.ndarray, starts: np.ndarray, semi: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lê cada nome buf[start:semi] em palavras de 8 bytes (zeradas após o fim do
+    nome) e resume as palavras num hash de 64 bits (FNV-1a por palavra).
+    Retorna (palavras [n_palavras × linhas], hashes, comprimentos).
+    """
+    lengths = semi - starts
+    n_words = int(lengths.max() + 7) // 8
+
+    # Janela deslizante: um uint64 (não alinhado) começando em cada byte, como
+    # visão do próprio buffer com passo de 1 byte, sem copiar o bloco. Posições
+    # a menos de 8 bytes do fim leem de uma cópia dos últimos 8 bytes + zeros
+    buf = np.ascontiguousarray(buf)
+    if len(buf) < 8:
+        buf = np.concatenate([buf, np.zeros(8 - len(buf), dtype=np.uint8)])
+    last = len(buf) - 8
+    window = np.ndarray((last + 1,), dtype="<u8", buffer=buf, strides=(1,))
+    tail = np.zeros(16, dtype=np.uint8)
+    tail[:8] = buf[last:]
+    tail_window = np.ndarray((8,), dtype="<u8", buffer=tail, strides=(1,))
+
+    # Cada passada só visita as linhas cujo nome ainda tem bytes a ler
+    words = np.zeros((n_words, len(starts)), dtype=np.uint64)
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    active = np.arange(len(starts))
+    for k in range(n_words):
+        if k:
+            active = active[lengths[active] > 8 * k]
+        pos = starts[active] + 8 * k
+        remaining = np.minimum(lengths[active] - 8 * k, 8).astype(np.uint64)
+        mask = np.where(
+            remaining == 8,
+            np.uint64(0xFFFFFFFFFFFFFFFF),
+            (np.uint64(1) << (remaining * np.uint64(8))) - np.uint64(1),
+        )
+        word = window[np.minimum(pos, last)]
+        near_end = pos > last
+        if near_end.any():
+            word[near_end] = tail_window[pos[near_end] - last]
+        word &= mask
+        words[k, active] = word
+        hashes[active] = (hashes[active] ^ word) * HASH_PRIME
+    hashes ^= lengths.astype(np.uint64)
+    return words, hashes, lengths
+
+
+class StationDictionary:
+    """
+    Estações conhecidas (data/model.csv) com id denso = posição na lista
+    ordenada. Guarda as palavras e hashes de cada nome no mesmo formato de
+    name_words, então um bloco de linhas é mapeado para ids por uma tabela
+    direta de buckets (searchsorted só nos buckets disputados), sem criar
+    bytes por linha. Nomes fora do
+    dicionário ficam marcados como desconhecidos para o fallback do chamador.
+    """
+
+    def __init__(self, names: List[bytes]):
+        self.names = names
+        blob = b"\n".join(names) + b"\n"
+        buf = np.frombuffer(blob, dtype=np.uint8)
+        semi = np.flatnonzero(buf == ord("\n"))
+        starts = np.empty_like(semi)
+        starts[0] = 0
+        starts[1:] = semi[:-1] + 1
+        self.words, self.hashes, self.lengths = name_words(buf, starts, semi)
+        self.order = np.argsort(self.hashes, kind="stable")
+        self.sorted_hashes = self.hashes[self.order]
+        # Bucket → id direto; buckets disputados caem no searchsorted
+        buckets = self.bucket_of(self.hashes)
+        self.buckets = np.full(1 << BUCKET_BITS, EMPTY, dtype=np.int32)
+        self.buckets[buckets] = np.arange(len(names), dtype=np.int32)
+        shared = np.bincount(buckets, minlength=1 << BUCKET_BITS) > 1
+        self.buckets[shared] = SHARED
+
+    @staticmethod
+    def bucket_of(hashes: np.ndarray) -> np.ndarray:
+        """Bucket pelos bits altos de hash × constante de Fibonacci."""
+        with np.errstate(over="ignore"):
+            mixed = hashes * FIBONACCI
+        return (mixed >> np.uint64(64 - BUCKET_BITS)).astype(np.intp)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(
+        self, words: np.ndarray, hashes: np.ndarray, lengths: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ids do dicionário para nomes já resumidos por name_words.
+        Retorna (ids, máscara de conhecidos); o hash acha o candidato e as
+        palavras completas confirmam, então colisões viram "desconhecido".
+        """
+        ids = self.buckets[self.bucket_of(hashes)].astype(np.intp)
+        shared = np.flatnonzero(ids == SHARED)
+        if len(shared):
+            pos = np.minimum(
+                np.searchsorted(self.sorted_hashes, hashes[shared]),
+                len(self.sorted_hashes) - 1,
+            )
+            ids[shared] = self.order[pos]
+        present = ids >= 0
+        ids[~present] = 0  # Só para indexar; a máscara já os marca desconhecidos
+        known = present & (self.hashes[ids] == hashes)
+        known &= self.lengths[ids] == lengths
+        # Uma palavra por vez: gather de um vetor contíguo, sem matriz temporária
+        for k in range(min(len(words), len(self.words))):
+            known &= words[k] == self.words[k][ids]
+        return ids, known
+
+    def accumulator(
+        self, fixed_point: bool = True, variance: bool = False
+    ) -> StationAccumulator:
+        """Acumulador com um slot pré-alocado por estação, slot i = id i."""
+        stats = StationAccumulator(fixed_point=fixed_point, variance=variance)
+        if fixed_point:
+            stats.preallocate(self.names)
+        else:
+            # Engines em float leem o CSV como texto: chaves str
+            stats.preallocate([name.decode("utf-8") for name in self.names])
+        return stats
+
+    def save(self, path: Path, model_path: Path) -> None:
+        """Grava o artefato (.npz) com o fingerprint do model.csv de origem."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        source = fingerprint(model_path)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            version=DICTIONARY_VERSION,
+            names=np.frombuffer(b"\n".join(self.names), dtype=np.uint8),
+            source=np.array([str(source.size), source.head, source.tail]),
+        )
+        tmp_path.replace(path)
+
+
+def read_model_names(model_path: Path = MODEL_PATH) -> List[bytes]:
+    """Nomes únicos e ordenados, com as mesmas regras do create_measurements.py."""
+    names = set()
+    for line in model_path.read_bytes().splitlines():
+        if b"#" not in line:
+            names.add(line.split(b";")[0])
+    return sorted(names)
+
+
+@lru_cache(maxsize=None)
+def load_station_dictionary(
+    path: Path = DICTIONARY_PATH, model_path: Path = MODEL_PATH
+) -> Optional[StationDictionary]:
+    """
+    Carrega o dicionário pré-compilado; se ele não existir ou tiver sido gerado
+    de outro model.csv, reconstrói e grava. Sem model.csv, devolve None e as
+    engines voltam a descobrir as estações linha a linha.
+    """
+    if not model_path.exists():
+        return None
+    source = fingerprint(model_path)
+    try:
+        with np.load(path) as artifact:
+            if int(artifact["version"]) == DICTIONARY_VERSION and list(
+                artifact["source"]
+            ) == [str(source.size), source.head, source.tail]:
+                return StationDictionary(artifact["names"].tobytes().split(b"\n"))
+    except (OSError, ValueError, KeyError):
+        pass
+    dictionary = StationDictionary(read_model_names(model_path))
+    try:
+        dictionary.save(path, model_path)
+    except OSError as e:
+        print(f"⚠️  Could not save station dictionary {path}: {e}")
+    return dictionary
+
+
+def new_accumulator(
+    fixed_point: bool = True, variance: bool = False
+) -> StationAccumulator:
+    """Acumulador pré-alocado com o dicionário, ou vazio se não houver model.csv."""
+    dictionary = load_station_dictionary()
+    if dictionary is None:
+        return StationAccumulator(fixed_point=fixed_point, variance=variance)
+    return dictionary.accumulator(fixed_point, variance)
+
+
+# ▶️ Execução: pré-compila o artefato
+if __name__ == "__main__":
+    dictionary = StationDictionary(read_model_names())
+    dictionary.save(DICTIONARY_PATH, MODEL_PATH)
+    print(f"✅ {len(dictionary):,} stations saved to {DICTIONARY_PATH}")
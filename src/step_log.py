@@ -0,0 +1,30 @@
+# src/step_log.py
+
+from csv import writer
+from pathlib import Path
+import datetime
+
+
+class StepLogger:
+    """
+    Registra cada etapa do pipeline num CSV de log (timestamp, etapa, status).
+    Substitui as cópias de log_step de cada script; `path` pode ser trocado pelo
+    runner para gravar os logs em outro diretório.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __call__(self, step: str, status: str) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", newline="") as log_file:
+                log_writer = writer(log_file)
+                timestamp = datetime.datetime.now().isoformat()
+                if status.lower().startswith("success") or status.lower().startswith(
+                    "completed"
+                ):
+                    status = "✅ " + status
+                log_writer.writerow([timestamp, step, status])
+        except Exception as e:
+            print(f"[LOG ERROR] Failed to write log: {e}")
@@ -0,0 +1,244 @@
+# src/tracing.py
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+
+FLUSH_EVERY_EVENTS = 1024  # Eventos em memória antes de gravar no JSONL
+
+_tracers: "weakref.WeakSet[Tracer]" = weakref.WeakSet()  # Tracers deste processo
+_in_worker = False  # Processo de Pool: os spans voltam ao pai em vez de ir ao disco
+
+
+class Tracer:
+    """
+    Spans aninhados e cronometrados, gravados em JSON lines (um evento por span)
+    e exportáveis para o formato Chrome trace / Perfetto. Os eventos ficam num
+    buffer em memória e só vão para o disco a cada FLUSH_EVERY_EVENTS spans ou
+    quando o span raiz termina, então o custo por span é só o de dois relógios
+    e um append. `path` e `chrome_path` podem ser trocados pelo runner.
+    """
+
+    def __init__(self, path: Path, chrome_path: Optional[Path] = None):
+        self.path = path
+        self.chrome_path = chrome_path
+        self.run_id = ""
+        self.events: List[Dict[str, Any]] = []  # Spans da execução atual
+        self._pending = 0  # Spans ainda não gravados no JSONL
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # Relógio monotônico ancorado no horário real do início da execução
+        self._epoch_us = time.time_ns() // 1000 - time.perf_counter_ns() // 1000
+        _tracers.add(self)
+
+    def _reset(self) -> None:
+        """Descarta a pilha e os eventos herdados do processo pai (fork)."""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.events = []
+        self._pending = 0
+
+    def _stack(self) -> List[int]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """Abre um span; o dicionário devolvido aceita atributos extras (ex.: linhas)."""
+        stack = self._stack()
+        with self._lock:
+            self._next_id += 1
+            span_id = self._next_id
+        parent = stack[-1] if stack else None
+        if parent is None and not _in_worker:
+            # Span raiz: nova execução (os spans da anterior já foram gravados)
+            with self._lock:
+                self.run_id = uuid.uuid4().hex[:12]
+                self.events = []
+                self._pending = 0
+        run_id = self.run_id
+        stack.append(span_id)
+        status, error = "ok", None
+        start = time.perf_counter_ns() // 1000
+        try:
+            yield args
+        except BaseException as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter_ns() // 1000 - start
+            stack.pop()
+            event = {
+                "run": run_id,
+                "id": span_id,
+                "parent": parent,
+                "name": name,
+                "ts_us": self._epoch_us + start,
+                "dur_us": duration,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "status": status,
+                "args": args,
+            }
+            if error is not None:
+                event["error"] = error
+            with self._lock:
+                self.events.append(event)
+                self._pending += 1
+            if _in_worker:
+                return  # Ficam no buffer até drain_spans() devolvê-los ao pai
+            if parent is None or self._pending >= FLUSH_EVERY_EVENTS:
+                self.flush()
+                if parent is None and self.chrome_path is not None:
+                    export_chrome_trace(self.events, self.chrome_path)
+
+    def traced(self, name: str):
+        """Decorador: executa a função inteira dentro de um span."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def adopt(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Incorpora spans vindos de um worker à execução atual: ganham ids novos
+        (os do worker podem colidir com os daqui) e as raízes do worker viram
+        filhas do span aberto nesta thread. O pid original é mantido, então o
+        Chrome trace mostra cada worker na própria linha.
+        """
+        stack = self._stack()
+        with self._lock:
+            ids = {}
+            for event in events:
+                self._next_id += 1
+                ids[event["id"]] = self._next_id
+            for event in events:
+                event["run"] = self.run_id
+                event["id"] = ids[event["id"]]
+                event["parent"] = ids.get(event["parent"], stack[-1] if stack else None)
+            self.events.extend(events)
+            self._pending += len(events)
+        if self._pending >= FLUSH_EVERY_EVENTS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Grava no JSONL os spans pendentes (append, como os logs CSV)."""
+        with self._lock:
+            pending = self.events[len(self.events) - self._pending :]
+            self._pending = 0
+        if not pending:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as trace_file:
+                trace_file.writelines(
+                    json.dumps(event, ensure_ascii=False, default=str) + "\n"
+                    for event in pending
+                )
+        except Exception as e:
+            print(f"[TRACE ERROR] Failed to write trace: {e}")
+
+
+def worker_mode() -> None:
+    """
+    Para o initializer de um Pool: a partir daqui os spans deste processo só
+    ficam em memória (nada de JSONL nem Chrome trace por worker), e a pilha
+    herdada do pai no fork é descartada, senão a raiz do worker nunca fecharia.
+    """
+    global _in_worker
+    _in_worker = True
+    for tracer in list(_tracers):
+        tracer._reset()
+
+
+def drain_spans() -> List[Dict[str, Any]]:
+    """Spans terminados neste worker desde a última chamada, para enviar ao pai."""
+    events = []
+    for tracer in list(_tracers):
+        with tracer._lock:
+            events += tracer.events
+            tracer.events = []
+            tracer._pending = 0
+    return events
+
+
+def adopt_spans(events: List[Dict[str, Any]]) -> None:
+    """No pai: entrega os spans de um worker ao tracer com execução aberta aqui."""
+    if not events:
+        return
+    for tracer in list(_tracers):
+        if tracer._stack():
+            tracer.adopt(events)
+            return
+
+
+def read_trace(path: Path, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lê os spans de um JSONL; sem `run_id`, devolve a execução mais recente."""
+    with path.open(encoding="utf-8") as trace_file:
+        events = [json.loads(line) for line in trace_file if line.strip()]
+    if run_id is None and events:
+        run_id = events[-1]["run"]
+    return [event for event in events if event["run"] == run_id]
+
+
+def export_chrome_trace(events: List[Dict[str, Any]], path: Path) -> None:
+    """Converte spans para Chrome trace (abre em chrome://tracing ou ui.perfetto.dev)."""
+    trace_events = [
+        {
+            "name": event["name"],
+            "ph": "X",  # Evento completo: início + duração
+            "ts": event["ts_us"],
+            "dur": event["dur_us"],
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": {
+                **event["args"],
+                "status": event["status"],
+                **({"error": event["error"]} if "error" in event else {}),
+            },
+        }
+        for event in events
+    ]
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {"traceEvents": trace_events, "displayTimeUnit": "ms"},
+                ensure_ascii=False,
+                default=str,
+            ),
+            encoding="utf-8",
+        )
+    except Exception as e:
+        print(f"[TRACE ERROR] Failed to export Chrome trace: {e}")
+
+
+# ▶️ Converte um JSONL existente em Chrome trace
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Exporta spans JSONL para Chrome trace")
+    parser.add_argument("trace", type=Path, help="Arquivo JSONL gerado pelo Tracer")
+    parser.add_argument("--run", help="Id da execução (padrão: a mais recente)")
+    parser.add_argument("--output", type=Path, help="Padrão: <trace>.json")
+    args = parser.parse_args()
+
+    output = args.output or args.trace.with_suffix(".json")
+    events = read_trace(args.trace, args.run)
+    export_chrome_trace(events, output)
+    print(f"✅ {len(events)} spans exported to {output}")
@@ -0,0 +1,61 @@
+# src/variance.py
+
+import numpy as np
+
+# Colunas extras (°C² e °C) quando a variância é pedida (--variance)
+VARIANCE_COLUMNS = ["variance", "stddev"]
+
+
+def spread(m2, count, scale=1):
+    """
+    (variância, desvio padrão) populacionais a partir de M2 (soma dos quadrados
+    dos desvios em relação à média) e da contagem. Aceita escalares, arrays
+    NumPy ou Series; `scale` converte décimos inteiros em °C.
+    """
+    variance = m2 / count / (scale * scale)
+    return variance, variance**0.5
+
+
+def group_m2(
+    ids: np.ndarray, values: np.ndarray, sums: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """
+    M2 por grupo de um bloco já em memória: com as somas e contagens do bloco,
+    soma os quadrados dos desvios em relação à média de cada grupo (duas
+    passadas sobre o bloco, sem a cancelação de Σx² − (Σx)²/n).
+    """
+    means = np.divide(sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+    deviations = values - means[ids]
+    return np.bincount(ids, weights=deviations * deviations, minlength=len(counts))
+
+
+def merge_m2(count_a, sum_a, m2_a, count_b, sum_b, m2_b) -> np.ndarray:
+    """
+    M2 da união de dois grupos a partir de (contagem, soma, M2) de cada um,
+    pela fórmula de Chan: M2a + M2b + δ²·na·nb/(na + nb), com δ a diferença
+    das médias. Vetorizado por estação; grupos vazios só somam o outro M2.
+    """
+    count_a = np.asarray(count_a, dtype=np.float64)
+    count_b = np.asarray(count_b, dtype=np.float64)
+    both = (count_a > 0) & (count_b > 0)
+    delta = np.zeros_like(count_a)
+    np.subtract(
+        np.divide(sum_b, count_b, where=both, out=np.zeros_like(count_b)),
+        np.divide(sum_a, count_a, where=both, out=np.zeros_like(count_a)),
+        out=delta,
+    )
+    total = np.where(both, count_a + count_b, 1)
+    return m2_a + m2_b + delta * delta * count_a * count_b / total
+
+
+def combine_partial_m2(partials, totals):
+    """
+    M2 por estação de agregados parciais empilhados (DataFrame indexado pela
+    estação, com sum, count e m2 por parcial) dados os totais já somados:
+    cada parcial contribui com o próprio M2 + n·(média parcial − média total)²,
+    a forma de Chan para k grupos. Nenhuma passada extra sobre as linhas.
+    """
+    mean = (totals["sum"] / totals["count"]).reindex(partials.index).to_numpy()
+    delta = (partials["sum"] / partials["count"]).to_numpy() - mean
+    contribution = partials["m2"] + partials["count"] * delta * delta
+    return contribution.groupby(level=0).sum()